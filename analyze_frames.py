@@ -5,6 +5,7 @@ import json
 import csv
 import cv2
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 # --- Initialize OpenAI client (new SDK style) ---
 client = openai.OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
@@ -76,8 +77,34 @@ def annotate_frame(image_path, annotations, output_path):
 
     cv2.imwrite(output_path, image)
 
-# --- Main loop over all frames ---
-def aggregate_stats(folder_path, output_dir="output"):
+# --- Analyze + annotate one frame (None on failure) ---
+def process_frame(folder_path, filename, output_dir):
+    image_path = os.path.join(folder_path, filename)
+    print(f"Analyzing {filename}...")
+
+    try:
+        result = analyze_frame(image_path)
+        print("Result:", result)
+
+        cleaned = result.strip().strip("```").replace("json", "").strip()
+        frame_data = json.loads(cleaned)
+        frame_data["frame"] = filename
+
+        # Annotate and save
+        out_img_path = os.path.join(output_dir, "annotated_frames", f"annotated_{filename}")
+        annotate_frame(image_path, {
+            "Points": frame_data.get("points", {}),
+            "Passes": frame_data.get("passes", 0),
+            "Rebounds": frame_data.get("rebounds", {})
+        }, out_img_path)
+        return frame_data
+
+    except Exception as e:
+        print(f"Parsing error for {filename}: {e}")
+        return None
+
+# --- Main loop over all frames (max_workers frames in flight, merged in frame order) ---
+def aggregate_stats(folder_path, output_dir="output", max_workers=1):
     os.makedirs(output_dir, exist_ok=True)
     os.makedirs(os.path.join(output_dir, "annotated_frames"), exist_ok=True)
 
@@ -86,36 +113,20 @@ def aggregate_stats(folder_path, output_dir="output"):
     rebounds = defaultdict(int)
     frame_data_list = []
 
-    for filename in sorted(os.listdir(folder_path)):
-        if filename.endswith(".jpg"):
-            image_path = os.path.join(folder_path, filename)
-            print(f"Analyzing {filename}...")
-
-            try:
-                result = analyze_frame(image_path)
-                print("Result:", result)
-
-                cleaned = result.strip().strip("```").replace("json", "").strip()
-                frame_data = json.loads(cleaned)
-                frame_data["frame"] = filename
-                frame_data_list.append(frame_data)
-
-                for jersey, score in frame_data.get("points", {}).items():
-                    points[jersey] += score
-                passes += frame_data.get("passes", 0)
-                for jersey, count in frame_data.get("rebounds", {}).items():
-                    rebounds[jersey] += count
-
-                # Annotate and save
-                out_img_path = os.path.join(output_dir, "annotated_frames", f"annotated_{filename}")
-                annotate_frame(image_path, {
-                    "Points": frame_data.get("points", {}),
-                    "Passes": frame_data.get("passes", 0),
-                    "Rebounds": frame_data.get("rebounds", {})
-                }, out_img_path)
-
-            except Exception as e:
-                print(f"Parsing error for {filename}: {e}")
+    filenames = [f for f in sorted(os.listdir(folder_path)) if f.endswith(".jpg")]
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        results = executor.map(lambda f: process_frame(folder_path, f, output_dir), filenames)
+        for frame_data in results:
+            if frame_data is None:
+                continue
+            frame_data_list.append(frame_data)
+
+            for jersey, score in frame_data.get("points", {}).items():
+                points[jersey] += score
+            passes += frame_data.get("passes", 0)
+            for jersey, count in frame_data.get("rebounds", {}).items():
+                rebounds[jersey] += count
 
     # Save .json
     with open(os.path.join(output_dir, "summary.json"), "w") as jf:
@@ -0,0 +1,244 @@
+import email.utils
+import logging
+import random
+import re
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import httpx
+import openai
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUS = {408, 409, 429}
+
+# Longest server-requested wait honored before retrying (seconds)
+MAX_RETRY_AFTER = 120.0
+
+# Text of one chat completion plus its token usage (None when the service doesn't report it)
+# and the number of times the client retried the request
+Completion = namedtuple("Completion", ["content", "prompt_tokens", "completion_tokens", "retries"],
+                        defaults=[0])
+
+class AnalyzerBackend:
+    """
+    Interface for services that answer the chat-completion requests behind analyze_frame.
+    Implementations must be safe to call from several threads at once.
+    """
+    name = "base"
+
+    def complete(self, messages, model, max_tokens=500):
+        """Sends one chat-completion request and returns a Completion."""
+        raise NotImplementedError
+
+class OpenAIBackend(AnalyzerBackend):
+    """
+    Chat completions through the OpenAI SDK.
+
+    Args:
+        api_key (str): API key (default: OPENAI_API_KEY).
+        base_url (str): Alternative endpoint speaking the same protocol, e.g. the local
+            mock_openai_server (default: OPENAI_BASE_URL or the public API).
+    """
+    name = "openai"
+
+    def __init__(self, api_key=None, base_url=None, **client_kwargs):
+        logger.debug(f"Initializing OpenAI client (base_url={base_url or 'default'})...")
+        self.client = openai.OpenAI(api_key=api_key, base_url=base_url, **client_kwargs)
+
+    @classmethod
+    def pooled(cls, api_key=None, base_url=None, max_connections=64, keepalive_expiry=30.0, timeout=60.0):
+        """
+        An OpenAIBackend on a shared keep-alive connection pool with explicit limits and timeouts,
+        and without the SDK's own retries (wrap it in a RetryingBackend instead).
+
+        Args:
+            max_connections (int): Concurrent connections; every one can stay alive between calls.
+            keepalive_expiry (float): Seconds an idle connection is kept open.
+            timeout (float): Seconds to wait for a response (connecting is capped at 10).
+        """
+        http_client = httpx.Client(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                                keepalive_expiry=keepalive_expiry),
+            timeout=httpx.Timeout(timeout, connect=min(10.0, timeout)),
+        )
+        return cls(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+
+    def complete(self, messages, model, max_tokens=500):
+        # The raw response also tells how many retries the client needed
+        raw = self.client.chat.completions.with_raw_response.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens
+        )
+        response = raw.parse()
+        usage = response.usage
+        return Completion(
+            response.choices[0].message.content,
+            usage.prompt_tokens if usage else None,
+            usage.completion_tokens if usage else None,
+            getattr(raw, "retries_taken", 0),
+        )
+
+def is_retryable(error):
+    """Whether a failed call is worth repeating: connection problems, timeouts, 408/409/429 and 5xx."""
+    if isinstance(error, openai.APIConnectionError):  # includes APITimeoutError
+        return True
+    status = getattr(error, "status_code", None)
+    return status is not None and (status in RETRYABLE_STATUS or status >= 500)
+
+def _parse_duration(value):
+    """Parses rate-limit reset durations such as "1s", "250ms" or "6m0s" into seconds."""
+    total = 0.0
+    matched = False
+    for amount, unit in re.findall(r"([\d.]+)(ms|h|m|s)", value):
+        total += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+        matched = True
+    return total if matched else None
+
+def retry_after(error):
+    """
+    Seconds the server asked us to wait before retrying, from the retry-after-ms, Retry-After
+    (seconds or HTTP date) or, for 429s, x-ratelimit-reset-* headers; None if it didn't say.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            value = headers["retry-after"]
+            try:
+                return float(value)
+            except ValueError:
+                return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+    if getattr(error, "status_code", None) == 429:
+        resets = [_parse_duration(headers[name]) for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")
+                  if headers.get(name)]
+        resets = [reset for reset in resets if reset is not None]
+        if resets:
+            return max(resets)
+    return None
+
+class RetryingBackend(AnalyzerBackend):
+    """
+    Retries failed calls that are worth retrying (see is_retryable) with jittered exponential
+    backoff, so a 429 or a timeout delays a frame instead of dropping it.
+
+    Args:
+        backend (AnalyzerBackend): Backend making the calls.
+        max_retries (int): Retries after the first attempt before giving up.
+        base_delay (float): Backoff cap of the first retry in seconds; doubles with every retry.
+        max_delay (float): Largest backoff cap in seconds.
+
+    The wait is drawn uniformly from [0, cap] ("full jitter") so workers that failed together
+    don't retry together. If the server says how long to wait, that wait plus a little jitter
+    is used instead.
+    """
+    def __init__(self, backend, max_retries=4, base_delay=0.5, max_delay=30.0):
+        self.backend = backend
+        self.name = backend.name
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt, hint=None):
+        """Seconds to wait before retry number attempt + 1."""
+        if hint is not None:
+            return min(hint, MAX_RETRY_AFTER) + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def complete(self, messages, model, max_tokens=500):
+        attempt = 0
+        while True:
+            try:
+                return self.backend.complete(messages, model, max_tokens)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = self.backoff(attempt, retry_after(e))
+                attempt += 1
+                logger.warning("%s call failed (%s), retry %d of %d in %.2fs",
+                               self.name, e, attempt, self.max_retries, delay)
+                metrics.inc("api_retries_total")
+                with metrics.timed("backoff"):
+                    time.sleep(delay)
+
+class HedgedBackend(AnalyzerBackend):
+    """
+    Sends a duplicate of any call still unanswered after the `quantile` latency of recent calls
+    and returns whichever answer arrives first, cutting the slow tail at the cost of roughly
+    (1 - quantile) extra requests. Hedges are not counted by RateLimiter.
+
+    Args:
+        backend (AnalyzerBackend): Backend making the calls.
+        quantile (float): Latency quantile after which a hedge is sent.
+        min_samples (int): Calls observed before hedging starts.
+        window (int): Number of recent call latencies the quantile is taken over.
+        max_workers (int): Threads available for in-flight primary and hedge calls.
+    """
+    def __init__(self, backend, quantile=0.95, min_samples=20, window=200, max_workers=64):
+        self.backend = backend
+        self.name = backend.name
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedged-call")
+
+    def threshold(self):
+        """Current hedging delay in seconds, or None while there are too few samples."""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[int(self.quantile * (len(ordered) - 1))]
+
+    def _call(self, messages, model, max_tokens):
+        start = time.perf_counter()
+        completion = self.backend.complete(messages, model, max_tokens)
+        with self._lock:
+            self._latencies.append(time.perf_counter() - start)
+        return completion
+
+    def complete(self, messages, model, max_tokens=500):
+        primary = self._executor.submit(self._call, messages, model, max_tokens)
+        threshold = self.threshold()
+        if threshold is None or wait([primary], timeout=threshold).done:
+            return primary.result()
+
+        metrics.inc("api_hedges_total", result="sent")
+        hedge = self._executor.submit(self._call, messages, model, max_tokens)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        metrics.inc("api_hedges_total", result="won")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+def create_backend(api_key=None, base_url=None, max_retries=4, hedge_quantile=None, max_connections=64,
+                   timeout=60.0):
+    """
+    The default production backend: a pooled OpenAIBackend, optionally hedged, with retries.
+    Retries wrap hedging so that each attempt is hedged on its own.
+    """
+    backend = OpenAIBackend.pooled(api_key, base_url, max_connections=max_connections, timeout=timeout)
+    if hedge_quantile:
+        backend = HedgedBackend(backend, quantile=hedge_quantile, max_workers=max_connections)
+    if max_retries:
+        backend = RetryingBackend(backend, max_retries=max_retries)
+    return backend
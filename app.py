@@ -1,32 +1,140 @@
 import os
-from flask import Flask, request, render_template, jsonify, send_file
+from flask import Flask, Response, request, render_template, jsonify, send_file, stream_with_context
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
-import basketball_analysis
+from response_cache import ResponseCache
+from result_cache import ResultCache, analysis_key, file_hash, save_and_hash
+from jobs import Job, JobQueue, follow_events, load_status
+from upload_ingest import ChunkedUpload, UploadError, growing_video, is_streamable
+from session_store import (SessionReaper, add_client, lock_session, release_client, session_busy,
+                           stream_zip, touch_session)
+import metrics
+from logging_setup import configure_logging
+import json
 import uuid
+import threading
 import shutil
 import logging
-from logging.handlers import RotatingFileHandler
+from concurrent.futures import ThreadPoolExecutor
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max file size
+app.config['MAX_UPLOAD_BYTES'] = int(os.environ.get('MAX_UPLOAD_BYTES', 8 * 1024 * 1024 * 1024))
+# Chunked uploads (/uploads) enforce MAX_UPLOAD_BYTES per upload; single-request uploads to
+# /analyze are held to it as a whole request
+app.config['MAX_CONTENT_LENGTH'] = app.config['MAX_UPLOAD_BYTES']
+app.config['SAMPLE_FRAMES_PER_MINUTE'] = float(os.environ['SAMPLE_FRAMES_PER_MINUTE']) if os.environ.get('SAMPLE_FRAMES_PER_MINUTE') else None
+# Save sampled frames under the session's frames/ for inspection; they count toward the
+# session's disk usage and go with it when it expires
+app.config['KEEP_FRAMES'] = os.environ.get('KEEP_FRAMES', '').lower() in ('1', 'true', 'yes')
+# Sessions idle for longer are deleted; past the quota the least recently accessed go first
+app.config['SESSION_TTL_SECONDS'] = float(os.environ.get('SESSION_TTL_SECONDS', 24 * 3600))
+app.config['SESSION_MAX_BYTES'] = int(os.environ.get('SESSION_MAX_BYTES', 20 * 1024 * 1024 * 1024))
+app.config['SESSION_REAP_INTERVAL'] = float(os.environ.get('SESSION_REAP_INTERVAL', 300))
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+app.config['ANALYSIS_WORKERS'] = int(os.environ.get('ANALYSIS_WORKERS', 4))
+app.config['ANALYSIS_BATCH_SIZE'] = int(os.environ.get('ANALYSIS_BATCH_SIZE', 1))
+app.config['DEDUP_THRESHOLD'] = int(os.environ['DEDUP_THRESHOLD']) if os.environ.get('DEDUP_THRESHOLD') else None
+app.config['PREFILTER_THRESHOLD'] = float(os.environ['PREFILTER_THRESHOLD']) if os.environ.get('PREFILTER_THRESHOLD') else None
+app.config['HOOP_REGIONS'] = os.environ.get('HOOP_REGIONS', '')
+app.config['PREFILTER_MODEL'] = os.environ.get('PREFILTER_MODEL') or None
+app.config['PAYLOAD_MAX_DIM'] = os.environ.get('PAYLOAD_MAX_DIM', '')
+app.config['PAYLOAD_JPEG_QUALITY'] = int(os.environ['PAYLOAD_JPEG_QUALITY']) if os.environ.get('PAYLOAD_JPEG_QUALITY') else None
+app.config['PAYLOAD_DETAIL'] = os.environ.get('PAYLOAD_DETAIL') or None
+app.config['CROP_REGIONS'] = os.environ.get('CROP_REGIONS', '')
+app.config['OPENAI_MAX_RETRIES'] = int(os.environ.get('OPENAI_MAX_RETRIES', 4))
+app.config['OPENAI_HEDGE_QUANTILE'] = float(os.environ['OPENAI_HEDGE_QUANTILE']) if os.environ.get('OPENAI_HEDGE_QUANTILE') else None
+app.config['OPENAI_TIMEOUT'] = float(os.environ.get('OPENAI_TIMEOUT', 60))
+app.config['OPENAI_RPM'] = int(os.environ['OPENAI_RPM']) if os.environ.get('OPENAI_RPM') else None
+app.config['OPENAI_TPM'] = int(os.environ['OPENAI_TPM']) if os.environ.get('OPENAI_TPM') else None
+app.config['RESPONSE_CACHE_PATH'] = os.environ.get('RESPONSE_CACHE_PATH', 'response_cache.sqlite3')
+app.config['RESULT_CACHE_DIR'] = os.environ.get('RESULT_CACHE_DIR', 'result_cache')
+app.config['RESULT_CACHE_MAX_BYTES'] = int(os.environ.get('RESULT_CACHE_MAX_BYTES', 2 * 1024 * 1024 * 1024))
+# When the analysis pipeline (OpenCV, NumPy, the OpenAI SDK) is imported: 'background' (right
+# after startup, on a thread, so the worker serves requests meanwhile), 'eager' (before
+# serving) or 'lazy' (on first use)
+app.config['WARM_IMPORTS'] = os.environ.get('WARM_IMPORTS', 'background')
+# Video rendered with the results after each analysis: 'highlights', 'full' or 'none'
+app.config['RENDER_MODE'] = os.environ.get('RENDER_MODE', 'highlights')
+app.config['RENDER_WORKERS'] = int(os.environ.get('RENDER_WORKERS', 1))
 ALLOWED_EXTENSIONS = {'mp4', 'mov', 'avi'}
 
-# Set up logging
-if not os.path.exists('logs'):
-    os.mkdir('logs')
-file_handler = RotatingFileHandler('logs/basketball-analysis.log', maxBytes=10240, backupCount=10)
-file_handler.setFormatter(logging.Formatter(
-    '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-))
-file_handler.setLevel(logging.INFO)
-app.logger.addHandler(file_handler)
+# Set up logging: the analysis pipeline and the app log through a background listener thread,
+# so per-frame logging never blocks job threads. Rotation (LOG_MAX_BYTES) is only safe with a
+# single worker process; rotate multi-worker logs externally.
+configure_logging(os.environ.get('LOG_LEVEL', 'INFO').upper(),
+                  os.environ.get('ANALYSIS_LOG_FILE', 'basketball_analysis.log') or None,
+                  frame_level=os.environ.get('FRAME_LOG_LEVEL', '').upper() or None,
+                  frame_sample_every=int(os.environ.get('FRAME_LOG_EVERY', 1)),
+                  max_bytes=int(os.environ.get('LOG_MAX_BYTES', 0)))
 app.logger.setLevel(logging.INFO)
 app.logger.info('Basketball Analysis startup')
 
 # Ensure upload directory exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+response_cache = ResponseCache(app.config['RESPONSE_CACHE_PATH']) if app.config['RESPONSE_CACHE_PATH'] else None
+job_queue = JobQueue(max_workers=app.config['JOB_WORKERS'])
+result_cache = ResultCache(app.config['RESULT_CACHE_DIR'], app.config['RESULT_CACHE_MAX_BYTES']) \
+    if app.config['RESULT_CACHE_DIR'] else None
+# Rendering runs after a job completes, so results are returned without waiting for it
+render_executor = ThreadPoolExecutor(max_workers=app.config['RENDER_WORKERS'], thread_name_prefix='render') \
+    if app.config['RENDER_MODE'] != 'none' else None
+
+# Analyses in progress by result cache key, so a re-upload joins the running job
+inflight_sessions = {}
+inflight_lock = threading.Lock()
+
+# Chunked uploads this process created that are still arriving: session ID -> (ChunkedUpload, Job)
+active_uploads = {}
+
+def session_in_progress(session_id):
+    """Whether this process is still uploading or analyzing a session."""
+    with inflight_lock:
+        return job_queue.get(session_id) is not None or session_id in active_uploads
+
+# Expired sessions and those over the disk quota are deleted in the background. With gunicorn
+# --preload this thread runs in the master, whose session_in_progress() knows of no sessions:
+# it goes by what is on disk, the status files and the session locks held while rendering.
+# Otherwise each worker has one and they take turns.
+session_reaper = SessionReaper(app.config['UPLOAD_FOLDER'], app.config['SESSION_TTL_SECONDS'],
+                               app.config['SESSION_MAX_BYTES'], app.config['SESSION_REAP_INTERVAL'],
+                               is_active=session_in_progress)
+if app.config['SESSION_REAP_INTERVAL'] > 0:
+    session_reaper.start()
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+def pipeline():
+    """
+    The basketball_analysis module, imported on first use: it and its imports take most of a
+    worker's startup time. Its API client is created later still, on the first request.
+    """
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            import basketball_analysis
+            # One pooled client shared by all jobs, sized for every analysis thread plus its hedges
+            basketball_analysis.configure_backend(
+                max_retries=app.config['OPENAI_MAX_RETRIES'],
+                hedge_quantile=app.config['OPENAI_HEDGE_QUANTILE'],
+                max_connections=2 * app.config['JOB_WORKERS'] * app.config['ANALYSIS_WORKERS'],
+                timeout=app.config['OPENAI_TIMEOUT'],
+            )
+            _pipeline = basketball_analysis
+        return _pipeline
+
+if app.config['WARM_IMPORTS'] == 'eager':
+    pipeline()
+elif app.config['WARM_IMPORTS'] == 'background':
+    _warm_thread = threading.Thread(target=pipeline, name='warm-imports', daemon=True)
+    _warm_thread.start()
+    # With gunicorn --preload the workers are forked from this process: let the fork wait for
+    # the imports rather than copy them half done
+    os.register_at_fork(before=lambda: _warm_thread.join()
+                        if threading.current_thread() is not _warm_thread else None)
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -55,50 +163,473 @@ def analyze_video():
     os.makedirs(session_dir, exist_ok=True)
     app.logger.info(f'Created session {session_id}')
 
-    # Save the uploaded video
+    # Save the uploaded video, hashing it on the way for the result cache
     video_path = os.path.join(session_dir, secure_filename(file.filename))
-    file.save(video_path)
+    video_hash = save_and_hash(file.stream, video_path)
     app.logger.info(f'Saved video to {video_path}')
 
+    cache_key = analysis_key(video_hash, analysis_params())
+    cached = result_cache.get(cache_key, os.path.join(session_dir, "output")) if result_cache is not None else None
+    if cached is not None:
+        return cached_analysis(session_id, session_dir, video_path, cached)
+    joined = join_analysis(session_id, session_dir, cache_key)
+    if joined is not None:
+        return joined
+
+    # Estimate the work up front so /status can report progress and an ETA
+    frames_total = pipeline().estimate_sample_count(
+        video_path, frames_per_minute=app.config['SAMPLE_FRAMES_PER_MINUTE'])
+    job = Job(session_id, session_dir, frames_total=frames_total)
+    job_queue.submit(job, lambda job: run_analysis(job, video_path, cache_key))
+
+    return jsonify({
+        'session_id': session_id,
+        'status': job.status,
+        'frames_total': frames_total,
+        'status_url': f'/status/{session_id}'
+    }), 202
+
+def analysis_params():
+    """Everything besides the video that determines an analysis' results, for the result cache key."""
+    return {
+        'frames_per_minute': app.config['SAMPLE_FRAMES_PER_MINUTE'],
+        'batch_size': app.config['ANALYSIS_BATCH_SIZE'],
+        'dedup_threshold': app.config['DEDUP_THRESHOLD'],
+        'prefilter': [app.config['PREFILTER_THRESHOLD'], app.config['HOOP_REGIONS'], app.config['PREFILTER_MODEL']],
+        'payload': [app.config['PAYLOAD_MAX_DIM'], app.config['PAYLOAD_JPEG_QUALITY'],
+                    app.config['PAYLOAD_DETAIL'], app.config['CROP_REGIONS']],
+        'model': pipeline().MODEL,
+        'prompts': [pipeline().SYSTEM_PROMPT, pipeline().PROMPT, pipeline().BATCH_PROMPT],
+        # The cached outputs include the rendered video (or none)
+        'render_mode': app.config['RENDER_MODE'],
+    }
+
+def cached_analysis(session_id, session_dir, video_path, result, upload=None):
+    """
+    Answers an upload from the result cache, whose outputs result_cache.get() linked into the
+    session. video_path is the uploaded copy to delete, or None if the video was never sent.
+    Given the ChunkedUpload whose last chunk this answers, the response also reports its
+    offset like any other PATCH.
+    """
+    app.logger.info(f'Result cache hit for session {session_id}')
+    uploaded = upload.offset if upload is not None else None
+    if video_path is not None:
+        os.remove(video_path)
+    result = dict(result, session_id=session_id)
+    job = Job(session_id, session_dir)
+    job.status = 'complete'
+    job.result = result
+    job.started_at = job.finished_at = job.created_at
+    job.save()
+    body = {
+        'session_id': session_id,
+        'status': job.status,
+        'cached': True,
+        'result': result,
+        'status_url': f'/status/{session_id}'
+    }
+    if upload is None:
+        return jsonify(body), 200
+    response = jsonify(dict(body, upload_id=session_id, offset=uploaded, complete=True))
+    response.headers['Upload-Offset'] = str(uploaded)
+    return response, 200
+
+def join_analysis(session_id, session_dir, cache_key, upload=None):
+    """
+    Registers session_id as the analysis of cache_key, unless another session of this process
+    is analyzing the same video already. Then the client is answered with that session
+    instead, counted as one more of its clients, and its own session is deleted; returns the
+    response. Returns None if the caller should run the analysis itself. upload is as for
+    cached_analysis.
+    """
+    with inflight_lock:
+        running_session = inflight_sessions.setdefault(cache_key, session_id)
+    if running_session == session_id:
+        return None
     try:
-        # Run the analysis
-        app.logger.info('Starting frame extraction')
-        frames_dir = basketball_analysis.extract_frames(video_path, output_dir=os.path.join(session_dir, "frames"))
-        
-        app.logger.info('Starting frame analysis')
-        points, total_passes, rebounds = basketball_analysis.analyze_frames(frames_dir, output_dir=os.path.join(session_dir, "output"))
-        
-        # Prepare the results
-        results = {
-            'points': dict(points),
-            'total_passes': total_passes,
-            'rebounds': dict(rebounds),
-            'session_id': session_id
-        }
-        
-        app.logger.info(f'Analysis complete for session {session_id}')
-        return jsonify(results)
+        # Both clients now use the running session; it is only cleaned up once both are done
+        add_client(os.path.join(app.config['UPLOAD_FOLDER'], running_session))
+    except FileNotFoundError:
+        # Finished and cleaned up just now
+        with inflight_lock:
+            if inflight_sessions.get(cache_key) == running_session:
+                inflight_sessions[cache_key] = session_id
+        return join_analysis(session_id, session_dir, cache_key, upload)
+    app.logger.info(f'Video of session {session_id} is already being analyzed as {running_session}')
+    uploaded = upload.offset if upload is not None else None
+    shutil.rmtree(session_dir, ignore_errors=True)
+    status = job_queue.get(running_session)
+    body = {
+        'session_id': running_session,
+        'status': status.status if status else 'running',
+        'frames_total': status.frames_total if status else None,
+        'status_url': f'/status/{running_session}'
+    }
+    if upload is None:
+        return jsonify(body), 202
+    response = jsonify(dict(body, upload_id=session_id, offset=uploaded, complete=True))
+    response.headers['Upload-Offset'] = str(uploaded)
+    return response, 202
 
-    except Exception as e:
-        app.logger.error(f'Error during analysis: {str(e)}', exc_info=True)
-        return jsonify({'error': str(e)}), 500
+def run_analysis(job, video_path, cache_key=None):
+    """Runs the analysis pipeline for a queued job, caches and returns its final results."""
+    try:
+        result = _run_pipeline(job, video_path)
+        finish_analysis(job, video_path, cache_key, result)
+        return result
+    finally:
+        with inflight_lock:
+            if inflight_sessions.get(cache_key) == job.session_id:
+                inflight_sessions.pop(cache_key)
+
+def run_streaming_analysis(job, upload):
+    """Analyzes a chunked upload while it is still arriving, then caches the results."""
+    with growing_video(upload) as fifo_path:
+        # A pipe can't seek, so frames are sampled by grabbing through the stream
+        result = _run_pipeline(job, fifo_path, mode='grab')
+    if not upload.complete:
+        raise IOError('Upload stopped before the whole video arrived')
+    cache_key = analysis_key(file_hash(upload.path), analysis_params()) if result_cache is not None else None
+    finish_analysis(job, upload.path, cache_key, result)
+    return result
+
+def finish_analysis(job, video_path, cache_key, result):
+    """
+    Renders the results onto the video in the background, then caches the session's outputs
+    (video included). Adds the name of the video being rendered to result as 'video'.
+    """
+    if render_executor is None:
+        cache_results(job, cache_key, result)
+        return
+    import highlight_renderer
+    highlights = app.config['RENDER_MODE'] == 'highlights'
+    result['video'] = highlight_renderer.HIGHLIGHTS_FILENAME if highlights else highlight_renderer.ANNOTATED_FILENAME
+    # Held until rendered, so no process's session reaper deletes the session meanwhile
+    session_lock = lock_session(job.session_dir)
+    render_executor.submit(render_results, job, video_path, cache_key, dict(result), highlights, session_lock)
+
+def render_results(job, video_path, cache_key, result, highlights, session_lock):
+    """
+    Renders a finished job's video, then caches its outputs. A failed render is reported as the
+    job's render_error; the analysis results are still cached, without a video.
+    """
+    import highlight_renderer
+    output_dir = os.path.join(job.session_dir, "output")
+    try:
+        if not os.path.isdir(output_dir):
+            return  # Session cleaned up before its turn
+        try:
+            if highlight_renderer.render_output(video_path, output_dir, highlights=highlights) is None:
+                result.pop('video', None)  # No highlights to cut
+        except Exception as e:
+            app.logger.error(f'Failed to render video of session {job.session_id}: {str(e)}', exc_info=True)
+            result.pop('video', None)
+            job.render_error = str(e)
+            job.save()
+        cache_results(job, cache_key, result)
+    finally:
+        session_lock.close()
+
+def cache_results(job, cache_key, result):
+    if result_cache is None or cache_key is None:
+        return
+    try:
+        result_cache.put(cache_key, os.path.join(job.session_dir, "output"), result)
+    except OSError as e:
+        app.logger.error(f'Failed to cache results of session {job.session_id}: {str(e)}')
+
+def _run_pipeline(job, video_path, mode='auto'):
+    from frame_prefilter import FramePrefilter, parse_regions
+    from payload_optimizer import PayloadOptions, parse_max_dimension
+
+    session_dir = job.session_dir
+    frames_dir = os.path.join(session_dir, "frames") if app.config['KEEP_FRAMES'] else None
+    prefilter = None
+    if app.config['PREFILTER_THRESHOLD'] is not None:
+        # Prefilters keep per-video motion state, so each job gets its own
+        prefilter = FramePrefilter(app.config['PREFILTER_THRESHOLD'],
+                                   parse_regions(app.config['HOOP_REGIONS']),
+                                   app.config['PREFILTER_MODEL'])
+    payload = PayloadOptions(parse_max_dimension(app.config['PAYLOAD_MAX_DIM']),
+                             app.config['PAYLOAD_JPEG_QUALITY'], app.config['PAYLOAD_DETAIL'],
+                             parse_regions(app.config['CROP_REGIONS']))
+
+    # Run the analysis, streaming decoded frames straight into the model requests
+    app.logger.info(f'Starting frame analysis for session {job.session_id}')
+    points, total_passes, rebounds = pipeline().analyze_video(
+        video_path,
+        output_dir=os.path.join(session_dir, "output"),
+        mode=mode,
+        frames_per_minute=app.config['SAMPLE_FRAMES_PER_MINUTE'],
+        frames_dir=frames_dir,
+        max_workers=app.config['ANALYSIS_WORKERS'],
+        requests_per_minute=app.config['OPENAI_RPM'],
+        tokens_per_minute=app.config['OPENAI_TPM'],
+        cache=response_cache,
+        on_frame=job.on_frame,
+        batch_size=app.config['ANALYSIS_BATCH_SIZE'],
+        dedup_threshold=app.config['DEDUP_THRESHOLD'],
+        prefilter=prefilter,
+        payload=payload,
+    )
+
+    app.logger.info(f'Analysis complete for session {job.session_id}')
+    return {
+        'points': dict(points),
+        'total_passes': total_passes,
+        'rebounds': dict(rebounds),
+        'session_id': job.session_id
+    }
+
+@app.route('/uploads', methods=['POST'])
+def create_upload():
+    """
+    Starts a chunked, resumable upload from JSON {filename, size, sha256 (optional)}.
+
+    The video is then sent in order with PATCH /uploads/<upload_id>; analysis starts as soon as
+    the container can be decoded from its beginning, or once the last chunk arrives. If the
+    client sends the video's SHA-256 and it was analyzed before, the cached results are
+    returned right away and nothing needs to be uploaded.
+    """
+    params = request.get_json(silent=True) or {}
+    filename = secure_filename(params.get('filename') or '')
+    if not filename or not allowed_file(filename):
+        app.logger.warning(f'Invalid upload file name: {params.get("filename")}')
+        return jsonify({'error': 'Invalid file type'}), 400
+    try:
+        size = int(params['size']) if params.get('size') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid size'}), 400
+    if size is not None and size <= 0:
+        return jsonify({'error': 'Invalid size'}), 400
+    if size is not None and size > app.config['MAX_UPLOAD_BYTES']:
+        return jsonify({'error': f"File exceeds {app.config['MAX_UPLOAD_BYTES']} bytes"}), 413
+
+    session_id = str(uuid.uuid4())
+    session_dir = os.path.join(app.config['UPLOAD_FOLDER'], session_id)
+    os.makedirs(session_dir, exist_ok=True)
+    app.logger.info(f'Created upload session {session_id}')
+
+    sha256 = (params.get('sha256') or '').lower() or None
+    if sha256 and result_cache is not None:
+        cached = result_cache.get(analysis_key(sha256, analysis_params()), os.path.join(session_dir, "output"))
+        if cached is not None:
+            return cached_analysis(session_id, session_dir, None, cached)
+
+    upload = ChunkedUpload.create(session_dir, filename, size, sha256)
+    job = Job(session_id, session_dir)
+    job.status = 'uploading'
+    job.save()
+    with inflight_lock:
+        active_uploads[session_id] = (upload, job)
+
+    return jsonify({
+        'upload_id': session_id,
+        'session_id': session_id,
+        'offset': 0,
+        'upload_url': f'/uploads/{session_id}',
+        'status_url': f'/status/{session_id}'
+    }), 201
+
+def _find_upload(session_id):
+    """
+    Returns (ChunkedUpload, Job) of an upload session. The Job is None unless this process
+    created the upload, which may as well have been another worker or a server since
+    restarted. Returns (None, None) for unknown sessions.
+    """
+    with inflight_lock:
+        pending = active_uploads.get(session_id)
+    if pending is not None:
+        return pending
+    session_dir = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(session_id))
+    return ChunkedUpload.load(session_dir), None
+
+@app.route('/uploads/<session_id>', methods=['GET'])
+def upload_offset(session_id):
+    """How much of an upload has arrived, so an interrupted client knows where to resume."""
+    upload, _ = _find_upload(session_id)
+    if upload is None:
+        return jsonify({'error': 'Unknown upload'}), 404
+    response = jsonify({
+        'upload_id': session_id,
+        'offset': upload.offset,
+        'size': upload.total_size,
+        'complete': upload.complete
+    })
+    response.headers['Upload-Offset'] = str(upload.offset)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/uploads/<session_id>', methods=['PATCH'])
+def upload_chunk(session_id):
+    """
+    Appends the request body at the Upload-Offset header's offset. The upload completes when
+    its announced size is reached or when the Upload-Complete header is set.
+    """
+    upload, job = _find_upload(session_id)
+    if upload is None:
+        return jsonify({'error': 'Unknown upload'}), 404
+    offset = request.headers.get('Upload-Offset', type=int)
+    if offset is None:
+        return jsonify({'error': 'Missing Upload-Offset header'}), 400
+    if request.content_length is not None and offset + request.content_length > app.config['MAX_UPLOAD_BYTES']:
+        return jsonify({'error': f"File exceeds {app.config['MAX_UPLOAD_BYTES']} bytes"}), 413
+    final = request.headers.get('Upload-Complete', '').lower() in ('1', 'true', 'yes', '?1')
+
+    try:
+        new_offset = upload.append(offset, request.stream, app.config['MAX_UPLOAD_BYTES'], final)
+    except UploadError as e:
+        app.logger.warning(f'Rejected chunk for upload {session_id}: {str(e)}')
+        response = jsonify({'error': str(e), 'offset': upload.offset})
+        response.headers['Upload-Offset'] = str(upload.offset)
+        return response, 409
+
+    complete = upload.complete
+    cached_response = start_upload_analysis(session_id, upload, job)
+    if complete:
+        with inflight_lock:
+            active_uploads.pop(session_id, None)
+    if cached_response is not None:
+        return cached_response
+    # The analysis may be running in another worker
+    running = job_queue.get(session_id)
+    status = running.status if running else (load_status(upload.session_dir) or {}).get('status')
+    response = jsonify({
+        'upload_id': session_id,
+        'offset': new_offset,
+        'complete': upload.complete,
+        'status': status,
+        'status_url': f'/status/{session_id}'
+    })
+    response.headers['Upload-Offset'] = str(new_offset)
+    return response
+
+def start_upload_analysis(session_id, upload, job):
+    """
+    Starts analyzing an upload once possible: right away, decoding from a pipe, if its container
+    can be read front to back; otherwise once it is complete. Returns a response if the
+    finished upload was answered from the result cache, or joined to the analysis of the
+    same video already running.
+
+    Chunks may arrive at any worker: only the request that claims the upload starts the
+    analysis, with the upload's Job if this process created it or a new one.
+    """
+    if upload.analysis_claimed:
+        return None
+    streamable = not upload.complete and is_streamable(upload.path)
+    if not upload.complete and not streamable:
+        return None
+    if not upload.claim_analysis():
+        return None
+
+    if streamable:
+        app.logger.info(f'Analyzing upload {session_id} while it arrives')
+        job = job or Job(session_id, upload.session_dir)
+        job_queue.submit(job, lambda job: run_streaming_analysis(job, upload))
+        return None
+
+    cache_key = analysis_key(file_hash(upload.path), analysis_params())
+    output_dir = os.path.join(upload.session_dir, "output")
+    cached = result_cache.get(cache_key, output_dir) if result_cache is not None else None
+    if cached is not None:
+        return cached_analysis(session_id, upload.session_dir, upload.path, cached, upload=upload)
+    joined = join_analysis(session_id, upload.session_dir, cache_key, upload=upload)
+    if joined is not None:
+        return joined
+    job = job or Job(session_id, upload.session_dir)
+    job.frames_total = pipeline().estimate_sample_count(
+        upload.path, frames_per_minute=app.config['SAMPLE_FRAMES_PER_MINUTE'])
+    job_queue.submit(job, lambda job: run_analysis(job, upload.path, cache_key))
+    return None
+
+@app.route('/status/<session_id>')
+def job_status(session_id):
+    session_dir = safe_join(app.config['UPLOAD_FOLDER'], session_id)
+    if session_dir is None:
+        return jsonify({'error': 'Unknown session'}), 404
+    job = job_queue.get(session_id)
+    status = job.to_dict() if job else load_status(session_dir)
+    if status is None:
+        return jsonify({'error': 'Unknown session'}), 404
+    touch_session(session_dir)
+    return jsonify(status)
+
+@app.route('/stream/<session_id>')
+def stream_session(session_id):
+    """Server-Sent Events stream of per-frame stats and running totals as frames are analyzed."""
+    session_dir = safe_join(app.config['UPLOAD_FOLDER'], session_id)
+    if session_dir is None or load_status(session_dir) is None:
+        return jsonify({'error': 'Unknown session'}), 404
+    touch_session(session_dir)
+
+    def generate():
+        for event_type, data in follow_events(session_dir):
+            if event_type == 'heartbeat':
+                yield ': keep-alive\n\n'
+            else:
+                yield f'event: {event_type}\ndata: {json.dumps(data)}\n\n'
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Pipeline counters and stage timings of this process, in the Prometheus text format."""
+    body = metrics.REGISTRY.render()
+    body += (f"# HELP {metrics.PREFIX}jobs_active Analysis jobs queued or running.\n"
+             f"# TYPE {metrics.PREFIX}jobs_active gauge\n"
+             f"{metrics.PREFIX}jobs_active {job_queue.active_count()}\n")
+    return Response(body, mimetype='text/plain; version=0.0.4')
 
 @app.route('/download/<session_id>/<filename>')
 def download_file(session_id, filename):
+    """
+    Serves a file of a session's analysis output. Range requests are answered with partial
+    content, so rendered videos can be played and seeked without downloading them whole.
+    """
+    path = safe_join(app.config['UPLOAD_FOLDER'], session_id, "output", filename)
+    if path is None or not os.path.isfile(path):
+        return jsonify({'error': 'File not found'}), 404
+    touch_session(os.path.join(app.config['UPLOAD_FOLDER'], session_id))
     try:
-        return send_file(
-            os.path.join(app.config['UPLOAD_FOLDER'], session_id, filename),
-            as_attachment=True
-        )
+        # Videos are played inline by the browser, summaries saved. The path is absolute because
+        # send_file resolves relative ones against the app's root, not the cwd.
+        return send_file(os.path.abspath(path), as_attachment=not filename.endswith('.mp4'),
+                         conditional=True)
     except Exception as e:
         return jsonify({'error': str(e)}), 404
 
+@app.route('/download/<session_id>')
+def download_bundle(session_id):
+    """All of a session's outputs as one zip, streamed as it is compressed."""
+    output_dir = safe_join(app.config['UPLOAD_FOLDER'], session_id, "output")
+    if output_dir is None or not os.path.isdir(output_dir):
+        return jsonify({'error': 'Unknown session'}), 404
+    touch_session(os.path.join(app.config['UPLOAD_FOLDER'], session_id))
+    return Response(stream_with_context(stream_zip(output_dir)), mimetype='application/zip', headers={
+        'Content-Disposition': f'attachment; filename="{secure_filename(session_id)}.zip"',
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/cleanup/<session_id>', methods=['POST'])
 def cleanup_session(session_id):
+    """
+    Deletes a session its client is done with. Sessions still shared with other clients, or
+    being analyzed or rendered, are refused with 409 and left for the session reaper.
+    """
     try:
-        session_dir = os.path.join(app.config['UPLOAD_FOLDER'], session_id)
-        if os.path.exists(session_dir):
-            shutil.rmtree(session_dir)
+        session_dir = safe_join(app.config['UPLOAD_FOLDER'], session_id)
+        if session_dir is None or not os.path.isdir(session_dir):
+            return jsonify({'message': 'Cleanup successful'})
+        if release_client(session_dir) > 0:
+            return jsonify({'error': 'Session is shared with another client'}), 409
+        if session_busy(session_dir):
+            return jsonify({'error': 'Session is still in progress'}), 409
+        with inflight_lock:
+            active_uploads.pop(session_id, None)
+        shutil.rmtree(session_dir)
         return jsonify({'message': 'Cleanup successful'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1,287 +1,1205 @@
 import os
 import base64
-import openai
+import re
 import json
 import csv
 import cv2
 from collections import defaultdict
 import logging
 import argparse
+import itertools
+import signal
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import metrics
+from logging_setup import FRAME_LOGGER, configure_logging
+from analyzer_backends import create_backend
+from frame_dedup import DuplicateFrame, FrameDeduplicator, dedupe_sources
+from frame_prefilter import FilteredFrame, FramePrefilter, parse_regions, prefilter_sources
+from highlight_renderer import draw_annotations, render_output
+from event_store import EVENTS_FILENAME, EventStoreBuilder
+from live_stream import LiveCapture
+from print_final_gamestats import print_final_stats
+from payload_optimizer import PayloadOptions, image_tokens, parse_max_dimension
+from response_cache import ResponseCache
 
-# Set up logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('basketball_analysis.log'),
-        logging.StreamHandler()
-    ]
-)
+# Logging is configured by the entry point (see logging_setup); per-frame detail goes to
+# frame_logger with lazy %-formatting so it costs next to nothing when disabled
 logger = logging.getLogger(__name__)
+frame_logger = logging.getLogger(FRAME_LOGGER)
+
+# --- Analyzer backend (OpenAI by default, created on first use) ---
+_backend = None
+_backend_created = False
+_backend_options = {}
+_backend_lock = threading.Lock()
+
+def get_backend():
+    """Returns the default analyzer backend, creating it with create_backend on first use."""
+    global _backend, _backend_created
+    with _backend_lock:
+        if _backend is None:
+            if not os.environ.get("OPENAI_API_KEY"):
+                logger.error("OPENAI_API_KEY environment variable is not set!")
+            _backend = create_backend(api_key=os.environ.get("OPENAI_API_KEY"), **_backend_options)
+            _backend_created = True
+        return _backend
+
+def configure_backend(**options):
+    """
+    Sets the create_backend options (max_retries, hedge_quantile, max_connections, timeout)
+    of the default backend. It is still created on first use.
+    """
+    global _backend, _backend_created, _backend_options
+    with _backend_lock:
+        _backend_options = options
+        _backend = None
+        _backend_created = False
+
+def set_backend(backend):
+    """Replaces the default analyzer backend, e.g. with one pointed at mock_openai_server."""
+    global _backend, _backend_created
+    with _backend_lock:
+        _backend = backend
+        _backend_created = False
+
+def _reset_backend_after_fork():
+    """
+    In a forked child: drops a default backend created by the parent, whose pooled connections
+    and worker threads belong to the parent, so the child creates its own on first use.
+    """
+    global _backend, _backend_created, _backend_lock
+    _backend_lock = threading.Lock()
+    if _backend_created:
+        _backend = None
+        _backend_created = False
+
+os.register_at_fork(after_in_child=_reset_backend_after_fork)
+
+MODEL = "gpt-4o"
+SYSTEM_PROMPT = "You analyze basketball frames for player stats."
+PROMPT = """
+You are analyzing a youth basketball game frame. Identify:
+1. Points scored in this frame, and jersey number of the player (if visible).
+2. Passes that are clearly happening (ball in motion between teammates).
+3. Rebound attempts or successful rebounds, and jersey number if visible.
+
+Output JSON like:
+{
+  "points": { "23": 2 },
+  "passes": 1,
+  "rebounds": { "11": 1 }
+}
+"""
+
+BATCH_PROMPT = """
+You are analyzing {count} consecutive frames of a youth basketball game, given in order.
+For each frame identify:
+1. Points scored in that frame, and jersey number of the player (if visible).
+2. Passes that are clearly happening (ball in motion between teammates).
+3. Rebound attempts or successful rebounds, and jersey number if visible.
+
+Output a JSON array with exactly one object per frame, in the same order, like:
+[
+  { "points": { "23": 2 }, "passes": 1, "rebounds": {} },
+  { "points": {}, "passes": 0, "rebounds": { "11": 1 } }
+]
+"""
+
+# Per-session stage timings and counters, written next to summary.json
+TIMINGS_FILENAME = "timings.json"
+
+# Rough token cost of one frame request (image + prompts + max_tokens), used for TPM budgeting
+ESTIMATED_TOKENS_PER_FRAME = 1300
+# The part of it that isn't the image, for payloads whose image cost is known
+ESTIMATED_TEXT_TOKENS_PER_FRAME = ESTIMATED_TOKENS_PER_FRAME - 765
+
+class RateLimiter:
+    """
+    Thread-safe sliding-window limiter for requests-per-minute and tokens-per-minute budgets.
+
+    Args:
+        requests_per_minute (int): Max requests started in any 60s window (None = unlimited).
+        tokens_per_minute (int): Max estimated tokens spent in any 60s window (None = unlimited).
+    """
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._window = deque()  # (timestamp, tokens)
+        self._tokens_in_window = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=0):
+        """Block until a request costing `tokens` fits in both budgets."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._window and now - self._window[0][0] >= 60:
+                    _, spent = self._window.popleft()
+                    self._tokens_in_window -= spent
+
+                fits_requests = (self.requests_per_minute is None
+                                 or len(self._window) < self.requests_per_minute)
+                fits_tokens = (self.tokens_per_minute is None
+                               or not self._window
+                               or self._tokens_in_window + tokens <= self.tokens_per_minute)
+                if fits_requests and fits_tokens:
+                    self._window.append((now, tokens))
+                    self._tokens_in_window += tokens
+                    return
+                wait = 60 - (now - self._window[0][0])
+
+            frame_logger.debug("Rate limit reached, waiting %.2fs", wait)
+            time.sleep(max(wait, 0.01))
+
+# Append-only per-frame results log written next to the summaries
+CHECKPOINT_FILENAME = "frames.jsonl"
+
+# Steps at or above this use seeking in "auto" mode; below it grab() is cheaper than a seek
+SEEK_MIN_STEP = 300
+
+def iter_sampled_frames(cap, step=30, mode="auto"):
+    """
+    Yields (frame_index, frame) for every step-th frame of an opened cv2.VideoCapture.
+
+    Args:
+        cap (cv2.VideoCapture): Opened capture positioned at the start of the video.
+        step (int): Frame interval to sample.
+        mode (str): "read" reads every frame (legacy behaviour), "grab" advances past skipped
+            frames with grab() so only sampled ones pay for retrieve()'s conversion and copy,
+            "seek" jumps to each sampled frame from the nearest keyframe, and "auto" picks
+            "seek" for large steps and "grab" otherwise.
+    """
+    if mode == "auto":
+        mode = "seek" if step >= SEEK_MIN_STEP else "grab"
+
+    if mode == "seek":
+        frame_index = 0
+        while True:
+            if frame_index:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+            ret, frame = cap.read()
+            if not ret:
+                return
+            yield frame_index, frame
+            frame_index += step
+
+    frame_index = 0
+    while True:
+        if frame_index % step == 0:
+            ret, frame = cap.read()
+            if not ret:
+                return
+            yield frame_index, frame
+        elif mode == "grab":
+            if not cap.grab():
+                return
+        else:
+            ret, _ = cap.read()
+            if not ret:
+                return
+        frame_index += 1
+
+def iter_adaptive_frames(cap, frames_per_minute=60, probe_step=5, min_gap=None, max_gap=None,
+                         scene_cut_threshold=40.0):
+    """
+    Yields (frame_index, frame) sampled densely during high-motion stretches and sparsely
+    during static ones, averaging roughly frames_per_minute over the video.
+
+    Every probe_step-th frame is downscaled to grayscale and compared with the previous
+    probe; the mean absolute difference, relative to its running average, decides how
+    quickly the sampling budget is spent. Hard scene changes are sampled immediately.
+
+    Args:
+        cap (cv2.VideoCapture): Opened capture positioned at the start of the video.
+        frames_per_minute (float): Target average number of sampled frames per minute of video.
+        probe_step (int): Interval between motion probes; the sampling resolution.
+        min_gap (int): Minimum frames between samples (default: a quarter of the average gap).
+        max_gap (int): Maximum frames between samples, so static stretches are never skipped
+            entirely (default: four times the average gap).
+        scene_cut_threshold (float): Mean gray-level difference treated as a scene change.
+    """
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    target_gap = fps * 60 / frames_per_minute
+    min_gap = min_gap or max(probe_step, int(target_gap / 4))
+    max_gap = max_gap or max(min_gap, int(target_gap * 4))
+
+    previous = None
+    average_motion = None
+    credit = 0.0
+    last_sampled = None
+    frame_index = 0
+
+    while True:
+        if frame_index % probe_step:
+            if not cap.grab():
+                return
+            frame_index += 1
+            continue
+
+        ret, frame = cap.read()
+        if not ret:
+            return
 
-# --- Initialize OpenAI client ---
-logger.debug("Initializing OpenAI client...")
-client = openai.OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-if not os.environ.get("OPENAI_API_KEY"):
-    logger.error("OPENAI_API_KEY environment variable is not set!")
+        small = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (64, 36), interpolation=cv2.INTER_AREA)
+        motion = 0.0
+        if previous is not None:
+            motion = float(cv2.absdiff(small, previous).mean())
+            average_motion = motion if average_motion is None else 0.95 * average_motion + 0.05 * motion
+        previous = small
 
-def extract_frames(video_path, output_dir="frames", step=30):
+        weight = 1.0
+        if average_motion is not None and average_motion > 1e-3:
+            weight = min(max(motion / average_motion, 0.1), 4.0)
+        credit = min(credit + probe_step / target_gap * weight, 2.0)
+
+        gap = None if last_sampled is None else frame_index - last_sampled
+        if (gap is None or gap >= max_gap
+                or (gap >= min_gap and (credit >= 1.0 or motion >= scene_cut_threshold))):
+            yield frame_index, frame
+            last_sampled = frame_index
+            credit = max(credit - 1.0, 0.0)
+
+        frame_index += 1
+
+def extract_frames(video_path, output_dir="frames", step=30, mode="auto", frames_per_minute=None,
+                   processes=1):
     """
     Extracts frames from a video at a regular interval and saves them to output_dir.
+    See iter_sampled_frames for the available decode modes. If frames_per_minute is given,
+    motion-adaptive sampling (iter_adaptive_frames) is used instead of the fixed step.
+    With processes > 1, fixed-step extraction is split across worker processes
+    (see extract_frames_parallel); adaptive sampling is inherently sequential and stays serial.
     """
     logger.debug(f"Starting frame extraction from {video_path}")
-    logger.debug(f"Output directory: {output_dir}, Frame step: {step}")
-    
-    os.makedirs(output_dir, exist_ok=True)
+    logger.debug(f"Output directory: {output_dir}, Frame step: {step}, Mode: {mode}, "
+                 f"Frames per minute: {frames_per_minute}, Processes: {processes}")
+
+    if processes > 1 and not frames_per_minute:
+        with metrics.timed("extract"):
+            return extract_frames_parallel(video_path, output_dir, step, processes)
 
+    saved_count = 0
+    try:
+        with metrics.timed("extract"):
+            for _, _ in iter_video_frames(video_path, step, mode, frames_per_minute, frames_dir=output_dir):
+                saved_count += 1
+    except IOError:
+        return
+
+    logger.info(f"Frame extraction complete. Extracted {saved_count} frames to {output_dir}")
+    return output_dir
+
+def _extract_segment(video_path, output_dir, step, first_sample, end_sample):
+    """
+    Worker for extract_frames_parallel: saves samples [first_sample, end_sample) of the video,
+    named by their global sample index so the output matches the serial path.
+    """
     cap = cv2.VideoCapture(video_path)
-    frame_count = 0
+    if not cap.isOpened():
+        raise IOError(f"Failed to open video file: {video_path}")
+
+    frame_index = first_sample * step
+    if frame_index:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+
     saved_count = 0
+    sample = first_sample
+    try:
+        while sample < end_sample:
+            if frame_index % step == 0:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if not cv2.imwrite(os.path.join(output_dir, f"frame_{sample:04d}.jpg"), frame):
+                    logger.error(f"Failed to save frame {sample}")
+                saved_count += 1
+                sample += 1
+            elif not cap.grab():
+                break
+            frame_index += 1
+    finally:
+        cap.release()
+    return saved_count
 
+def extract_frames_parallel(video_path, output_dir="frames", step=30, processes=None):
+    """
+    Extracts every step-th frame using several processes, each opening its own capture and
+    seeking to a contiguous time range. Produces the same frame_XXXX.jpg files as extract_frames.
+
+    Args:
+        processes (int): Number of worker processes (default: CPU count).
+    """
+    processes = processes or os.cpu_count() or 1
+    cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         logger.error(f"Failed to open video file: {video_path}")
         return
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
 
-    logger.debug("Video opened successfully, starting frame extraction...")
+    if total_frames <= 0 or processes <= 1:
+        # Without a reliable frame count the video cannot be split into ranges
+        return extract_frames(video_path, output_dir, step)
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            logger.debug("End of video reached")
-            break
-
-        if frame_count % step == 0:
-            frame_filename = os.path.join(output_dir, f"frame_{saved_count:04d}.jpg")
-            success = cv2.imwrite(frame_filename, frame)
-            if success:
-                logger.debug(f"Saved frame {saved_count} to {frame_filename}")
-            else:
-                logger.error(f"Failed to save frame {saved_count}")
-            saved_count += 1
+    os.makedirs(output_dir, exist_ok=True)
+    total_samples = -(-total_frames // step)
+    per_process = -(-total_samples // processes)
+    segments = [(first, min(first + per_process, total_samples))
+                for first in range(0, total_samples, per_process)]
+    logger.debug(f"Extracting {total_samples} frames in {len(segments)} segments")
 
-        frame_count += 1
+    with ProcessPoolExecutor(max_workers=len(segments)) as executor:
+        futures = [executor.submit(_extract_segment, video_path, output_dir, step, first, end)
+                   for first, end in segments]
+        saved_count = sum(future.result() for future in futures)
 
-    cap.release()
     logger.info(f"Frame extraction complete. Extracted {saved_count} frames to {output_dir}")
     return output_dir
 
 def encode_image(image_path):
-    logger.debug(f"Encoding image: {image_path}")
+    frame_logger.debug("Encoding image: %s", image_path)
     try:
         with open(image_path, "rb") as f:
             encoded = base64.b64encode(f.read()).decode("utf-8")
-            logger.debug("Image encoded successfully")
+            frame_logger.debug("Image encoded successfully")
             return encoded
     except Exception as e:
         logger.error(f"Failed to encode image {image_path}: {str(e)}")
         raise
 
-def analyze_frame(image_path):
-    logger.debug(f"Starting frame analysis for: {image_path}")
-    base64_image = encode_image(image_path)
+def encode_frame(frame, jpeg_quality=95):
+    """
+    JPEG-encodes a decoded frame in memory and returns it base64-encoded.
+    The default quality matches cv2.imwrite, so the payload equals encode_image() of the saved file.
+    """
+    success, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+    if not success:
+        raise ValueError("Failed to JPEG-encode frame")
+    return base64.b64encode(buffer.tobytes()).decode("utf-8")
 
-    prompt = """
-You are analyzing a youth basketball game frame. Identify:
-1. Points scored in this frame, and jersey number of the player (if visible).
-2. Passes that are clearly happening (ball in motion between teammates).
-3. Rebound attempts or successful rebounds, and jersey number if visible.
+def encode_source(source, payload=None):
+    """
+    Builds the image payload for a frame path or decoded frame.
+    Returns (base64_image, detail, image_tokens); the last two are None without PayloadOptions.
+    """
+    with metrics.timed("encode"):
+        if payload is None:
+            return (encode_image(source) if isinstance(source, str) else encode_frame(source)), None, None
+        encoded = payload.encode(source)
+    return encoded.data, encoded.detail, image_tokens(encoded.width, encoded.height, encoded.detail)
 
-Output JSON like:
-{
-  "points": { "23": 2 },
-  "passes": 1,
-  "rebounds": { "11": 1 }
-}
-"""
+def analyze_frame(image_path, cache=None, rate_limiter=None, backend=None, payload=None):
+    frame_logger.debug("Starting frame analysis for: %s", image_path)
+    base64_image, detail, tokens = encode_source(image_path, payload)
+    return analyze_image(base64_image, cache=cache, rate_limiter=rate_limiter, backend=backend,
+                         detail=detail, image_tokens=tokens)
+
+def _image_part(base64_image, detail=None):
+    image_url = {"url": f"data:image/jpeg;base64,{base64_image}"}
+    if detail is not None:
+        image_url["detail"] = detail
+    return {"type": "image_url", "image_url": image_url}
 
+def _cache_prompt(prompt, detail):
+    # The detail mode changes what the model sees, so it is part of the cache key
+    return SYSTEM_PROMPT + prompt if detail is None else f"{SYSTEM_PROMPT}{prompt}\ndetail={detail}"
+
+def _complete(backend, messages, max_tokens):
+    """Calls backend.complete, recording its latency, outcome, retries and token usage."""
     try:
-        logger.debug("Sending request to OpenAI API...")
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You analyze basketball frames for player stats."},
+        with metrics.timed("api"):
+            completion = backend.complete(messages, model=MODEL, max_tokens=max_tokens)
+    except Exception:
+        metrics.inc("api_requests_total", outcome="error")
+        raise
+    metrics.inc("api_requests_total", outcome="ok")
+    if completion.retries:
+        metrics.inc("api_retries_total", completion.retries)
+    if completion.prompt_tokens:
+        metrics.inc("api_prompt_tokens_total", completion.prompt_tokens)
+    if completion.completion_tokens:
+        metrics.inc("api_completion_tokens_total", completion.completion_tokens)
+    return completion
+
+def analyze_image(base64_image, cache=None, rate_limiter=None, backend=None, detail=None, image_tokens=None):
+    """
+    Sends one base64-encoded JPEG to the model and returns the raw response text.
+    Uses the default backend (get_backend) unless another AnalyzerBackend is given.
+
+    Args:
+        detail (str): Image detail mode to request ("low", "high" or "auto"); unset by default.
+        image_tokens (int): Known token cost of the image, for TPM budgeting.
+    """
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.make_key(base64_image, _cache_prompt(PROMPT, detail), MODEL)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            frame_logger.debug("Cache hit")
+            metrics.inc("cache_lookups_total", result="hit")
+            return cached
+        metrics.inc("cache_lookups_total", result="miss")
+
+    if rate_limiter is not None:
+        with metrics.timed("rate_limit_wait"):
+            rate_limiter.acquire(ESTIMATED_TOKENS_PER_FRAME if image_tokens is None
+                                 else ESTIMATED_TEXT_TOKENS_PER_FRAME + image_tokens)
+
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": [
+                _image_part(base64_image, detail),
                 {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
-                            }
-                        },
-                        {
-                            "type": "text",
-                            "text": prompt
-                        }
-                    ]
+                    "type": "text",
+                    "text": PROMPT
                 }
-            ],
-            max_tokens=500
-        )
-        logger.debug("Received response from OpenAI API")
-        return response.choices[0].message.content
+            ]
+        }
+    ]
+
+    backend = backend or get_backend()
+    try:
+        frame_logger.debug("Sending request to %s backend...", backend.name)
+        completion = _complete(backend, messages, max_tokens=500)
+        frame_logger.debug("Received response from %s backend", backend.name)
     except Exception as e:
-        logger.error(f"Error during OpenAI API call: {str(e)}")
+        logger.error(f"Error during {backend.name} API call: {str(e)}")
         raise
 
-def annotate_frame(image_path, annotations, output_path):
-    logger.debug(f"Annotating frame: {image_path}")
-    image = cv2.imread(image_path)
+    if cache is not None:
+        # Only usable answers are cached; a refusal or garbled reply is asked again next time
+        try:
+            normalize_frame_data(parse_result(completion.content))
+        except ValueError:
+            return completion.content
+        cache.put(cache_key, completion.content)
+    return completion.content
+
+def analyze_images(base64_images, cache=None, rate_limiter=None, backend=None, detail=None, image_tokens=None):
+    """
+    Analyzes several consecutive base64-encoded JPEGs in a single chat request, so the
+    system prompt, instructions and request overhead are paid once per batch.
+
+    Returns one JSON string per image, in order. Per-frame results are cached individually,
+    so cached frames are left out of the request and batch boundaries may shift between runs.
+    Raises ValueError if the response does not contain one result per requested frame.
+    `detail` and `image_tokens` (one count per image) are as for analyze_image.
+    """
+    results = [None] * len(base64_images)
+    cache_keys = [None] * len(base64_images)
+    if cache is not None:
+        for i, base64_image in enumerate(base64_images):
+            cache_keys[i] = cache.make_key(base64_image, _cache_prompt(BATCH_PROMPT, detail), MODEL)
+            results[i] = cache.get(cache_keys[i])
+            metrics.inc("cache_lookups_total", result="miss" if results[i] is None else "hit")
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    if not missing:
+        frame_logger.debug("Cache hit for the whole batch")
+        return results
+
+    if rate_limiter is not None:
+        with metrics.timed("rate_limit_wait"):
+            if image_tokens is None:
+                rate_limiter.acquire(ESTIMATED_TOKENS_PER_FRAME * len(missing))
+            else:
+                rate_limiter.acquire(sum(ESTIMATED_TEXT_TOKENS_PER_FRAME + image_tokens[i] for i in missing))
+
+    content = [_image_part(base64_images[i], detail) for i in missing]
+    content.append({"type": "text", "text": BATCH_PROMPT.replace("{count}", str(len(missing)))})
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": content}
+    ]
+
+    backend = backend or get_backend()
+    try:
+        frame_logger.debug("Sending batch of %d frames to %s backend...", len(missing), backend.name)
+        completion = _complete(backend, messages, max_tokens=min(4096, 500 * len(missing)))
+        frame_logger.debug("Received batch response from %s backend", backend.name)
+    except Exception as e:
+        logger.error(f"Error during {backend.name} API call: {str(e)}")
+        raise
+
+    with metrics.timed("parse"):
+        try:
+            frame_data_list = parse_batch_result(completion.content, len(missing))
+        except ValueError:
+            metrics.inc("parse_failures_total")
+            raise
+    for i, frame_data in zip(missing, frame_data_list):
+        results[i] = json.dumps(frame_data)
+        if cache is not None:
+            cache.put(cache_keys[i], results[i])
+    return results
+
+def annotate_frame(image_path, annotations, output_path, image=None):
+    """
+    Writes an annotated copy of a frame to output_path.
+    Pass the already-decoded image to skip re-reading image_path from disk.
+    """
+    frame_logger.debug("Annotating frame: %s", image_path)
+    if image is None:
+        image = cv2.imread(image_path)
     if image is None:
         logger.error(f"Failed to read image: {image_path}")
         return
 
-    font = cv2.FONT_HERSHEY_SIMPLEX
-    font_scale = 0.6
-    color = (0, 255, 0)
-    thickness = 2
-    y_offset = 30
-
-    for key, val in annotations.items():
-        label = f"{key}: {val}"
-        cv2.putText(image, label, (10, y_offset), font, font_scale, color, thickness)
-        y_offset += 25
+    draw_annotations(image, annotations)
 
     success = cv2.imwrite(output_path, image)
     if success:
-        logger.debug(f"Annotated frame saved to: {output_path}")
+        frame_logger.debug("Annotated frame saved to: %s", output_path)
     else:
         logger.error(f"Failed to save annotated frame to: {output_path}")
 
-def analyze_frames(folder_path, output_dir="output"):
-    logger.info(f"Starting frame analysis for folder: {folder_path}")
-    os.makedirs(output_dir, exist_ok=True)
-    os.makedirs(os.path.join(output_dir, "annotated_frames"), exist_ok=True)
+def parse_result(result):
+    """Parses the model's (possibly ```json-fenced) response into a frame data dict."""
+    cleaned = result.strip().strip("```").replace("json", "").strip()
+    return json.loads(cleaned)
 
-    points = defaultdict(int)
-    passes = 0
-    rebounds = defaultdict(int)
-    frame_data_list = []
+def _is_count(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
 
-    for filename in sorted(os.listdir(folder_path)):
-        if filename.endswith(".jpg"):
-            image_path = os.path.join(folder_path, filename)
-            logger.info(f"Analyzing {filename}...")
+def normalize_frame_data(frame_data):
+    """
+    Checks that a frame result has the shape the totals are built from, {"points": {jersey:
+    number}, "passes": number, "rebounds": {jersey: number}}, filling in missing or null
+    fields. Returns frame_data; raises ValueError if it can't be used.
+    """
+    if not isinstance(frame_data, dict):
+        raise ValueError("Frame result is not a JSON object")
+    for key in ("points", "rebounds"):
+        value = frame_data.get(key) or {}
+        if not isinstance(value, dict) or not all(_is_count(count) for count in value.values()):
+            raise ValueError(f"Invalid {key} in frame result: {value!r}")
+        frame_data[key] = value
+    passes = frame_data.get("passes") or 0
+    if not _is_count(passes):
+        raise ValueError(f"Invalid passes in frame result: {passes!r}")
+    frame_data["passes"] = passes
+    return frame_data
 
-            try:
-                result = analyze_frame(image_path)
-                logger.debug(f"Raw result for {filename}: {result}")
-
-                cleaned = result.strip().strip("```").replace("json", "").strip()
-                frame_data = json.loads(cleaned)
-                frame_data["frame"] = filename
-                frame_data_list.append(frame_data)
-
-                for jersey, score in frame_data.get("points", {}).items():
-                    points[jersey] += score
-                passes += frame_data.get("passes", 0)
-                for jersey, count in frame_data.get("rebounds", {}).items():
-                    rebounds[jersey] += count
-
-                # Annotate and save
-                out_img_path = os.path.join(output_dir, "annotated_frames", f"annotated_{filename}")
-                annotate_frame(image_path, {
-                    "Points": frame_data.get("points", {}),
-                    "Passes": frame_data.get("passes", 0),
-                    "Rebounds": frame_data.get("rebounds", {})
-                }, out_img_path)
-
-            except Exception as e:
-                logger.error(f"Error processing {filename}: {str(e)}", exc_info=True)
-
-    # Save .json
+def parse_batch_result(result, count):
+    """Parses a batched response into a list of count frame data dicts."""
+    data = parse_result(result)
+    if isinstance(data, dict) and isinstance(data.get("frames"), list):
+        data = data["frames"]
+    elif isinstance(data, dict) and count == 1:
+        data = [data]
+    if not isinstance(data, list) or len(data) != count:
+        raise ValueError(f"Expected a JSON array of {count} frame results")
+    return [normalize_frame_data(frame_data) for frame_data in data]
+
+def _parse_frame(result, filename):
+    """
+    parse_result for one frame's response, timed and counted, with the frame name added.
+    Raises ValueError for replies that aren't a usable frame result.
+    """
+    with metrics.timed("parse"):
+        try:
+            frame_data = normalize_frame_data(parse_result(result))
+        except ValueError:
+            metrics.inc("parse_failures_total")
+            raise
+    frame_data["frame"] = filename
+    return frame_data
+
+def _annotate_result(filename, source, frame_data, output_dir):
+    if output_dir is None:
+        return
+    in_memory = not isinstance(source, str)
     try:
-        with open(os.path.join(output_dir, "summary.json"), "w") as jf:
-            json.dump(frame_data_list, jf, indent=2)
-        logger.info("Summary JSON file saved successfully")
+        out_img_path = os.path.join(output_dir, "annotated_frames", f"annotated_{filename}")
+        with metrics.timed("annotate"):
+            annotate_frame(filename if in_memory else source, {
+                "Points": frame_data.get("points", {}),
+                "Passes": frame_data.get("passes", 0),
+                "Rebounds": frame_data.get("rebounds", {})
+            }, out_img_path, image=source if in_memory else None)
     except Exception as e:
-        logger.error(f"Error saving summary.json: {str(e)}")
+        logger.error(f"Error annotating {filename}: {str(e)}", exc_info=True)
+
+def _analyze_one(filename, source, output_dir, rate_limiter=None, cache=None, backend=None, payload=None):
+    """
+    Analyzes and annotates a single frame.
+
+    Args:
+        filename (str): Frame name recorded in the results, e.g. frame_0001.jpg.
+        source: Path of an extracted JPEG, or an already-decoded frame (numpy array).
+        output_dir (str): Directory whose annotated_frames/ receives the annotated copy, or
+            None to skip annotating.
+        payload (PayloadOptions): How to downscale, crop and encode the frame for the model.
+
+    Returns the parsed frame data, or None if the frame could not be analyzed.
+    """
+    frame_logger.info("Analyzing %s...", filename)
 
-    # Save .csv
     try:
-        with open(os.path.join(output_dir, "summary.csv"), "w", newline="") as cf:
+        base64_image, detail, tokens = encode_source(source, payload)
+        result = analyze_image(base64_image, cache=cache, rate_limiter=rate_limiter, backend=backend,
+                               detail=detail, image_tokens=tokens)
+        frame_logger.debug("Raw result for %s: %s", filename, result)
+        frame_data = _parse_frame(result, filename)
+    except Exception as e:
+        logger.error(f"Error processing {filename}: {str(e)}", exc_info=True)
+        return None
+
+    # Annotate and save
+    _annotate_result(filename, source, frame_data, output_dir)
+    return frame_data
+
+def _analyze_batch(batch, output_dir, rate_limiter=None, cache=None, backend=None, payload=None):
+    """
+    Analyzes a list of consecutive (filename, source) frames in one request.
+    Returns one frame data dict (or None on failure) per frame. If the model's answer can't
+    be split into per-frame results, the frames are retried one request each.
+    """
+    first, last = batch[0][0], batch[-1][0]
+    frame_logger.info("Analyzing %s..%s (%d frames)...", first, last, len(batch))
+
+    try:
+        encoded = [encode_source(source, payload) for _, source in batch]
+        results = analyze_images([image for image, _, _ in encoded], cache=cache, rate_limiter=rate_limiter,
+                                 backend=backend, detail=encoded[0][1],
+                                 image_tokens=None if payload is None else [tokens for _, _, tokens in encoded])
+    except ValueError as e:
+        logger.warning(f"Unusable batch response for {first}..{last} ({str(e)}), analyzing frames individually")
+        metrics.inc("batch_fallbacks_total")
+        return [_analyze_one(filename, source, output_dir, rate_limiter, cache, backend, payload)
+                for filename, source in batch]
+    except Exception as e:
+        logger.error(f"Error processing {first}..{last}: {str(e)}", exc_info=True)
+        return [None] * len(batch)
+
+    frame_data_list = []
+    for (filename, source), result in zip(batch, results):
+        frame_logger.debug("Raw result for %s: %s", filename, result)
+        try:
+            frame_data = _parse_frame(result, filename)
+        except Exception as e:
+            logger.error(f"Error processing {filename}: {str(e)}", exc_info=True)
+            frame_data_list.append(None)
+            continue
+        _annotate_result(filename, source, frame_data, output_dir)
+        frame_data_list.append(frame_data)
+    return frame_data_list
+
+def _frame_status(frame_data):
+    if frame_data is None:
+        return "failed"
+    if "duplicate_of" in frame_data:
+        return "duplicate"
+    if "prefilter_score" in frame_data:
+        return "filtered"
+    return "analyzed"
+
+# Sources that stand in for frames the pipeline decided not to send to the model
+SKIPPED_SOURCES = (DuplicateFrame, FilteredFrame)
+
+def _skipped_frame(filename, marker):
+    """
+    Record for a frame that was not sent to the model. It adds no events: a near-duplicate
+    shows the same moment again, so copying the earlier frame's stats would count its events
+    twice, and a prefiltered frame was judged to show none.
+    """
+    frame_data = {"points": {}, "passes": 0, "rebounds": {}, "frame": filename}
+    if isinstance(marker, DuplicateFrame):
+        frame_data["duplicate_of"] = marker.frame
+    else:
+        frame_data["prefilter_score"] = marker.score
+    return frame_data
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _ordered_map(executor, fn, iterable, window):
+    """
+    Like executor.map, but consumes iterable lazily with at most `window` items in flight,
+    so a streaming frame source never has more than `window` decoded frames in memory.
+    Finished results are passed on before the next item is requested, which matters for
+    sources that block (live streams).
+    """
+    pending = deque()
+    for item in iterable:
+        pending.append(executor.submit(fn, *item))
+        while pending and (len(pending) >= window or pending[0].done()):
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def analyze_frames(folder_path, output_dir="output", max_workers=1,
+                   requests_per_minute=None, tokens_per_minute=None, cache=None, on_frame=None,
+                   resume=False, backend=None, batch_size=1, dedup_threshold=None, prefilter=None,
+                   payload=None, rate_limiter=None, executor=None, annotate=True):
+    """
+    Analyzes every extracted frame in folder_path and writes summary.json/summary.csv.
+
+    Args:
+        folder_path (str): Directory containing frame_XXXX.jpg files.
+        output_dir (str): Directory for summaries and annotated frames.
+        max_workers (int): Number of frames analyzed concurrently.
+        requests_per_minute (int): Optional API request budget shared by all workers.
+        tokens_per_minute (int): Optional API token budget shared by all workers.
+        cache (ResponseCache): Optional persistent cache of model responses.
+        on_frame (callable): Optional on_frame(frame_data, totals) progress hook, called in frame
+            order as each frame is merged; frame_data is None for frames that failed, and totals
+            holds the running "points", "passes" and "rebounds".
+        resume (bool): Skip frames already recorded in output_dir's checkpoint log instead of
+            starting it afresh.
+        backend (AnalyzerBackend): Service answering the requests (default: get_backend()).
+        batch_size (int): Consecutive frames sent together in one request (see analyze_images).
+        dedup_threshold (int): If set, frames whose perceptual hash is within this many bits of a
+            recently analyzed frame are recorded as skipped instead of sent (see frame_dedup).
+        prefilter (FramePrefilter): If set, frames it scores below its threshold are recorded
+            as skipped instead of sent (see frame_prefilter).
+        payload (PayloadOptions): How frames are downscaled, cropped and encoded for the model
+            (default: the extracted JPEGs as they are; see payload_optimizer).
+        rate_limiter (RateLimiter): Budget shared with other analyses running at the same time;
+            replaces requests_per_minute and tokens_per_minute.
+        executor (Executor): Worker pool shared with other analyses, sized max_workers; left
+            open afterwards.
+        annotate (bool): Write an annotated copy of each frame to output_dir/annotated_frames
+            (see highlight_renderer for an annotated video instead).
+
+    Each frame's result is appended to output_dir/frames.jsonl as it is merged, and the
+    summaries are built by streaming over that log. Results are merged in frame order
+    regardless of completion order, so outputs are deterministic. Per-stage timings and
+    counters for the run are saved to output_dir/timings.json (see metrics).
+    """
+    logger.info(f"Starting frame analysis for folder: {folder_path} (workers={max_workers})")
+    filenames = sorted((f for f in os.listdir(folder_path) if f.endswith(".jpg")), key=frame_order)
+    sources = ((f, os.path.join(folder_path, f)) for f in filenames)
+    return _analyze_sources(sources, output_dir, max_workers, requests_per_minute, tokens_per_minute,
+                            cache, on_frame, resume, backend, batch_size, dedup_threshold, prefilter,
+                            payload, rate_limiter, executor, annotate=annotate)
+
+def iter_video_frames(video_path, step=30, mode="auto", frames_per_minute=None, frames_dir=None,
+                      frame_times=None):
+    """
+    Streams sampled frames of a video as (frame_XXXX.jpg name, decoded frame) pairs.
+    Frames are only written to disk if frames_dir is given. If frame_times is a dict, each
+    frame's position in the video (seconds) is stored in it under the frame's name.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        logger.error(f"Failed to open video file: {video_path}")
+        raise IOError(f"Failed to open video file: {video_path}")
+    if frames_dir:
+        os.makedirs(frames_dir, exist_ok=True)
+
+    if frames_per_minute:
+        frames = iter_adaptive_frames(cap, frames_per_minute)
+    else:
+        frames = iter_sampled_frames(cap, step, mode)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+
+    try:
+        saved_count = 0
+        while True:
+            with metrics.timed("decode"):
+                sample = next(frames, None)
+            if sample is None:
+                break
+            frame = sample[1]
+            filename = f"frame_{saved_count:04d}.jpg"
+            if frame_times is not None:
+                frame_times[filename] = sample[0] / fps
+            if frames_dir:
+                with metrics.timed("frame_write"):
+                    if not cv2.imwrite(os.path.join(frames_dir, filename), frame):
+                        logger.error(f"Failed to save frame {saved_count}")
+            saved_count += 1
+            yield filename, frame
+    finally:
+        cap.release()
+
+def analyze_video(video_path, output_dir="output", step=30, mode="auto", frames_per_minute=None,
+                  frames_dir=None, max_workers=1, requests_per_minute=None, tokens_per_minute=None,
+                  cache=None, on_frame=None, resume=False, backend=None, batch_size=1,
+                  dedup_threshold=None, prefilter=None, payload=None, rate_limiter=None, executor=None,
+                  stop_event=None, annotate=False):
+    """
+    Streams frames from the decoder straight into analysis without a disk round trip.
+
+    Sampling arguments are those of extract_frames; analysis arguments those of analyze_frames.
+    Decoded frames are JPEG-encoded in memory for the request. No annotated stills are written
+    unless annotate is set: render the results onto the video afterwards with highlight_renderer.
+    If stop_event is set, no further frames are sampled and the frames so far are summarized.
+    """
+    logger.info(f"Starting in-memory analysis of {video_path} (workers={max_workers})")
+    frame_times = {}
+    sources = iter_video_frames(video_path, step, mode, frames_per_minute, frames_dir, frame_times)
+    if stop_event is not None:
+        sources = itertools.takewhile(lambda source: not stop_event.is_set(), sources)
+    return _analyze_sources(sources, output_dir, max_workers, requests_per_minute, tokens_per_minute,
+                            cache, on_frame, resume, backend, batch_size, dedup_threshold, prefilter,
+                            payload, rate_limiter, executor, frame_times, annotate)
+
+def analyze_stream(url, output_dir="output", interval=2.0, queue_size=4, duration=None, stop_event=None,
+                   max_workers=1, requests_per_minute=None, tokens_per_minute=None, cache=None,
+                   on_frame=None, backend=None, batch_size=1, dedup_threshold=None, prefilter=None,
+                   payload=None):
+    """
+    Analyzes a live stream (RTSP/HTTP URL) as it is broadcast, one frame every `interval`
+    seconds of wall-clock time, until it ends, `duration` passes or stop_event is set.
+
+    Sampled frames wait in a queue of queue_size; when analysis falls behind, the oldest are
+    dropped so results stay within roughly (queue_size + 2 * max_workers) intervals of the
+    broadcast. Analysis arguments are those of analyze_frames.
+    """
+    capture = LiveCapture(url, interval, queue_size, duration, stop_event=stop_event)
+    logger.info(f"Starting live analysis of {url} (every {interval}s, workers={max_workers})")
+
+    def report(frame_data, totals):
+        if frame_data is not None:
+            lag = capture.lag(frame_data["frame"])
+            if lag is not None:
+                # Capture to merged result: how far the running totals trail the game
+                metrics.observe("stage_seconds", lag, stage="live_lag")
+        if on_frame is not None:
+            on_frame(frame_data, totals)
+
+    capture.start()
+    try:
+        return _analyze_sources(capture.frames(), output_dir, max_workers, requests_per_minute,
+                                tokens_per_minute, cache, report, False, backend, batch_size,
+                                dedup_threshold, prefilter, payload, frame_times=capture.frame_times,
+                                on_merged=capture.forget)
+    finally:
+        capture.stop()
+        capture.join()
+        logger.info(f"Live stream: sampled {capture.sampled} frames, dropped {capture.queue.dropped} "
+                    f"while analysis was behind")
+
+def estimate_sample_count(video_path, step=30, frames_per_minute=None):
+    """Estimates how many frames extract_frames/analyze_video will sample, or None if unknown."""
+    cap = cv2.VideoCapture(video_path)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    cap.release()
+    if total_frames <= 0:
+        return None
+    if frames_per_minute:
+        return max(1, round(total_frames / fps / 60 * frames_per_minute))
+    return -(-total_frames // step)
+
+def _new_totals():
+    return {"points": defaultdict(int), "passes": 0, "rebounds": defaultdict(int)}
+
+def _accumulate(totals, frame_data):
+    for jersey, score in frame_data.get("points", {}).items():
+        totals["points"][jersey] += score
+    totals["passes"] += frame_data.get("passes", 0)
+    for jersey, count in frame_data.get("rebounds", {}).items():
+        totals["rebounds"][jersey] += count
+
+def _repair_checkpoint(checkpoint_path):
+    """Truncates a torn final line left by a crash mid-write, so appends start on a fresh line."""
+    with open(checkpoint_path, "rb+") as f:
+        data = f.read()
+        valid_end = data.rfind(b"\n") + 1
+        if valid_end != len(data):
+            logger.warning(f"Dropping partial record at the end of {checkpoint_path}")
+            f.truncate(valid_end)
+
+def frame_order(filename):
+    """
+    Sort key putting frame names in frame order by their number, which string order gets
+    wrong once the index outgrows its zero padding (frame_10000.jpg after frame_9999.jpg).
+    """
+    match = re.search(r"(\d+)\D*$", filename)
+    return (int(match.group(1)), filename) if match else (-1, filename)
+
+def iter_checkpoint(checkpoint_path):
+    """
+    Yields the frame records of a checkpoint log in frame order. If a frame was recorded more
+    than once the last record wins. Only frame names and file offsets are held in memory.
+    """
+    offsets = {}
+    with open(checkpoint_path, "rb") as f:
+        while True:
+            offset = f.tell()
+            line = f.readline()
+            if not line.endswith(b"\n"):
+                break
+            try:
+                record = normalize_frame_data(json.loads(line))
+                offsets[record["frame"]] = offset
+            except (ValueError, KeyError, TypeError):
+                # Also records of unusable replies checkpointed by older versions
+                logger.warning(f"Skipping unreadable checkpoint record at byte {offset}")
+
+        for frame in sorted(offsets, key=frame_order):
+            f.seek(offsets[frame])
+            yield normalize_frame_data(json.loads(f.readline()))
+
+def write_summaries(checkpoint_path, output_dir):
+    """
+    Builds summary.json, summary.csv and the events.npz event store by streaming over a
+    checkpoint log. Returns the (points, passes, rebounds) totals.
+    """
+    totals = _new_totals()
+    events = EventStoreBuilder(os.path.basename(os.path.abspath(output_dir)))
+    try:
+        with open(os.path.join(output_dir, "summary.json"), "w") as jf, \
+                open(os.path.join(output_dir, "summary.csv"), "w", newline="") as cf:
             writer = csv.DictWriter(cf, fieldnames=["frame", "points", "passes", "rebounds"])
             writer.writeheader()
-            for row in frame_data_list:
+
+            # Same layout as json.dump(frame_data_list, jf, indent=2), one record at a time
+            jf.write("[")
+            count = 0
+            for row in iter_checkpoint(checkpoint_path):
+                _accumulate(totals, row)
+                events.add(row)
+                jf.write(",\n" if count else "\n")
+                jf.write("\n".join("  " + line for line in json.dumps(row, indent=2).splitlines()))
                 writer.writerow({
                     "frame": row["frame"],
                     "points": json.dumps(row.get("points", {})),
                     "passes": row.get("passes", 0),
                     "rebounds": json.dumps(row.get("rebounds", {})),
                 })
-        logger.info("Summary CSV file saved successfully")
+                count += 1
+            jf.write("\n]" if count else "]")
+        events.build().save(os.path.join(output_dir, EVENTS_FILENAME))
+        logger.info("Summary JSON and CSV files and event store saved successfully")
     except Exception as e:
-        logger.error(f"Error saving summary.csv: {str(e)}")
+        logger.error(f"Error saving summaries: {str(e)}")
 
-    return points, passes, rebounds
+    return totals["points"], totals["passes"], totals["rebounds"]
 
-def print_final_stats(csv_path):
-    logger.info(f"Reading final stats from: {csv_path}")
-    points = defaultdict(int)
-    rebounds = defaultdict(int)
-    total_passes = 0
+def _analyze_sources(sources, output_dir, max_workers, requests_per_minute, tokens_per_minute, cache,
+                     on_frame=None, resume=False, backend=None, batch_size=1, dedup_threshold=None,
+                     prefilter=None, payload=None, rate_limiter=None, executor=None, frame_times=None,
+                     annotate=False, on_merged=None):
+    os.makedirs(output_dir, exist_ok=True)
+    annotate_dir = None
+    if annotate:
+        annotate_dir = output_dir
+        os.makedirs(os.path.join(output_dir, "annotated_frames"), exist_ok=True)
 
-    try:
-        with open(csv_path, newline='') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                try:
-                    # Parse points
-                    frame_points = json.loads(row["points"] or "{}")
-                    if isinstance(frame_points, dict):
-                        for jersey, score in frame_points.items():
-                            points[jersey] += score
-
-                    # Parse rebounds
-                    frame_rebounds = json.loads(row["rebounds"] or "{}")
-                    if isinstance(frame_rebounds, dict):
-                        for jersey, count in frame_rebounds.items():
-                            rebounds[jersey] += count
-
-                    # Parse passes
-                    passes_val = row["passes"].strip()
-                    if passes_val.isdigit():
-                        total_passes += int(passes_val)
-
-                except (json.JSONDecodeError, ValueError) as e:
-                    logger.error(f"Error parsing row {row.get('frame', '?')}: {str(e)}")
-
-        # --- Final Output ---
-        print("\n🏀 Final Game Stats from Video Analysis")
-        
-        print("\n1️⃣ Total Points Scored by Jersey:")
-        if points:
-            for jersey, score in points.items():
-                print(f"   - Jersey #{jersey}: {score} point(s)")
-        else:
-            print("   - No points detected.")
+    checkpoint_path = os.path.join(output_dir, CHECKPOINT_FILENAME)
+    totals = _new_totals()
+
+    if resume and os.path.exists(checkpoint_path):
+        _repair_checkpoint(checkpoint_path)
+        done = set()
+        for frame_data in iter_checkpoint(checkpoint_path):
+            done.add(frame_data["frame"])
+            _accumulate(totals, frame_data)
+        logger.info(f"Resuming from {checkpoint_path}: {len(done)} frames already analyzed")
+        sources = ((filename, source) for filename, source in sources if filename not in done)
 
-        print("\n2️⃣ Total Passes:")
-        print(f"   - {total_passes} pass(es) detected.")
+    # Prefilter first, so the deduplicator only remembers frames that are actually sent: a
+    # frame close to a skipped one must still be analyzed
+    if prefilter is not None:
+        prefilter.reset()
+        sources = prefilter_sources(sources, prefilter)
+    deduplicator = None
+    if dedup_threshold is not None:
+        deduplicator = FrameDeduplicator(threshold=dedup_threshold)
+        sources = dedupe_sources(sources, deduplicator)
 
-        print("\n3️⃣ Total Rebounds by Jersey:")
-        if rebounds:
-            for jersey, count in rebounds.items():
-                print(f"   - Jersey #{jersey}: {count} rebound(s)")
+    if rate_limiter is None and (requests_per_minute or tokens_per_minute):
+        rate_limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+
+    # Stage timings and counters of this run alone, for timings.json
+    session = metrics.MetricsRegistry()
+    started = time.perf_counter()
+
+    # Both return (frame name, frame data) pairs: the frame data of a failed frame is None
+    def process(filename, source):
+        if isinstance(source, SKIPPED_SOURCES):
+            return filename, _skipped_frame(filename, source)
+        with metrics.recording(session):
+            return filename, _analyze_one(filename, source, annotate_dir, rate_limiter, cache, backend, payload)
+
+    def process_batch(batch):
+        wanted = [(filename, source) for filename, source in batch if not isinstance(source, SKIPPED_SOURCES)]
+        with metrics.recording(session):
+            results = iter(_analyze_batch(wanted, annotate_dir, rate_limiter, cache, backend, payload)
+                           if wanted else [])
+        return [(filename, _skipped_frame(filename, source) if isinstance(source, SKIPPED_SOURCES) else next(results))
+                for filename, source in batch]
+
+    max_workers = max(1, max_workers)
+    # A shared executor (several videos analyzed at once) stays open for the other videos
+    with open(checkpoint_path, "a" if resume else "w") as checkpoint, \
+            (nullcontext(executor) if executor is not None else ThreadPoolExecutor(max_workers=max_workers)) as executor, \
+            metrics.recording(session):
+        # Results come back in submission (frame) order
+        if batch_size > 1:
+            batches = ((batch,) for batch in _batched(sources, batch_size))
+            batch_results = _ordered_map(executor, process_batch, batches, window=2 * max_workers)
+            results = (result for batch_result in batch_results for result in batch_result)
         else:
-            print("   - No rebounds detected.")
+            results = _ordered_map(executor, process, sources, window=2 * max_workers)
 
-    except Exception as e:
-        logger.error(f"Error reading CSV file: {str(e)}")
+        for filename, frame_data in results:
+            try:
+                metrics.inc("frames_total", status=_frame_status(frame_data))
+                # Position in the video (seconds), for time-window queries on the event store
+                position = frame_times.pop(filename, None) if frame_times else None
+                if frame_data is not None and position is not None:
+                    frame_data["time"] = round(position, 3)
+                if frame_data is not None:
+                    # Totals first: a record that can't be added up must not reach the checkpoint,
+                    # where every resume would replay it
+                    _accumulate(totals, frame_data)
+                    checkpoint.write(json.dumps(frame_data) + "\n")
+                    checkpoint.flush()
+
+                if on_frame is not None:
+                    on_frame(frame_data, {
+                        "points": dict(totals["points"]),
+                        "passes": totals["passes"],
+                        "rebounds": dict(totals["rebounds"])
+                    })
+            finally:
+                if on_merged is not None:
+                    on_merged(filename)
+
+    if cache is not None:
+        stats = cache.stats()
+        logger.info(f"Response cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries")
+    if deduplicator is not None:
+        logger.info(f"Deduplication: skipped {deduplicator.skipped} of {deduplicator.checked} frames "
+                    f"({deduplicator.skipped} API calls avoided)")
+    if prefilter is not None:
+        logger.info(f"Prefilter: skipped {prefilter.filtered} of {prefilter.checked} frames "
+                    f"scoring below {prefilter.threshold}")
+
+    results = write_summaries(checkpoint_path, output_dir)
+    try:
+        session.write_report(os.path.join(output_dir, TIMINGS_FILENAME),
+                             wall_seconds=round(time.perf_counter() - started, 3))
+    except OSError as e:
+        logger.error(f"Error saving timing report: {str(e)}")
+    return results
 
 def main():
+    parser = argparse.ArgumentParser(description="Analyze a basketball game video.")
+    parser.add_argument("video", nargs="?", default="GirlsNav.mp4",
+                        help="Path to the game video, or the stream URL with --live")
+    parser.add_argument("--live", action="store_true",
+                        help="Analyze a live RTSP/HTTP stream in real time (stop with Ctrl-C)")
+    parser.add_argument("--live-interval", type=float, default=2.0, metavar="SECONDS",
+                        help="Seconds between frames sampled from a live stream")
+    parser.add_argument("--live-queue", type=int, default=4,
+                        help="Live frames waiting for analysis before the oldest are dropped")
+    parser.add_argument("--duration", type=float, default=None, metavar="SECONDS",
+                        help="Stop a live analysis after this long")
+    parser.add_argument("--step", type=int, default=30, help="Frame sampling interval")
+    parser.add_argument("--fpm", type=float, default=None,
+                        help="Use motion-adaptive sampling with this many frames per minute instead of --step")
+    parser.add_argument("--workers", type=int, default=1, help="Concurrent frame analyses")
+    parser.add_argument("--dedup", type=int, default=None, metavar="BITS",
+                        help="Skip frames within this Hamming distance of a recently analyzed frame")
+    parser.add_argument("--prefilter", type=float, default=None, metavar="SCORE",
+                        help="Only analyze frames the local CV prefilter scores at or above this")
+    parser.add_argument("--hoop", default=None, metavar="X,Y,W,H[;...]",
+                        help="Hoop regions for the prefilter, as fractions of the frame size")
+    parser.add_argument("--prefilter-model", default=None, help="Optional ONNX event classifier")
+    parser.add_argument("--batch-size", type=int, default=1, help="Frames sent per API request")
+    parser.add_argument("--max-dim", default=None, metavar="PIXELS|auto",
+                        help="Downscale frames to this longest side before sending ('auto': to what "
+                             "the API would downscale them to anyway)")
+    parser.add_argument("--jpeg-quality", type=int, default=None, help="JPEG quality of sent frames")
+    parser.add_argument("--detail", choices=["low", "high", "auto"], default=None,
+                        help="Image detail mode requested from the API")
+    parser.add_argument("--crop", default=None, metavar="X,Y,W,H[;...]",
+                        help="Only send the part of each frame covering these regions (fractions of the frame size)")
+    parser.add_argument("--extract-processes", type=int, default=1,
+                        help="Extract frames to disk first using this many processes")
+    parser.add_argument("--rpm", type=int, default=None, help="API requests-per-minute budget")
+    parser.add_argument("--max-retries", type=int, default=4,
+                        help="Retries with jittered backoff for rate-limited, timed-out or failed API calls")
+    parser.add_argument("--hedge", type=float, default=None, metavar="QUANTILE",
+                        help="Send a duplicate request when a call outlasts this latency quantile (e.g. 0.95)")
+    parser.add_argument("--tpm", type=int, default=None, help="API tokens-per-minute budget")
+    parser.add_argument("--cache", default="response_cache.sqlite3",
+                        help="Response cache database ('' to disable)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip frames already recorded in output/frames.jsonl")
+    parser.add_argument("--render", choices=["none", "full", "highlights"], default="highlights",
+                        help="After the analysis, render the results onto the video: all of it as "
+                             "output/annotated.mp4, or the moments around points and rebounds as "
+                             "output/highlights.mp4")
+    parser.add_argument("--no-frames", action="store_true",
+                        help="Keep sampled frames in memory only instead of also saving them")
+    parser.add_argument("--log-level", default="INFO", help="Log level (e.g. DEBUG, INFO, WARNING)")
+    parser.add_argument("--log-file", default="basketball_analysis.log", help="Log file ('' to disable)")
+    parser.add_argument("--frame-log-level", default=None,
+                        help="Level for per-frame detail such as raw model responses (default: --log-level)")
+    parser.add_argument("--frame-log-every", type=int, default=1, metavar="N",
+                        help="Only keep every N-th per-frame log record")
+    args = parser.parse_args()
+
+    configure_logging(args.log_level.upper(), args.log_file or None,
+                      frame_level=args.frame_log_level.upper() if args.frame_log_level else None,
+                      frame_sample_every=args.frame_log_every)
     logger.info("Starting basketball analysis...")
-    
-    # Step 1: Extract frames from video
-    video_path = "GirlsNav.mp4"
-    logger.info(f"Extracting frames from video: {video_path}")
-    frames_dir = extract_frames(video_path, output_dir="GirlsNav_frames", step=30)
+    configure_backend(max_retries=args.max_retries, hedge_quantile=args.hedge,
+                      max_connections=max(8, 2 * args.workers))
+    cache = ResponseCache(args.cache) if args.cache else None
+    prefilter = None
+    if args.prefilter is not None:
+        prefilter = FramePrefilter(args.prefilter, parse_regions(args.hoop), args.prefilter_model)
+    payload = None
+    if args.max_dim or args.jpeg_quality or args.detail or args.crop:
+        payload = PayloadOptions(parse_max_dimension(args.max_dim), args.jpeg_quality, args.detail,
+                                 parse_regions(args.crop))
+
+    # Steps 1-2: Stream sampled frames from the video straight into analysis
+    video_path = args.video
+    logger.info(f"Analyzing video: {video_path}")
+    if args.live:
+        stop = threading.Event()
+        # Ctrl-C stops sampling; frames already sampled are still analyzed and summarized
+        signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+        points, total_passes, rebounds = analyze_stream(
+            video_path, output_dir="output", interval=args.live_interval, queue_size=args.live_queue,
+            duration=args.duration, stop_event=stop, max_workers=args.workers,
+            requests_per_minute=args.rpm, tokens_per_minute=args.tpm, cache=cache,
+            on_frame=lambda frame_data, totals: logger.info(f"Live totals: {json.dumps(totals)}"),
+            batch_size=args.batch_size, dedup_threshold=args.dedup, prefilter=prefilter, payload=payload)
+    elif args.extract_processes > 1 and not args.fpm:
+        frames_dir = extract_frames(video_path, output_dir="GirlsNav_frames", step=args.step,
+                                    processes=args.extract_processes)
+        points, total_passes, rebounds = analyze_frames(
+            frames_dir, output_dir="output", max_workers=args.workers,
+            requests_per_minute=args.rpm, tokens_per_minute=args.tpm, cache=cache, resume=args.resume,
+            batch_size=args.batch_size, dedup_threshold=args.dedup, prefilter=prefilter, payload=payload,
+            annotate=False)
+    else:
+        points, total_passes, rebounds = analyze_video(
+            video_path, output_dir="output", step=args.step, frames_per_minute=args.fpm,
+            frames_dir=None if args.no_frames else "GirlsNav_frames", max_workers=args.workers,
+            requests_per_minute=args.rpm, tokens_per_minute=args.tpm, cache=cache, resume=args.resume,
+            batch_size=args.batch_size, dedup_threshold=args.dedup, prefilter=prefilter, payload=payload)
 
-    # Step 2: Analyze frames
-    logger.info("Starting frame analysis...")
-    points, total_passes, rebounds = analyze_frames(frames_dir, output_dir="output")
+    # Step 3: Render the results onto the video (a live stream leaves no file to render)
+    if args.render != "none" and not args.live:
+        logger.info("Rendering annotated video...")
+        render_output(video_path, "output", highlights=args.render == "highlights",
+                      step=args.step if args.extract_processes > 1 and not args.fpm else None)
 
-    # Step 3: Print final stats
+    # Step 4: Print final stats
     logger.info("Generating final statistics...")
     print_final_stats(os.path.join("output", "summary.csv"))
     
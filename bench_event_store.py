@@ -0,0 +1,100 @@
+import argparse
+import csv
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+
+from event_store import EVENTS_FILENAME, EventStore, EventStoreBuilder
+
+def synthetic_game(rng, frames, jerseys):
+    """Frame records shaped like the pipeline's, with sparse events as in real games."""
+    for i in range(frames):
+        record = {"points": {}, "passes": 0, "rebounds": {}, "frame": f"frame_{i:04d}.jpg", "time": i * 2.0}
+        roll = rng.random()
+        if roll < 0.08:
+            record["points"] = {rng.choice(jerseys): rng.choice((2, 2, 3, 1))}
+        elif roll < 0.14:
+            record["rebounds"] = {rng.choice(jerseys): 1}
+        record["passes"] = rng.choice((0, 0, 1, 1, 2))
+        yield record
+
+def write_game(game_dir, records):
+    """Writes summary.csv (JSON in cells, as the pipeline does) and events.npz for one game."""
+    os.makedirs(game_dir)
+    builder = EventStoreBuilder(os.path.basename(game_dir))
+    with open(os.path.join(game_dir, "summary.csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["frame", "points", "passes", "rebounds"])
+        writer.writeheader()
+        for record in records:
+            builder.add(record)
+            writer.writerow({"frame": record["frame"], "points": json.dumps(record["points"]),
+                             "passes": record["passes"], "rebounds": json.dumps(record["rebounds"])})
+    builder.build().save(os.path.join(game_dir, EVENTS_FILENAME))
+
+def csv_points_by_jersey(game_dirs, jersey=None):
+    """The old way: re-read every game's summary.csv and json.loads each cell."""
+    points = defaultdict(int)
+    for game_dir in game_dirs:
+        with open(os.path.join(game_dir, "summary.csv"), newline="") as f:
+            for row in csv.DictReader(f):
+                for label, score in json.loads(row["points"] or "{}").items():
+                    if jersey is None or label == jersey:
+                        points[label] += score
+    return dict(points)
+
+def timed(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare season queries over summary.csv files and the event store.")
+    parser.add_argument("--games", type=int, default=300)
+    parser.add_argument("--frames", type=int, default=1440, help="Sampled frames per game (1440 = 48 min at 2s)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    jerseys = [str(n) for n in (0, 3, 5, 10, 11, 12, 14, 21, 23, 24, 30, 33)]
+    scratch_dir = tempfile.mkdtemp(prefix="bench_event_store_")
+    try:
+        game_dirs = [os.path.join(scratch_dir, f"game_{g:03d}") for g in range(args.games)]
+        for game_dir in game_dirs:
+            write_game(game_dir, synthetic_game(rng, args.frames, jerseys))
+        season_path = os.path.join(scratch_dir, "season_events.npz")
+        EventStore.concat([EventStore.load(os.path.join(d, EVENTS_FILENAME)) for d in game_dirs]).save(season_path)
+
+        csv_result, csv_seconds = timed(lambda: csv_points_by_jersey(game_dirs), repeat=1)
+        store, load_seconds = timed(lambda: EventStore.load(season_path))
+        store_result, jersey_seconds = timed(lambda: store.by_jersey("points"))
+        assert store_result == csv_result, "event store and CSV totals differ"
+        _, one_jersey_seconds = timed(lambda: store.by_jersey("points", jersey="23"))
+        _, quarter_seconds = timed(lambda: store.by_period("points", 4))
+        _, window_seconds = timed(lambda: store.by_window("points", 300, jersey="23"))
+        _, game_seconds = timed(lambda: store.by_game("rebounds"))
+
+        print(f"{args.games} games, {args.games * args.frames} frames, {len(store)} events "
+              f"({os.path.getsize(season_path) / 1e6:.1f} MB store)")
+        print(f"{'query':<40} {'ms':>10}")
+        for label, seconds in [
+            ("points by jersey, re-parsing CSVs", csv_seconds),
+            ("load season store", load_seconds),
+            ("points by jersey", jersey_seconds),
+            ("points of jersey 23", one_jersey_seconds),
+            ("points per quarter", quarter_seconds),
+            ("jersey 23 points per 5 minutes", window_seconds),
+            ("rebounds per game", game_seconds),
+        ]:
+            print(f"{label:<40} {seconds * 1000:>10.2f}")
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
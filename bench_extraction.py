@@ -0,0 +1,58 @@
+import argparse
+import shutil
+import tempfile
+import time
+
+import cv2
+
+from basketball_analysis import extract_frames_parallel, iter_sampled_frames
+
+def bench_mode(video_path, step, mode):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise SystemExit(f"Cannot open video: {video_path}")
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    start = time.perf_counter()
+    sampled = sum(1 for _ in iter_sampled_frames(cap, step, mode))
+    elapsed = time.perf_counter() - start
+    cap.release()
+    return total_frames, sampled, elapsed
+
+def bench_processes(video_path, step, processes):
+    output_dir = tempfile.mkdtemp(prefix="bench_frames_")
+    try:
+        start = time.perf_counter()
+        extract_frames_parallel(video_path, output_dir, step, processes)
+        return time.perf_counter() - start
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark frame extraction.")
+    parser.add_argument("video", help="Video to benchmark, ideally a long 1080p game")
+    parser.add_argument("--step", type=int, default=30)
+    parser.add_argument("--modes", nargs="+", default=["read", "grab", "seek"])
+    parser.add_argument("--processes", type=int, default=None,
+                        help="Also measure extract_frames_parallel (with JPEG writes) for 1..N processes")
+    args = parser.parse_args()
+
+    print("Decode modes (no disk writes)")
+    print(f"{'mode':<6} {'sampled':>8} {'seconds':>9} {'video fps':>10} {'speedup':>8}")
+    baseline = None
+    for mode in args.modes:
+        total_frames, sampled, elapsed = bench_mode(args.video, args.step, mode)
+        baseline = baseline or elapsed
+        print(f"{mode:<6} {sampled:>8} {elapsed:>9.2f} {total_frames / elapsed:>10.1f} {baseline / elapsed:>7.2f}x")
+
+    if args.processes:
+        print("\nParallel extraction")
+        print(f"{'procs':<6} {'seconds':>9} {'video fps':>10} {'speedup':>8}")
+        baseline = None
+        for processes in range(1, args.processes + 1):
+            elapsed = bench_processes(args.video, args.step, processes)
+            baseline = baseline or elapsed
+            print(f"{processes:<6} {elapsed:>9.2f} {total_frames / elapsed:>10.1f} {baseline / elapsed:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+
+import basketball_analysis
+import metrics
+from analyzer_backends import OpenAIBackend
+from mock_openai_server import MockConfig, start_mock_server
+from replay_stream import start_replay_server
+
+def dropped_total():
+    return metrics.REGISTRY.counters.get("live_frames_dropped_total", {}).get((), 0)
+
+def bench_live(url, workers, interval, queue_size, duration):
+    output_dir = tempfile.mkdtemp(prefix="bench_live_")
+    try:
+        frames = []
+        dropped_before = dropped_total()
+        basketball_analysis.analyze_stream(url, output_dir=output_dir, interval=interval, queue_size=queue_size,
+                                           duration=duration, max_workers=workers,
+                                           on_frame=lambda frame_data, totals: frames.append(frame_data))
+        with open(os.path.join(output_dir, basketball_analysis.TIMINGS_FILENAME)) as f:
+            lag = json.load(f)["stages"].get("live_lag", {})
+        return len(frames), dropped_total() - dropped_before, lag
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure how far live-stream results trail the broadcast, replaying a video in real time.")
+    parser.add_argument("video", help="Video to replay as the live stream")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--interval", type=float, default=0.5, help="Seconds between sampled frames")
+    parser.add_argument("--queue-size", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=20, help="Seconds of stream analyzed per run")
+    parser.add_argument("--latency-ms", type=float, default=800)
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    args = parser.parse_args()
+
+    replay, url = start_replay_server(os.path.abspath(args.video), loop=True)
+    server, base_url = start_mock_server(config=MockConfig(latency_ms=args.latency_ms,
+                                                           latency_dist=args.latency_dist, seed=0))
+    basketball_analysis.set_backend(OpenAIBackend(api_key="mock", base_url=base_url))
+    try:
+        print(f"Sampling every {args.interval}s for {args.duration}s, model latency {args.latency_ms:.0f}ms, "
+              f"queue {args.queue_size}")
+        print(f"{'workers':>7} {'analyzed':>9} {'dropped':>8} {'lag p50 s':>10} {'lag p95 s':>10} {'lag max s':>10}")
+        for workers in args.workers:
+            analyzed, dropped, lag = bench_live(url, workers, args.interval, args.queue_size, args.duration)
+            print(f"{workers:>7} {analyzed:>9} {dropped:>8} {lag.get('p50_seconds', 0):>10.2f} "
+                  f"{lag.get('p95_seconds', 0):>10.2f} {lag.get('max_seconds', 0):>10.2f}")
+    finally:
+        server.shutdown()
+        replay.terminate()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import basketball_analysis
+from analyzer_backends import AnalyzerBackend, Completion
+from logging_setup import LOG_FORMAT, configure_logging, stop_logging
+
+# A realistic raw response, so logging it costs what logging real responses costs
+RESPONSE = '```json\n{"points": {"23": 2}, "passes": 1, "rebounds": {"11": 1}}\n```'
+
+class InstantBackend(AnalyzerBackend):
+    """Answers immediately, so the run time is the pipeline's own overhead."""
+    name = "instant"
+
+    def complete(self, messages, model, max_tokens=500):
+        return Completion(RESPONSE, 0, 0)
+
+def reset_logging():
+    stop_logging()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    for name in ("basketball_analysis.frames",):
+        logging.getLogger(name).filters = []
+        logging.getLogger(name).setLevel(logging.NOTSET)
+
+def sync_debug(log_path, devnull):
+    """The old import-time setup: DEBUG to a file and the console, written by the logging thread."""
+    formatter = logging.Formatter(LOG_FORMAT)
+    root = logging.getLogger()
+    for handler in (logging.FileHandler(log_path), logging.StreamHandler(devnull)):
+        handler.setFormatter(formatter)
+        root.addHandler(handler)
+    root.setLevel(logging.DEBUG)
+
+SETUPS = {
+    "logging off": lambda log_path, devnull: logging.getLogger().setLevel(logging.CRITICAL),
+    "sync DEBUG (old)": sync_debug,
+    "queue DEBUG": lambda log_path, devnull: configure_logging(logging.DEBUG, log_path, devnull),
+    "queue INFO": lambda log_path, devnull: configure_logging(logging.INFO, log_path, devnull),
+    "queue INFO, debug 1/50": lambda log_path, devnull: configure_logging(
+        logging.INFO, log_path, devnull, frame_level=logging.DEBUG, frame_sample_every=50),
+}
+
+def run(video_path, step, workers, setup):
+    scratch_dir = tempfile.mkdtemp(prefix="bench_logging_")
+    devnull = open(os.devnull, "w")
+    try:
+        reset_logging()
+        SETUPS[setup](os.path.join(scratch_dir, "bench.log"), devnull)
+        frames = []
+        start = time.perf_counter()
+        basketball_analysis.analyze_video(video_path, output_dir=os.path.join(scratch_dir, "output"), step=step,
+                                          max_workers=workers,
+                                          on_frame=lambda frame_data, totals: frames.append(frame_data))
+        elapsed = time.perf_counter() - start
+        # Queued records still being written are not on the analysis threads' clock
+        reset_logging()
+        return len(frames), elapsed
+    finally:
+        devnull.close()
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+def log_calls(frames):
+    """Makes the log calls one frame makes in analyze_video; returns caller-side seconds per frame."""
+    frame_logger = basketball_analysis.frame_logger
+    start = time.perf_counter()
+    for i in range(frames):
+        filename = f"frame_{i:04d}.jpg"
+        frame_logger.info("Analyzing %s...", filename)
+        frame_logger.debug("Sending request to %s backend...", "openai")
+        frame_logger.debug("Received response from %s backend", "openai")
+        frame_logger.debug("Raw result for %s: %s", filename, RESPONSE)
+        frame_logger.debug("Annotating frame: %s", filename)
+        frame_logger.debug("Annotated frame saved to: %s", filename)
+    return (time.perf_counter() - start) / frames
+
+def bench_calls(setup, frames):
+    scratch_dir = tempfile.mkdtemp(prefix="bench_logging_")
+    devnull = open(os.devnull, "w")
+    try:
+        reset_logging()
+        SETUPS[setup](os.path.join(scratch_dir, "bench.log"), devnull)
+        # Bursts of 1000 frames with pauses, as in a real run where the API dominates,
+        # so the listener can drain the queue between bursts
+        per_frame = []
+        for _ in range(max(1, frames // 1000)):
+            per_frame.append(log_calls(min(frames, 1000)))
+            time.sleep(0.2)
+        reset_logging()
+        return min(per_frame)
+    finally:
+        devnull.close()
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-frame logging overhead of the analysis loop.")
+    parser.add_argument("video", help="Video to analyze")
+    parser.add_argument("--step", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per setup; the fastest is reported")
+    parser.add_argument("--call-frames", type=int, default=5000,
+                        help="Frames' worth of log calls timed on the calling thread")
+    args = parser.parse_args()
+
+    basketball_analysis.set_backend(InstantBackend())
+    video_path = os.path.abspath(args.video)
+
+    # Interleave the setups so drift (page cache, CPU frequency) affects them all alike
+    best = {}
+    for _ in range(args.repeat):
+        for setup in SETUPS:
+            result = run(video_path, args.step, args.workers, setup)
+            if setup not in best or result[1] < best[setup][1]:
+                best[setup] = result
+
+    print(f"{'logging':<24} {'frames':>7} {'seconds':>9} {'ms/frame':>9} {'overhead ms/frame':>18} "
+          f"{'log calls us/frame':>19}")
+    baseline = None
+    for setup, (frames, elapsed) in best.items():
+        per_frame = elapsed / max(frames, 1) * 1000
+        if baseline is None:
+            baseline = per_frame
+        calls = bench_calls(setup, args.call_frames) * 1e6
+        print(f"{setup:<24} {frames:>7} {elapsed:>9.2f} {per_frame:>9.2f} {per_frame - baseline:>18.2f} "
+              f"{calls:>19.1f}")
+
+if __name__ == "__main__":
+    main()
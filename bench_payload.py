@@ -0,0 +1,114 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import basketball_analysis
+from analyzer_backends import OpenAIBackend
+from bench_pipeline import TimedBackend, percentile
+from frame_prefilter import parse_regions
+from mock_openai_server import MockConfig, start_mock_server
+from payload_optimizer import PayloadOptions
+
+class SizedBackend(TimedBackend):
+    """TimedBackend that also records the size of every request body."""
+    def __init__(self, backend):
+        super().__init__(backend)
+        self.request_bytes = []
+
+    def complete(self, messages, model, max_tokens=500):
+        size = len(json.dumps(messages))
+        with self._lock:
+            self.request_bytes.append(size)
+        return super().complete(messages, model, max_tokens)
+
+    def reset(self):
+        with self._lock:
+            request_bytes, self.request_bytes = self.request_bytes, []
+        return super().reset() + (request_bytes,)
+
+def run(video_path, step, workers, backend, payload):
+    """Analyzes the video once. Returns ({frame: (points, passes, rebounds)}, elapsed, stats)."""
+    output_dir = tempfile.mkdtemp(prefix="bench_payload_")
+    results = {}
+
+    def on_frame(frame_data, totals):
+        if frame_data is not None:
+            results[frame_data["frame"]] = (frame_data.get("points", {}), frame_data.get("passes", 0),
+                                            frame_data.get("rebounds", {}))
+    try:
+        start = time.perf_counter()
+        basketball_analysis.analyze_video(video_path, output_dir=output_dir, step=step, max_workers=workers,
+                                          payload=payload, on_frame=on_frame)
+        return results, time.perf_counter() - start, backend.reset()
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+def agreement(results, baseline):
+    """Fraction of frames whose stats match the full-resolution run exactly."""
+    frames = set(results) & set(baseline)
+    if not frames:
+        return float("nan")
+    return sum(1 for frame in frames if results[frame] == baseline[frame]) / len(frames)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare request size, latency and stat agreement of payload settings "
+                    "against full-resolution frames.")
+    parser.add_argument("video", help="Video to analyze")
+    parser.add_argument("--step", type=int, default=30)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-dims", nargs="+", default=["auto", "1024", "768", "512"],
+                        help="Max dimensions to compare ('auto' or pixels)")
+    parser.add_argument("--qualities", type=int, nargs="+", default=[70])
+    parser.add_argument("--crop", default=None, metavar="X,Y,W,H[;...]",
+                        help="Also compare cropping to these regions")
+    parser.add_argument("--mock", action="store_true",
+                        help="Use the local mock API (sizes and latency only; its answers are random, "
+                             "so agreement is meaningless)")
+    parser.add_argument("--latency-ms", type=float, default=800)
+    args = parser.parse_args()
+
+    video_path = os.path.abspath(args.video)
+    server = None
+    if args.mock:
+        server, base_url = start_mock_server(config=MockConfig(latency_ms=args.latency_ms, seed=0))
+        backend = SizedBackend(OpenAIBackend(api_key="mock", base_url=base_url))
+    else:
+        backend = SizedBackend(basketball_analysis.get_backend())
+    basketball_analysis.set_backend(backend)
+
+    configs = [("full resolution", None)]
+    for max_dimension in args.max_dims:
+        max_dimension = max_dimension if max_dimension == "auto" else int(max_dimension)
+        configs.append((f"max-dim {max_dimension}", PayloadOptions(max_dimension)))
+    for quality in args.qualities:
+        configs.append((f"auto, quality {quality}", PayloadOptions("auto", quality)))
+    configs.append(("detail low", PayloadOptions("auto", detail="low")))
+    if args.crop:
+        configs.append(("crop, auto", PayloadOptions("auto", crop_regions=parse_regions(args.crop))))
+
+    scratch_dir = tempfile.mkdtemp(prefix="bench_payload_")
+    os.chdir(scratch_dir)
+    try:
+        print(f"{'payload':<22} {'frames':>7} {'KB/req':>8} {'seconds':>9} {'p50 ms':>8} {'p99 ms':>8} "
+              f"{'tok/frame':>10} {'agreement':>10}")
+        baseline = None
+        for label, payload in configs:
+            results, elapsed, (latencies, prompt_tokens, request_bytes) = run(
+                video_path, args.step, args.workers, backend, payload)
+            if baseline is None:
+                baseline = results
+            kilobytes = sum(request_bytes) / max(len(request_bytes), 1) / 1024
+            print(f"{label:<22} {len(results):>7} {kilobytes:>8.1f} {elapsed:>9.2f} "
+                  f"{percentile(latencies, 50) * 1000:>8.0f} {percentile(latencies, 99) * 1000:>8.0f} "
+                  f"{prompt_tokens / max(len(results), 1):>10.0f} {agreement(results, baseline):>10.1%}")
+    finally:
+        if server is not None:
+            server.shutdown()
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
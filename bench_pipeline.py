@@ -0,0 +1,160 @@
+import argparse
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import basketball_analysis
+from analyzer_backends import AnalyzerBackend, OpenAIBackend, create_backend
+from mock_openai_server import MockConfig, start_mock_server
+
+class TimedBackend(AnalyzerBackend):
+    """Wraps a backend and records the latency and prompt tokens of every call."""
+    def __init__(self, backend):
+        self.backend = backend
+        self.name = backend.name
+        self.latencies = []
+        self.prompt_tokens = 0
+        self._lock = threading.Lock()
+
+    def complete(self, messages, model, max_tokens=500):
+        start = time.perf_counter()
+        try:
+            completion = self.backend.complete(messages, model, max_tokens)
+            with self._lock:
+                self.prompt_tokens += completion.prompt_tokens or 0
+            return completion
+        finally:
+            with self._lock:
+                self.latencies.append(time.perf_counter() - start)
+
+    def reset(self):
+        with self._lock:
+            stats = (self.latencies, self.prompt_tokens)
+            self.latencies, self.prompt_tokens = [], 0
+        return stats
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+def peak_rss_mb():
+    # ru_maxrss is KB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+def report(label, frames, elapsed, stats, dropped=0):
+    latencies, prompt_tokens = stats
+    print(f"{label:<30} {frames:>7} {dropped:>8} {elapsed:>9.2f} {frames / elapsed:>10.2f} "
+          f"{percentile(latencies, 50) * 1000:>8.0f} {percentile(latencies, 99) * 1000:>8.0f} "
+          f"{prompt_tokens / max(frames, 1):>10.0f} {peak_rss_mb():>9.1f}")
+
+def bench_analyze_video(video_path, step, workers, backend, batch_size=1):
+    output_dir = tempfile.mkdtemp(prefix="bench_output_")
+    try:
+        frames = []
+        start = time.perf_counter()
+        basketball_analysis.analyze_video(video_path, output_dir=output_dir, step=step, max_workers=workers,
+                                          batch_size=batch_size,
+                                          on_frame=lambda frame_data, totals: frames.append(frame_data))
+        dropped = sum(1 for frame_data in frames if frame_data is None)
+        return len(frames), time.perf_counter() - start, backend.reset(), dropped
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+def bench_flask(video_path, workers, backend):
+    # Import here so app.py's upload/log directories land in the scratch directory. Every run
+    # analyzes the video afresh (no caches), the pipeline is imported right here rather than on
+    # a warm-up thread that could configure its backend after ours is set, and nothing is left
+    # rendering once the scratch directory is deleted.
+    os.environ.update(RESPONSE_CACHE_PATH="", RESULT_CACHE_DIR="", WARM_IMPORTS="lazy", RENDER_MODE="none",
+                      SESSION_REAP_INTERVAL="0")
+    import app as flask_app
+    flask_app.pipeline()
+    # Importing the pipeline configures the default backend; put the benchmark's back
+    basketball_analysis.set_backend(backend)
+    flask_app.app.config["ANALYSIS_WORKERS"] = workers
+    client = flask_app.app.test_client()
+
+    start = time.perf_counter()
+    with open(video_path, "rb") as f:
+        response = client.post("/analyze", data={"video": (f, os.path.basename(video_path))},
+                               content_type="multipart/form-data")
+    session_id = response.get_json()["session_id"]
+    while True:
+        status = client.get(f"/status/{session_id}").get_json()
+        if status["status"] in ("complete", "error"):
+            break
+        time.sleep(0.1)
+    elapsed = time.perf_counter() - start
+    client.post(f"/cleanup/{session_id}")
+    return status["frames_done"], elapsed, backend.reset()
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark against the local mock API.")
+    parser.add_argument("video", help="Video to analyze")
+    parser.add_argument("--step", type=int, default=30)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1],
+                        help="Frames per request to compare for analyze_video")
+    parser.add_argument("--latency-ms", type=float, default=800)
+    parser.add_argument("--per-image-ms", type=float, default=150,
+                        help="Mock latency added per extra image in a batched request")
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--sigma", type=float, default=0.4, help="Shape of the lognormal latency tail")
+    parser.add_argument("--skip-flask", action="store_true", help="Only benchmark analyze_video")
+    parser.add_argument("--resilience", action="store_true",
+                        help="Compare the SDK's default client with pooled retries and hedging instead")
+    args = parser.parse_args()
+
+    video_path = os.path.abspath(args.video)
+    def mock_config():
+        return MockConfig(latency_ms=args.latency_ms, latency_dist=args.latency_dist, per_image_ms=args.per_image_ms,
+                          sigma=args.sigma, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, seed=0)
+
+    server, base_url = start_mock_server(config=mock_config())
+    backend = TimedBackend(OpenAIBackend(api_key="mock", base_url=base_url))
+    basketball_analysis.set_backend(backend)
+
+    scratch_dir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    os.chdir(scratch_dir)
+    try:
+        print(f"{'run':<30} {'frames':>7} {'dropped':>8} {'seconds':>9} {'frames/s':>10} {'p50 ms':>8} "
+              f"{'p99 ms':>8} {'tok/frame':>10} {'peak MB':>9}")
+        if args.resilience:
+            # Latencies are per frame request, including retries and hedges
+            clients = [
+                ("SDK default client", OpenAIBackend(api_key="mock", base_url=base_url)),
+                ("pooled, 4 retries", create_backend("mock", base_url, max_retries=4)),
+                ("pooled, 4 retries, hedge p95", create_backend("mock", base_url, max_retries=4,
+                                                                hedge_quantile=0.95)),
+            ]
+            for label, client in clients:
+                backend = TimedBackend(client)
+                basketball_analysis.set_backend(backend)
+                for workers in args.workers:
+                    # Same latency and failure draws for every client
+                    server.config = mock_config()
+                    report(f"{label} w={workers}", *bench_analyze_video(video_path, args.step, workers, backend))
+            return
+
+        for batch_size in args.batch_sizes:
+            for workers in args.workers:
+                report(f"analyze_video w={workers} b={batch_size}",
+                       *bench_analyze_video(video_path, args.step, workers, backend, batch_size))
+        if not args.skip_flask:
+            for workers in args.workers:
+                report(f"POST /analyze w={workers}", *bench_flask(video_path, workers, backend))
+    finally:
+        server.shutdown()
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import argparse
+import http.client
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+IMPORT_SCRIPT = """
+import time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.analysis_params()
+print(imported - started, time.perf_counter() - started)
+"""
+
+def bench_import(warm_imports, work_dir):
+    """Seconds until `import app` returns, and until the pipeline is usable, in a fresh interpreter."""
+    env = dict(os.environ, WARM_IMPORTS=warm_imports, PYTHONPATH=PACKAGE_DIR)
+    out = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], cwd=work_dir, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    imported, usable = map(float, out.split()[-2:])
+    return imported, usable
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def request(port, method, path, body=None, timeout=30):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        return conn.getresponse().status
+    finally:
+        conn.close()
+
+def bench_gunicorn(warm_imports, preload, workers, work_dir, timeout=60):
+    """
+    Seconds from launching gunicorn until it answers GET / and until it accepts the first upload
+    (POST /uploads, which needs the analysis pipeline for its cache check).
+    """
+    port = free_port()
+    command = [sys.executable, "-m", "gunicorn", "app:app", "--worker-class", "gthread", "--threads", "8",
+               "--workers", str(workers), "--bind", f"127.0.0.1:{port}", "--log-level", "warning"]
+    if preload:
+        command.append("--preload")
+    env = dict(os.environ, WARM_IMPORTS=warm_imports, PYTHONPATH=PACKAGE_DIR)
+    started = time.perf_counter()
+    server = subprocess.Popen(command, cwd=work_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        ready = None
+        while time.perf_counter() - started < timeout:
+            try:
+                if request(port, "GET", "/") == 200:
+                    ready = time.perf_counter() - started
+                    break
+            except OSError:
+                time.sleep(0.01)
+        if ready is None:
+            raise RuntimeError("gunicorn did not start")
+        status = request(port, "POST", "/uploads", {"filename": "game.mp4", "size": 1024, "sha256": "0" * 64})
+        if status != 201:
+            raise RuntimeError(f"Upload rejected with status {status}")
+        return ready, time.perf_counter() - started
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure app startup: imports and gunicorn cold starts.")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per configuration (best is shown)")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_startup_")
+    try:
+        print(f"{'import app':<32} {'imported s':>11} {'usable s':>9}")
+        for warm_imports in ("eager", "background", "lazy"):
+            imported, usable = min(bench_import(warm_imports, work_dir) for _ in range(args.repeat))
+            print(f"{'WARM_IMPORTS=' + warm_imports:<32} {imported:>11.3f} {usable:>9.3f}")
+
+        print(f"\n{'gunicorn, ' + str(args.workers) + ' workers':<32} {'serving s':>11} {'upload s':>9}")
+        for warm_imports, preload in (("eager", False), ("background", False), ("background", True)):
+            ready, upload = min(bench_gunicorn(warm_imports, preload, args.workers, work_dir)
+                                for _ in range(args.repeat))
+            label = f"WARM_IMPORTS={warm_imports}" + (" --preload" if preload else "")
+            print(f"{label:<32} {ready:>11.3f} {upload:>9.3f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import json
+import os
+
+from basketball_analysis import frame_order
+from frame_prefilter import FramePrefilter, parse_regions
+
+def is_event(frame_data):
+    return bool(frame_data.get("points") or frame_data.get("passes") or frame_data.get("rebounds"))
+
+def score_run(summary_path, frames_dir, prefilter):
+    """
+    Scores the frames one earlier run saved (KEEP_FRAMES) in capture order, as that run's
+    prefilter did: every frame moves its motion state on, including frames it skipped,
+    duplicates and frames whose analysis failed, so each score is the one the threshold is
+    compared with.
+    Returns a list of (score, is_event) pairs, in frame order, for the frames the model analyzed.
+    """
+    with open(summary_path) as f:
+        records = {frame_data["frame"]: frame_data for frame_data in json.load(f)}
+    prefilter.reset()
+    scored = []
+    for filename in sorted((f for f in os.listdir(frames_dir) if f.endswith(".jpg")), key=frame_order):
+        frame_data = records.get(filename)
+        score = prefilter.score_components(os.path.join(frames_dir, filename))["score"]
+        # Frames that never reached the model, or failed there, have no label to compare against
+        if frame_data is not None and "prefilter_score" not in frame_data and "duplicate_of" not in frame_data:
+            scored.append((score, is_event(frame_data)))
+    return scored
+
+def sweep(scored, thresholds):
+    """Yields (threshold, kept fraction, event recall, missed events) for each threshold."""
+    events = sum(1 for _, event in scored if event)
+    for threshold in thresholds:
+        kept = [event for score, event in scored if score >= threshold]
+        kept_events = sum(kept)
+        recall = kept_events / events if events else 1.0
+        yield threshold, len(kept) / max(len(scored), 1), recall, events - kept_events
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure how many event frames the prefilter would keep on earlier runs, "
+                    "against how many API calls it would save.")
+    parser.add_argument("runs", nargs="+", metavar="SUMMARY_JSON:FRAMES_DIR",
+                        help="summary.json of an earlier run and the directory holding its frames")
+    parser.add_argument("--hoop", default=None, metavar="X,Y,W,H[;...]",
+                        help="Hoop regions, as fractions of the frame size")
+    parser.add_argument("--model", default=None, help="Optional ONNX event classifier")
+    parser.add_argument("--thresholds", type=float, nargs="+",
+                        default=[0.0, 0.05, 0.1, 0.15, 0.2, 0.3, 0.4, 0.5])
+    args = parser.parse_args()
+
+    prefilter = FramePrefilter(hoop_regions=parse_regions(args.hoop), model_path=args.model)
+    scored = []
+    for run in args.runs:
+        summary_path, frames_dir = run.rsplit(":", 1)
+        scored.extend(score_run(summary_path, frames_dir, prefilter))
+
+    events = sum(1 for _, event in scored if event)
+    print(f"{len(scored)} analyzed frames, {events} with events")
+    print(f"{'threshold':>9} {'calls kept':>11} {'recall':>8} {'missed':>7}")
+    for threshold, kept, recall, missed in sweep(scored, args.thresholds):
+        print(f"{threshold:>9.2f} {kept:>10.1%} {recall:>8.1%} {missed:>7}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Columnar store of detected events, for fast per-jersey, per-period and per-window queries.
+
+Each row is one event in one frame: (game, frame index, time in seconds, event type, jersey,
+value), held as NumPy arrays so aggregations are single vectorized passes (bincount over
+masks) instead of re-parsing JSON in CSV cells. A game's events are saved next to its
+summaries as events.npz; season_batch.py concatenates the games into one file, so season-wide
+queries load a single set of arrays.
+
+    python event_store.py output/events.npz
+    python event_store.py season_output/season_events.npz --jersey 23 --quarters 4 --window 300
+"""
+import argparse
+import csv
+import json
+import os
+import re
+
+import numpy as np
+
+EVENTS_FILENAME = "events.npz"
+EVENT_TYPES = ("points", "passes", "rebounds")
+POINTS, PASSES, REBOUNDS = range(len(EVENT_TYPES))
+NO_JERSEY = -1
+
+_FRAME_NUMBER = re.compile(r"(\d+)")
+
+class EventStore:
+    """
+    Events as parallel column arrays.
+
+    Args:
+        game, frame, event, jersey, value (np.ndarray): Integer columns; `event` indexes
+            EVENT_TYPES, `jersey` indexes `jerseys` (NO_JERSEY for passes).
+        time (np.ndarray): Seconds into the game (NaN when unknown).
+        games (list): Game names, indexed by `game`.
+        jerseys (list): Jersey labels, indexed by `jersey`.
+        durations (np.ndarray): Seconds up to the last analyzed frame of each game.
+    """
+    def __init__(self, game, frame, time, event, jersey, value, games, jerseys, durations):
+        self.game = game
+        self.frame = frame
+        self.time = time
+        self.event = event
+        self.jersey = jersey
+        self.value = value
+        self.games = list(games)
+        self.jerseys = list(jerseys)
+        self.durations = durations
+
+    def __len__(self):
+        return len(self.event)
+
+    @classmethod
+    def from_records(cls, records, game_name="game"):
+        """Builds a one-game store from frame records (as in frames.jsonl or summary.json)."""
+        return EventStoreBuilder(game_name).extend(records).build()
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["game"], data["frame"], data["time"], data["event"], data["jersey"],
+                       data["value"], data["games"].tolist(), data["jerseys"].tolist(), data["durations"])
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, game=self.game, frame=self.frame, time=self.time, event=self.event,
+                 jersey=self.jersey, value=self.value,
+                 games=np.array(self.games, dtype=str), jerseys=np.array(self.jerseys, dtype=str),
+                 durations=self.durations)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def concat(cls, stores):
+        """Combines several stores (e.g. one per game) into one, remapping game and jersey codes."""
+        if not stores:
+            return EventStoreBuilder().build()
+        games, jersey_codes = [], {}
+        columns = {name: [] for name in ("game", "frame", "time", "event", "jersey", "value")}
+        for store in stores:
+            game_map = np.arange(len(games), len(games) + len(store.games), dtype=np.int32)
+            games.extend(store.games)
+            jersey_map = np.array([jersey_codes.setdefault(label, len(jersey_codes)) for label in store.jerseys]
+                                  + [NO_JERSEY], dtype=np.int32)
+            columns["game"].append(game_map[store.game])
+            # NO_JERSEY (-1) picks the trailing NO_JERSEY entry of jersey_map
+            columns["jersey"].append(jersey_map[store.jersey])
+            for name in ("frame", "time", "event", "value"):
+                columns[name].append(getattr(store, name))
+        jerseys = sorted(jersey_codes, key=jersey_codes.get)
+        return cls(*(np.concatenate(columns[name]) for name in ("game", "frame", "time", "event", "jersey", "value")),
+                   games, jerseys, np.concatenate([store.durations for store in stores]))
+
+    # --- Queries ---
+
+    def _mask(self, event=None, game=None, jersey=None, start=None, end=None):
+        mask = np.ones(len(self), dtype=bool)
+        if event is not None:
+            mask &= self.event == EVENT_TYPES.index(event)
+        if game is not None:
+            mask &= self.game == (self.games.index(game) if game in self.games else -2)
+        if jersey is not None:
+            mask &= self.jersey == (self.jerseys.index(jersey) if jersey in self.jerseys else -2)
+        if start is not None:
+            mask &= self.time >= start
+        if end is not None:
+            mask &= self.time < end
+        return mask
+
+    def by_jersey(self, event, **filters):
+        """{jersey: total} of an event type, optionally filtered by game, jersey and time range."""
+        mask = self._mask(event, **filters) & (self.jersey != NO_JERSEY)
+        sums = np.bincount(self.jersey[mask], weights=self.value[mask], minlength=len(self.jerseys))
+        return {self.jerseys[i]: int(sums[i]) for i in np.flatnonzero(sums)}
+
+    def total(self, event, **filters):
+        mask = self._mask(event, **filters)
+        return int(self.value[mask].sum())
+
+    def totals(self, **filters):
+        """Points and rebounds by jersey plus total passes, like the pipeline's final totals."""
+        return {
+            "points": self.by_jersey("points", **filters),
+            "passes": self.total("passes", **filters),
+            "rebounds": self.by_jersey("rebounds", **filters),
+        }
+
+    def by_game(self, event, **filters):
+        """{game: total} of an event type."""
+        mask = self._mask(event, **filters)
+        sums = np.bincount(self.game[mask], weights=self.value[mask], minlength=len(self.games))
+        return {self.games[i]: int(sums[i]) for i in range(len(self.games))}
+
+    def by_period(self, event, periods=4, boundaries=None, **filters):
+        """
+        Totals of an event type per period: `periods` equal slices of each game's duration
+        (quarters by default), or the periods between explicit `boundaries` (seconds, e.g.
+        [0, 720, 1440, 2160]). Returns a list of totals.
+        """
+        mask = self._mask(event, **filters) & ~np.isnan(self.time)
+        time, game, value = self.time[mask], self.game[mask], self.value[mask]
+        if boundaries is not None:
+            index = np.searchsorted(np.asarray(boundaries, dtype=float), time, side="right") - 1
+            count = len(boundaries) - 1
+            keep = (index >= 0) & (index < count)
+            index, value = index[keep], value[keep]
+        else:
+            length = self.durations[game] / periods
+            with np.errstate(divide="ignore", invalid="ignore"):
+                index = np.where(length > 0, time // np.where(length > 0, length, 1), 0)
+            index = np.clip(index.astype(np.int64), 0, periods - 1)
+            count = periods
+        return np.bincount(index, weights=value, minlength=count).astype(np.int64).tolist()
+
+    def by_window(self, event, window, **filters):
+        """Totals of an event type per `window` seconds of game time (across the selected games)."""
+        mask = self._mask(event, **filters) & ~np.isnan(self.time)
+        index = (self.time[mask] // window).astype(np.int64)
+        return np.bincount(index, weights=self.value[mask]).astype(np.int64).tolist()
+
+class EventStoreBuilder:
+    """Accumulates frame records into columns; used while streaming over a checkpoint."""
+    def __init__(self, game_name="game"):
+        self.game_name = game_name
+        self._jersey_codes = {}
+        self._duration = 0.0
+        self._rows = {name: [] for name in ("frame", "time", "event", "jersey", "value")}
+
+    def _add(self, frame, time, event, jersey, value):
+        rows = self._rows
+        rows["frame"].append(frame)
+        rows["time"].append(time)
+        rows["event"].append(event)
+        rows["jersey"].append(jersey)
+        rows["value"].append(value)
+
+    def add(self, record):
+        match = _FRAME_NUMBER.search(record.get("frame", ""))
+        frame = int(match.group(1)) if match else -1
+        time = record.get("time")
+        time = float("nan") if time is None else float(time)
+        if time > self._duration:
+            self._duration = time
+        for event, key in ((POINTS, "points"), (REBOUNDS, "rebounds")):
+            counts = record.get(key)
+            if not isinstance(counts, dict):
+                continue
+            for label, value in counts.items():
+                if isinstance(value, (int, float)) and value:
+                    code = self._jersey_codes.setdefault(str(label), len(self._jersey_codes))
+                    self._add(frame, time, event, code, int(value))
+        passes = record.get("passes")
+        if isinstance(passes, (int, float)) and passes:
+            self._add(frame, time, PASSES, NO_JERSEY, int(passes))
+        return self
+
+    def extend(self, records):
+        for record in records:
+            self.add(record)
+        return self
+
+    def build(self):
+        rows = self._rows
+        jerseys = sorted(self._jersey_codes, key=self._jersey_codes.get)
+        return EventStore(
+            np.zeros(len(rows["event"]), dtype=np.int32),
+            np.array(rows["frame"], dtype=np.int32),
+            np.array(rows["time"], dtype=np.float32),
+            np.array(rows["event"], dtype=np.int8),
+            np.array(rows["jersey"], dtype=np.int32),
+            np.array(rows["value"], dtype=np.int32),
+            [self.game_name], jerseys, np.array([self._duration], dtype=np.float32),
+        )
+
+def load_totals(output_dir):
+    """
+    Final totals of an analysis output directory from its event store, falling back to
+    summing summary.csv for outputs written before the store existed.
+    """
+    events_path = os.path.join(output_dir, EVENTS_FILENAME)
+    if os.path.exists(events_path):
+        return EventStore.load(events_path).totals()
+
+    builder = EventStoreBuilder()
+    with open(os.path.join(output_dir, "summary.csv"), newline="") as f:
+        for row in csv.DictReader(f):
+            try:
+                builder.add({"frame": row["frame"], "points": json.loads(row["points"] or "{}"),
+                             "passes": int(row["passes"] or 0), "rebounds": json.loads(row["rebounds"] or "{}")})
+            except ValueError:
+                continue
+    return builder.build().totals()
+
+def main():
+    parser = argparse.ArgumentParser(description="Query an events.npz event store.")
+    parser.add_argument("store", help="events.npz of a game, or season_events.npz of a season")
+    parser.add_argument("--game", default=None, help="Only this game")
+    parser.add_argument("--jersey", default=None, help="Only this jersey")
+    parser.add_argument("--start", type=float, default=None, help="From this many seconds into each game")
+    parser.add_argument("--end", type=float, default=None, help="Until this many seconds into each game")
+    parser.add_argument("--quarters", type=int, default=None, metavar="N",
+                        help="Also show points per period, splitting each game into N equal periods")
+    parser.add_argument("--window", type=float, default=None, metavar="SECONDS",
+                        help="Also show points per time window of this length")
+    args = parser.parse_args()
+
+    store = EventStore.load(args.store)
+    filters = {"game": args.game, "jersey": args.jersey, "start": args.start, "end": args.end}
+    report = {"events": len(store), "games": len(store.games), "totals": store.totals(**filters)}
+    if len(store.games) > 1:
+        report["points_by_game"] = store.by_game("points", **filters)
+    if args.quarters:
+        report["points_by_period"] = store.by_period("points", args.quarters, **filters)
+    if args.window:
+        report["points_by_window"] = store.by_window("points", args.window, **filters)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import logging
+from collections import deque, namedtuple
+
+import cv2
+import numpy as np
+
+from frame_prefilter import FilteredFrame
+
+logger = logging.getLogger(__name__)
+
+# Stand-in source for a frame that is a near-duplicate of an already-analyzed frame
+DuplicateFrame = namedtuple("DuplicateFrame", ["frame"])
+
+def _grayscale(source):
+    if isinstance(source, str):
+        # Decoding at 1/4 scale is much cheaper and plenty for a 16x16 hash
+        return cv2.imread(source, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if source.ndim == 3:
+        return cv2.cvtColor(source, cv2.COLOR_BGR2GRAY)
+    return source
+
+def _bits_to_int(bits):
+    return int.from_bytes(np.packbits(bits.flatten()).tobytes(), "big")
+
+def dhash(image, hash_size=8):
+    """Difference hash: compares horizontally adjacent pixels of a (hash_size+1) x hash_size thumbnail."""
+    small = cv2.resize(image, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    return _bits_to_int(small[:, 1:] > small[:, :-1])
+
+def phash(image, hash_size=8):
+    """Perceptual hash: signs of the low-frequency DCT coefficients of a 32x32 thumbnail."""
+    small = cv2.resize(image, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:hash_size, :hash_size]
+    # Leave out the DC term, which only encodes overall brightness
+    return _bits_to_int(low > np.median(low.flatten()[1:]))
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+HASH_FUNCTIONS = {"dhash": dhash, "phash": phash}
+
+class FrameDeduplicator:
+    """
+    Flags frames whose perceptual hash is within `threshold` bits of a recently analyzed frame.
+
+    Args:
+        threshold (int): Maximum Hamming distance (out of hash_size**2 bits) to count as a duplicate.
+        method (str): "dhash" or "phash".
+        hash_size (int): Hash grid size. 16 rather than the usual 8, because players are small in
+            wide court shots and an 8x8 grid averages their movement away.
+        window (int): Number of most recent analyzed frames each frame is compared against.
+    """
+    def __init__(self, threshold=3, method="dhash", hash_size=16, window=8):
+        self.threshold = threshold
+        self.hash_size = hash_size
+        self.hash_function = HASH_FUNCTIONS[method]
+        self._recent = deque(maxlen=window)  # (filename, hash) of analyzed frames
+        self.checked = 0
+        self.skipped = 0
+
+    def check(self, filename, source):
+        """
+        Returns the filename of the analyzed frame that source duplicates, or None if it is
+        new (in which case it is remembered for later comparisons).
+        """
+        self.checked += 1
+        image = _grayscale(source)
+        if image is None:
+            return None
+        frame_hash = self.hash_function(image, self.hash_size)
+
+        for analyzed, analyzed_hash in reversed(self._recent):
+            if hamming_distance(frame_hash, analyzed_hash) <= self.threshold:
+                self.skipped += 1
+                logger.debug("%s duplicates %s, skipping", filename, analyzed)
+                return analyzed
+
+        self._recent.append((filename, frame_hash))
+        return None
+
+def dedupe_sources(sources, deduplicator):
+    """
+    Passes (filename, source) pairs through, replacing the source of near-duplicate frames
+    with a DuplicateFrame pointing at the frame that will be analyzed instead. Frames the
+    prefilter already skipped pass as-is, and are never compared against: only frames that
+    are sent to the model count as analyzed.
+    """
+    for filename, source in sources:
+        if isinstance(source, FilteredFrame):
+            yield filename, source
+            continue
+        duplicate_of = deduplicator.check(filename, source)
+        yield filename, (DuplicateFrame(duplicate_of) if duplicate_of else source)
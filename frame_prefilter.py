@@ -0,0 +1,125 @@
+import logging
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Stand-in source for a frame the prefilter scored below its threshold
+FilteredFrame = namedtuple("FilteredFrame", ["score"])
+
+# HSV range of an orange basketball (OpenCV hue is 0-179)
+BALL_HSV_LOW = (5, 120, 80)
+BALL_HSV_HIGH = (25, 255, 255)
+
+# Fraction of a frame covered by ball-coloured pixels that counts as a full ball score
+BALL_FRACTION_FULL = 0.002
+
+# Mean gray-level difference that counts as full motion
+MOTION_FULL = 20.0
+
+def _load_small(source, width=160):
+    if isinstance(source, str):
+        image = cv2.imread(source, cv2.IMREAD_REDUCED_COLOR_4)
+    else:
+        image = source
+    if image is None:
+        return None
+    height = max(1, round(image.shape[0] * width / image.shape[1]))
+    return cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+
+class FramePrefilter:
+    """
+    Cheap CPU-only score of how likely a frame is to show a scoring, passing or rebounding
+    event. Frames scoring below `threshold` are not sent to the vision model.
+
+    The score combines ball-coloured pixel coverage, overall motion and motion inside the
+    configured hoop regions. If an ONNX classifier is given, its output replaces the heuristics.
+
+    Args:
+        threshold (float): Minimum score (0-1) for a frame to be analyzed.
+        hoop_regions (list): (x, y, w, h) rectangles as fractions of the frame size.
+        model_path (str): Optional ONNX binary classifier taking a 224x224 RGB image scaled to
+            0-1 and returning the probability that the frame shows an event.
+
+    The instance keeps the previous frame for motion scoring; call reset() between videos.
+    """
+    def __init__(self, threshold=0.2, hoop_regions=None, model_path=None):
+        self.threshold = threshold
+        self.hoop_regions = hoop_regions or []
+        self.net = cv2.dnn.readNetFromONNX(model_path) if model_path else None
+        self.reset()
+
+    def reset(self):
+        self._previous = None
+        self.checked = 0
+        self.filtered = 0
+
+    def score_components(self, source):
+        """Returns a dict of component scores (each 0-1) and the combined "score"."""
+        small = _load_small(source)
+        if small is None:
+            return {"score": 1.0}
+
+        if self.net is not None:
+            image = source if not isinstance(source, str) else cv2.imread(source)
+            blob = cv2.dnn.blobFromImage(image, 1 / 255.0, (224, 224), swapRB=True)
+            self.net.setInput(blob)
+            probability = float(np.ravel(self.net.forward())[-1])
+            return {"classifier": probability, "score": probability}
+
+        hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+        ball_fraction = cv2.inRange(hsv, BALL_HSV_LOW, BALL_HSV_HIGH).mean() / 255
+        components = {"ball": min(1.0, ball_fraction / BALL_FRACTION_FULL)}
+
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        previous, self._previous = self._previous, gray
+        if previous is None or previous.shape != gray.shape:
+            # Nothing to compare the first frame with; let it through
+            components["score"] = 1.0
+            return components
+        diff = cv2.absdiff(gray, previous)
+        components["motion"] = min(1.0, diff.mean() / MOTION_FULL)
+
+        if self.hoop_regions:
+            height, width = diff.shape
+            hoop_motion = 0.0
+            for x, y, w, h in self.hoop_regions:
+                region = diff[int(y * height):int((y + h) * height), int(x * width):int((x + w) * width)]
+                if region.size:
+                    hoop_motion = max(hoop_motion, region.mean() / MOTION_FULL)
+            components["hoop_motion"] = min(1.0, hoop_motion)
+            components["score"] = (0.3 * components["ball"] + 0.3 * components["motion"]
+                                   + 0.4 * components["hoop_motion"])
+        else:
+            components["score"] = 0.5 * components["ball"] + 0.5 * components["motion"]
+        return components
+
+    def check(self, filename, source):
+        """Returns the frame's score if it should be skipped, or None if it should be analyzed."""
+        self.checked += 1
+        score = self.score_components(source)["score"]
+        if score >= self.threshold:
+            return None
+        self.filtered += 1
+        logger.debug("%s scored %.3f < %s, skipping", filename, score, self.threshold)
+        return score
+
+def prefilter_sources(sources, prefilter):
+    """
+    Passes (filename, source) pairs through, replacing the source of frames scoring below the
+    prefilter threshold with a FilteredFrame.
+    """
+    for filename, source in sources:
+        score = prefilter.check(filename, source)
+        yield filename, (FilteredFrame(round(score, 4)) if score is not None else source)
+
+def parse_regions(text):
+    """Parses "x,y,w,h;x,y,w,h" (fractions of the frame size) into a list of tuples."""
+    regions = []
+    for part in (text or "").split(";"):
+        if part.strip():
+            x, y, w, h = (float(value) for value in part.split(","))
+            regions.append((x, y, w, h))
+    return regions
@@ -0,0 +1,225 @@
+"""
+Renders analysis results onto the game video itself, after the analysis has finished.
+
+One sequential pass decodes the source video and writes every frame through a single
+cv2.VideoWriter, overlaid with the stats of the most recent analyzed frame and the running
+totals. A highlights cut only keeps the frames within `padding` seconds of a frame where points
+or rebounds were detected, seeking past the rest instead of decoding it.
+
+    python highlight_renderer.py GirlsNav.mp4 output --highlights
+"""
+import argparse
+import bisect
+import json
+import logging
+import os
+import re
+import time
+
+import cv2
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+ANNOTATED_FILENAME = "annotated.mp4"
+HIGHLIGHTS_FILENAME = "highlights.mp4"
+# H.264 plays in browsers but needs an encoder OpenCV builds may lack; MPEG-4 Part 2 always works
+FOURCCS = ("avc1", "mp4v")
+# Gaps up to this long between highlights are kept rather than seeked over (seeking decodes
+# from the previous keyframe anyway)
+SEEK_MIN_SECONDS = 2.0
+
+_FRAME_NUMBER = re.compile(r"(\d+)")
+
+def draw_annotations(image, annotations):
+    """Draws one "key: value" line per annotation onto image in place."""
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    font_scale = 0.6
+    color = (0, 255, 0)
+    thickness = 2
+    y_offset = 30
+
+    for key, val in annotations.items():
+        label = f"{key}: {val}"
+        cv2.putText(image, label, (10, y_offset), font, font_scale, color, thickness)
+        y_offset += 25
+    return image
+
+def _record_time(record, fps, step):
+    """Seconds into the video of a frame record, or None if it can't be placed."""
+    if record.get("time") is not None:
+        return float(record["time"])
+    match = _FRAME_NUMBER.search(record.get("frame", ""))
+    if step and match:
+        # Frames extracted every `step` frames, numbered in order (extract_frames)
+        return int(match.group(1)) * step / fps
+    return None
+
+def _has_highlight(record):
+    return bool(record.get("points")) or bool(record.get("rebounds"))
+
+def build_timeline(records, fps, step=None):
+    """
+    Returns (start frame indices, overlays, highlight frame indices) of the frame records
+    in video order: overlays[i] applies from starts[i] until the next start.
+    """
+    placed = []
+    for record in records:
+        position = _record_time(record, fps, step)
+        if position is not None:
+            placed.append((round(position * fps), record))
+    placed.sort(key=lambda item: item[0])
+
+    starts, overlays, highlights = [], [], []
+    points, rebounds, passes = {}, {}, 0
+    for index, record in placed:
+        for jersey, score in record.get("points", {}).items():
+            points[jersey] = points.get(jersey, 0) + score
+        for jersey, count in record.get("rebounds", {}).items():
+            rebounds[jersey] = rebounds.get(jersey, 0) + count
+        passes += record.get("passes", 0)
+        starts.append(index)
+        overlays.append({
+            "Points": record.get("points", {}),
+            "Passes": record.get("passes", 0),
+            "Rebounds": record.get("rebounds", {}),
+            "Total points": dict(points),
+            "Total passes": passes,
+            "Total rebounds": dict(rebounds),
+        })
+        if _has_highlight(record):
+            highlights.append(index)
+    return starts, overlays, highlights
+
+def highlight_segments(highlights, padding_frames, frame_count=None):
+    """Merges [index - padding, index + padding) windows around highlight frames into segments."""
+    segments = []
+    for index in highlights:
+        start = max(0, index - padding_frames)
+        end = index + padding_frames + 1
+        if frame_count:
+            end = min(end, frame_count)
+        if segments and start <= segments[-1][1]:
+            segments[-1][1] = max(segments[-1][1], end)
+        else:
+            segments.append([start, end])
+    return [tuple(segment) for segment in segments]
+
+def _open_writer(path, fps, width, height):
+    for fourcc in FOURCCS:
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, (width, height))
+        if writer.isOpened():
+            logger.debug(f"Writing {path} as {fourcc}")
+            return writer
+        writer.release()
+    raise IOError(f"Failed to open video writer for {path}")
+
+def render_video(video_path, records, output_path, highlights=False, padding=3.0, step=None):
+    """
+    Writes the video with the frame records' stats drawn on it.
+
+    Args:
+        video_path (str): The analyzed video.
+        records (iterable): Frame records in any order, as in summary.json or frames.jsonl;
+            placed by their "time", or by frame number * step for records without one.
+        output_path (str): MP4 to write; it only appears once complete.
+        highlights (bool): Only keep the frames within `padding` seconds of detected points
+            or rebounds.
+        step (int): Sampling step of the records, for records without a "time".
+
+    Returns the number of frames written.
+    """
+    started = time.perf_counter()
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Failed to open video file: {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or None
+
+    starts, overlays, highlight_frames = build_timeline(records, fps, step)
+    if highlights:
+        segments = highlight_segments(highlight_frames, round(padding * fps), frame_count)
+    else:
+        segments = [(0, None)]
+
+    root, ext = os.path.splitext(output_path)
+    tmp_path = f"{root}.part{ext}"
+    writer = None
+    written = 0
+    position = 0
+    try:
+        for start, end in segments:
+            if start - position >= SEEK_MIN_SECONDS * fps:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+                position = start
+            while position < start and cap.grab():
+                position += 1
+            while end is None or position < end:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                current = bisect.bisect_right(starts, position) - 1
+                if current >= 0:
+                    draw_annotations(frame, overlays[current])
+                if writer is None:
+                    writer = _open_writer(tmp_path, fps, frame.shape[1], frame.shape[0])
+                writer.write(frame)
+                written += 1
+                position += 1
+            if end is not None and position < end:
+                break
+    except BaseException:
+        if writer is not None:
+            writer.release()
+            writer = None
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        cap.release()
+        if writer is not None:
+            writer.release()
+
+    if writer is None:
+        logger.warning(f"Nothing to render from {video_path}"
+                       + (" (no highlights detected)" if highlights else ""))
+        return 0
+    os.replace(tmp_path, output_path)
+    elapsed = time.perf_counter() - started
+    metrics.observe("stage_seconds", elapsed, stage="render")
+    logger.info(f"Rendered {written} frames of {video_path} to {output_path} in {elapsed:.1f}s"
+                + (f" ({len(segments)} highlights)" if highlights else ""))
+    return written
+
+def render_output(video_path, output_dir, highlights=False, padding=3.0, step=None):
+    """
+    Renders an analysis output directory's summary.json onto its video as
+    output_dir/annotated.mp4 or output_dir/highlights.mp4. Returns the path written, or None
+    if there was nothing to render.
+    """
+    with open(os.path.join(output_dir, "summary.json")) as f:
+        records = json.load(f)
+    output_path = os.path.join(output_dir, HIGHLIGHTS_FILENAME if highlights else ANNOTATED_FILENAME)
+    if not render_video(video_path, records, output_path, highlights, padding, step):
+        return None
+    return output_path
+
+def main():
+    parser = argparse.ArgumentParser(description="Render analysis results onto the game video.")
+    parser.add_argument("video", help="The analyzed video")
+    parser.add_argument("output_dir", help="Analysis output directory (with summary.json)")
+    parser.add_argument("--highlights", action="store_true",
+                        help="Only keep the moments around detected points and rebounds")
+    parser.add_argument("--padding", type=float, default=3.0, help="Seconds kept around each highlight")
+    parser.add_argument("--step", type=int, default=None,
+                        help="Sampling step of results that have no times (frames extracted to disk)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    path = render_output(args.video, args.output_dir, args.highlights, args.padding, args.step)
+    if path:
+        print(path)
+
+if __name__ == "__main__":
+    main()
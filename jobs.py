@@ -0,0 +1,253 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+STATUS_FILENAME = "status.json"
+EVENTS_FILENAME = "events.jsonl"
+# Seconds between status saves of queued and running jobs, which show their worker is alive
+HEARTBEAT_INTERVAL = 10
+# A queued or running job whose status is older than this lost its worker
+STALE_SECONDS = 6 * HEARTBEAT_INTERVAL
+
+class Job:
+    """
+    Progress of one background analysis, mirrored to <session_dir>/status.json so that any
+    gunicorn worker can answer /status for it, not just the one running it. Each analyzed
+    frame is also appended to <session_dir>/events.jsonl for streaming. The status records
+    the process that owns the job and when it was last saved; while the job is queued or
+    running its JobQueue saves it every HEARTBEAT_INTERVAL, so load_status() can tell when
+    the worker died.
+    """
+    def __init__(self, session_id, session_dir, frames_total=None):
+        self.session_id = session_id
+        self.session_dir = session_dir
+        self.status = "queued"
+        self.frames_done = 0
+        self.frames_total = frames_total
+        self.totals = {"points": {}, "passes": 0, "rebounds": {}}
+        self.result = None
+        self.error = None
+        # Rendering the results onto the video happens after the job completes and can fail on its own
+        self.render_error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+        # Saves in order, so a heartbeat never overwrites a newer status with an older one
+        self._save_lock = threading.Lock()
+        self.save()
+
+    @property
+    def status_path(self):
+        return os.path.join(self.session_dir, STATUS_FILENAME)
+
+    @property
+    def events_path(self):
+        return os.path.join(self.session_dir, EVENTS_FILENAME)
+
+    def on_frame(self, frame_data, totals):
+        """Progress hook for basketball_analysis.analyze_video/analyze_frames."""
+        with self._lock:
+            self.frames_done += 1
+            self.totals = totals
+            if self.frames_total is not None and self.frames_done > self.frames_total:
+                self.frames_total = self.frames_done
+            event = {
+                "frames_done": self.frames_done,
+                "frames_total": self.frames_total,
+                "frame": frame_data,
+                "totals": totals,
+            }
+        try:
+            with open(self.events_path, "a") as f:
+                f.write(json.dumps(event) + "\n")
+        except OSError as e:
+            logger.error(f"Failed to append event for job {self.session_id}: {str(e)}")
+        self.save()
+
+    def to_dict(self):
+        with self._lock:
+            eta_seconds = None
+            if self.status == "running" and self.frames_done and self.frames_total:
+                elapsed = time.time() - self.started_at
+                remaining = max(self.frames_total - self.frames_done, 0)
+                eta_seconds = round(elapsed / self.frames_done * remaining, 1)
+            return {
+                "session_id": self.session_id,
+                "status": self.status,
+                "frames_done": self.frames_done,
+                "frames_total": self.frames_total,
+                "eta_seconds": eta_seconds,
+                "partial": self.totals,
+                "result": self.result,
+                "error": self.error,
+                "render_error": self.render_error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "owner": {"host": socket.gethostname(), "pid": os.getpid()},
+                "heartbeat_at": time.time(),
+            }
+
+    def save(self):
+        with self._save_lock:
+            _write_status(self.session_dir, self.to_dict())
+
+def _write_status(session_dir, status):
+    # Write-then-rename so readers never see a half-written file
+    status_path = os.path.join(session_dir, STATUS_FILENAME)
+    tmp_path = f"{status_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(status, f)
+        os.replace(tmp_path, status_path)
+    except OSError as e:
+        logger.error(f"Failed to save status for job {status.get('session_id')}: {str(e)}")
+
+def _owner_alive(owner):
+    """False if the owner is a process on this host that no longer exists."""
+    if not owner or owner.get("host") != socket.gethostname():
+        return True
+    try:
+        os.kill(owner["pid"], 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass  # Exists, owned by another user
+    return True
+
+def worker_lost(status, now=None):
+    """Whether a saved status is of a queued or running job whose worker has died."""
+    if status.get("status") not in ("queued", "running"):
+        return False
+    heartbeat_at = status.get("heartbeat_at")
+    if heartbeat_at is None:
+        return False  # Saved before heartbeats were recorded
+    now = time.time() if now is None else now
+    return now - heartbeat_at > STALE_SECONDS or not _owner_alive(status.get("owner"))
+
+def load_status(session_dir):
+    """
+    Returns the saved status dict of the job in session_dir, or None if there is none. A job
+    whose worker died is marked failed on the way.
+    """
+    try:
+        with open(os.path.join(session_dir, STATUS_FILENAME)) as f:
+            status = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if worker_lost(status):
+        owner = status.get("owner") or {}
+        logger.warning(f"Job {status.get('session_id')} lost its worker {owner.get('host')}:{owner.get('pid')}")
+        status.update(status="error", error="worker lost", eta_seconds=None, finished_at=time.time())
+        _write_status(session_dir, status)
+        metrics.inc("jobs_total", status="lost")
+    return status
+
+def follow_events(session_dir, poll_interval=0.5, heartbeat_interval=15):
+    """
+    Tails a job's events.jsonl, yielding ("frame", event) for each analyzed frame as it is
+    appended, ("heartbeat", None) while idle, and finally ("done", status) once the job has
+    completed or failed.
+    """
+    events_path = os.path.join(session_dir, EVENTS_FILENAME)
+    position = 0
+    buffered = ""
+    last_sent = time.monotonic()
+
+    while True:
+        # Check status before reading so no frame appended before completion is missed
+        status = load_status(session_dir)
+        finished = status is None or status.get("status") in ("complete", "error")
+
+        if os.path.exists(events_path):
+            with open(events_path) as f:
+                f.seek(position)
+                buffered += f.read()
+                position = f.tell()
+        *lines, buffered = buffered.split("\n")
+        for line in lines:
+            if line:
+                yield "frame", json.loads(line)
+                last_sent = time.monotonic()
+
+        if finished:
+            yield "done", status
+            return
+        if time.monotonic() - last_sent >= heartbeat_interval:
+            yield "heartbeat", None
+            last_sent = time.monotonic()
+        time.sleep(poll_interval)
+
+class JobQueue:
+    """
+    Runs analysis jobs on a bounded pool of background threads.
+
+    Args:
+        max_workers (int): Number of jobs analyzed at the same time; further jobs wait queued.
+    """
+    def __init__(self, max_workers=2):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        # Started with the first job, in the process that runs it (gunicorn forks after import)
+        self._heartbeat = None
+
+    def submit(self, job, fn):
+        """
+        Queues fn(job) to run in the background. Its return value becomes job.result and any
+        exception marks the job as failed.
+        """
+        with self._lock:
+            self._jobs[job.session_id] = job
+            if self._heartbeat is None or not self._heartbeat.is_alive():
+                self._heartbeat = threading.Thread(target=self._beat, name="job-heartbeat", daemon=True)
+                self._heartbeat.start()
+        self._executor.submit(self._run, job, fn)
+        logger.info(f"Queued job {job.session_id}")
+        return job
+
+    def get(self, session_id):
+        with self._lock:
+            return self._jobs.get(session_id)
+
+    def active_count(self):
+        """Number of jobs queued or running."""
+        with self._lock:
+            return len(self._jobs)
+
+    def _beat(self):
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            with self._lock:
+                jobs = list(self._jobs.values())
+            for job in jobs:
+                job.save()
+
+    def _run(self, job, fn):
+        job.status = "running"
+        job.started_at = time.time()
+        job.save()
+        try:
+            job.result = fn(job)
+            job.status = "complete"
+            logger.info(f"Job {job.session_id} complete")
+        except Exception as e:
+            job.error = str(e)
+            job.status = "error"
+            logger.error(f"Job {job.session_id} failed: {str(e)}", exc_info=True)
+        finally:
+            job.finished_at = time.time()
+            job.save()
+            metrics.inc("jobs_total", status=job.status)
+            metrics.observe("job_seconds", job.finished_at - job.started_at)
+            with self._lock:
+                self._jobs.pop(job.session_id, None)
@@ -0,0 +1,182 @@
+"""
+Live analysis of a camera or broadcast stream (RTSP, HTTP MJPEG, anything cv2 can open).
+
+A capture thread reads the stream continuously, so the decoder never falls behind the broadcast,
+and hands one frame per sampling interval (wall-clock time) to a bounded queue. If analysis
+can't keep up, the oldest waiting frames are dropped: the stats skip a few moments instead of
+drifting further and further behind the game.
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+import cv2
+
+import metrics
+from logging_setup import FRAME_LOGGER
+
+logger = logging.getLogger(__name__)
+frame_logger = logging.getLogger(FRAME_LOGGER)
+
+class DropOldestQueue:
+    """Bounded FIFO whose put() never blocks: when full, the oldest item is discarded."""
+    def __init__(self, maxsize):
+        self.maxsize = max(1, maxsize)
+        self.dropped = 0
+        self._items = deque()
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def put(self, item):
+        """Adds item; returns the item dropped to make room, if any."""
+        dropped = None
+        with self._cond:
+            if self._closed:
+                return None
+            if len(self._items) >= self.maxsize:
+                dropped = self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+        if dropped is not None:
+            metrics.inc("live_frames_dropped_total")
+        return dropped
+
+    def get(self):
+        """Returns the oldest item, waiting for one; None once closed and drained."""
+        with self._cond:
+            while not self._items and not self._closed:
+                self._cond.wait()
+            return self._items.popleft() if self._items else None
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+class LiveCapture:
+    """
+    Samples frames from a live stream on a wall-clock schedule.
+
+    Args:
+        url (str): Stream URL (rtsp://, http://...) or anything else cv2.VideoCapture opens.
+        interval (float): Seconds between sampled frames.
+        queue_size (int): Sampled frames waiting for analysis before the oldest are dropped.
+        duration (float): Stop after this many seconds (None = until the stream ends or stop()).
+        reconnect_attempts (int): Times to reopen the stream after it fails or ends.
+        reconnect_delay (float): Seconds to wait before reopening it.
+        stop_event (threading.Event): Optional external stop signal (e.g. set on Ctrl-C).
+    """
+    def __init__(self, url, interval=2.0, queue_size=4, duration=None, reconnect_attempts=3,
+                 reconnect_delay=2.0, stop_event=None):
+        self.url = url
+        self.interval = interval
+        self.duration = duration
+        self.reconnect_attempts = reconnect_attempts
+        self.reconnect_delay = reconnect_delay
+        self.queue = DropOldestQueue(queue_size)
+        self.sampled = 0
+        self.captured_at = {}  # frame name -> wall-clock time it was captured
+        self.frame_times = {}  # frame name -> seconds since the capture started
+        self._stop = stop_event or threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="live-capture", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _open(self):
+        cap = cv2.VideoCapture(self.url)
+        if not cap.isOpened():
+            cap.release()
+            return None
+        logger.info(f"Opened live stream {self.url}")
+        return cap
+
+    def _run(self):
+        started = time.monotonic()
+        attempts = 0
+        try:
+            while not self._stop.is_set():
+                cap = self._open()
+                if cap is None:
+                    logger.error(f"Failed to open live stream: {self.url}")
+                else:
+                    attempts = 0
+                    try:
+                        self._read(cap, started)
+                    finally:
+                        cap.release()
+                if self._stop.is_set() or self._expired(started):
+                    break
+                attempts += 1
+                if attempts > self.reconnect_attempts:
+                    logger.warning(f"Live stream {self.url} ended")
+                    break
+                logger.warning(f"Live stream {self.url} interrupted, reconnecting "
+                               f"({attempts}/{self.reconnect_attempts})")
+                self._stop.wait(self.reconnect_delay)
+        except Exception as e:
+            logger.error(f"Live capture of {self.url} failed: {str(e)}", exc_info=True)
+        finally:
+            self.queue.close()
+
+    def _expired(self, started):
+        return self.duration is not None and time.monotonic() - started >= self.duration
+
+    def _read(self, cap, started):
+        next_sample = time.monotonic()
+        while not self._stop.is_set() and not self._expired(started):
+            # Grab every frame so buffered video doesn't pile up and delay later samples;
+            # only sampled frames are decoded
+            if not cap.grab():
+                return
+            now = time.monotonic()
+            if now < next_sample:
+                continue
+            with metrics.timed("decode"):
+                ok, frame = cap.retrieve()
+            if not ok:
+                continue
+            filename = f"frame_{self.sampled:04d}.jpg"
+            self.sampled += 1
+            self.captured_at[filename] = time.time()
+            self.frame_times[filename] = now - started
+            dropped = self.queue.put((filename, frame))
+            if dropped is not None:
+                self.captured_at.pop(dropped[0], None)
+                self.frame_times.pop(dropped[0], None)
+                frame_logger.debug("Analysis is behind the live stream, dropped %s", dropped[0])
+            # Keep the schedule, but don't try to catch up on intervals lost to a stall
+            next_sample = max(next_sample + self.interval, now)
+
+    def frames(self):
+        """Yields sampled (frame name, frame) pairs until the capture stops and the queue drains."""
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            yield item
+
+    def lag(self, filename):
+        """Seconds since the named frame was captured (and forgets it), or None if unknown."""
+        captured_at = self.captured_at.pop(filename, None)
+        return None if captured_at is None else time.time() - captured_at
+
+    def forget(self, filename):
+        """Drops the capture times of a frame once it has been merged, whether or not it failed."""
+        self.captured_at.pop(filename, None)
+        self.frame_times.pop(filename, None)
@@ -0,0 +1,128 @@
+"""
+Asynchronous logging for the entry points (the CLI, the Flask app and the benchmarks).
+
+Library modules only create loggers; whoever runs the pipeline calls configure_logging() once.
+Records are put on a bounded in-memory queue by the threads that log them and are formatted and
+written by a single listener thread, so slow disks and terminals never stall frame analysis.
+A forked child (gunicorn --preload workers) gets a fresh queue and listener of its own, since
+the parent's listener thread doesn't survive the fork.
+"""
+import atexit
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Per-frame detail (progress lines, raw model responses) is logged here, so it can be gated
+# and sampled separately from the rest of basketball_analysis
+FRAME_LOGGER = "basketball_analysis.frames"
+
+_listener = None
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that defers formatting to the listener and drops records when the queue is full."""
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # The stock handler formats the message here, on the logging thread. Records stay in
+        # this process, so they can be handed over as they are and formatted by the listener.
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class SampleFilter(logging.Filter):
+    """Passes every `every`-th record below WARNING; warnings and errors always pass."""
+    def __init__(self, every):
+        super().__init__()
+        self.every = max(1, every)
+        self._seen = 0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        self._seen += 1
+        return self._seen % self.every == 1 or self.every == 1
+
+def configure_logging(level=logging.INFO, log_file=None, stream=sys.stderr, frame_level=None,
+                      frame_sample_every=1, max_queue=10000, max_bytes=0, backup_count=5):
+    """
+    Routes all logging through a queue to a listener thread writing to log_file and stream.
+
+    Args:
+        level: Root log level (name or number).
+        log_file (str): File to append to, or None.
+        stream: Stream to also write to (default stderr), or None.
+        frame_level: Level for per-frame detail (FRAME_LOGGER); defaults to `level`.
+        frame_sample_every (int): Keep only every n-th per-frame record below WARNING.
+        max_queue (int): Records buffered before new ones are dropped rather than blocking.
+        max_bytes (int): Rotate log_file once it reaches this size, keeping backup_count old
+            files (0 = never). Only safe with a single writing process: rotate the logs of
+            multi-worker servers externally instead.
+
+    Calling it again replaces the previous configuration. Returns the QueueListener.
+    """
+    global _listener
+    stop_logging()
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = []
+    if log_file and max_bytes:
+        handlers.append(RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count))
+    elif log_file:
+        handlers.append(logging.FileHandler(log_file))
+    if stream is not None:
+        handlers.append(logging.StreamHandler(stream))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=max_queue)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, _NonBlockingQueueHandler):
+            root.removeHandler(handler)
+    root.addHandler(_NonBlockingQueueHandler(log_queue))
+    root.setLevel(level)
+
+    frame_logger = logging.getLogger(FRAME_LOGGER)
+    frame_logger.setLevel(frame_level if frame_level is not None else level)
+    frame_logger.filters = [f for f in frame_logger.filters if not isinstance(f, SampleFilter)]
+    if frame_sample_every > 1:
+        frame_logger.addFilter(SampleFilter(frame_sample_every))
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+def stop_logging():
+    """Flushes queued records and stops the listener thread, if one is running."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+def _restart_after_fork():
+    """In a forked child: replaces the inherited queue and the listener thread that wasn't copied."""
+    global _listener
+    if _listener is None:
+        return
+    # Records the parent had queued are its own to write; the child starts with an empty queue
+    log_queue = queue.Queue(maxsize=_listener.queue.maxsize)
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, _NonBlockingQueueHandler):
+            handler.queue = log_queue
+    _listener = QueueListener(log_queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+atexit.register(stop_logging)
+os.register_at_fork(after_in_child=_restart_after_fork)
@@ -0,0 +1,175 @@
+"""
+In-process counters and timing histograms for the analysis pipeline.
+
+Everything is recorded into the process-wide REGISTRY, rendered in the Prometheus text format by
+the app's /metrics endpoint, and also into the registry of the session being recorded (see
+recording()), which becomes that session's timings.json report.
+"""
+import bisect
+import contextvars
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIX = "basketball_"
+
+# Upper bounds (seconds) of the stage_seconds histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HELP = {
+    "stage_seconds": "Time spent in each pipeline stage.",
+    "api_requests_total": "Model API requests by outcome.",
+    "api_retries_total": "Retries the API client made after failed or rate-limited requests.",
+    "api_hedges_total": "Duplicate requests sent for slow calls, and how many answered first.",
+    "api_prompt_tokens_total": "Prompt tokens reported by the model API.",
+    "api_completion_tokens_total": "Completion tokens reported by the model API.",
+    "cache_lookups_total": "Response cache lookups by result.",
+    "parse_failures_total": "Model responses that could not be parsed.",
+    "batch_fallbacks_total": "Batched requests retried one frame at a time.",
+    "frames_total": "Frames merged into results by status.",
+    "live_frames_dropped_total": "Live stream frames dropped because analysis fell behind.",
+    "jobs_total": "Finished analysis jobs by status.",
+    "job_seconds": "Run time of analysis jobs, excluding time queued.",
+    "sessions_reaped_total": "Session directories deleted by the reaper, by reason (ttl or quota).",
+}
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (the maximum for the last bucket)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+class MetricsRegistry:
+    """Thread-safe set of labelled counters and histograms."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}    # name -> {label key: value}
+        self.histograms = {}  # name -> {label key: Histogram}
+
+    def inc(self, name, value=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram()
+            series[key].observe(value)
+
+    def render(self):
+        """Returns all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# HELP {PREFIX}{name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {PREFIX}{name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{PREFIX}{name}{_format_labels(key)} {value}")
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f"# HELP {PREFIX}{name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {PREFIX}{name} histogram")
+                for key, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                        cumulative += count
+                        lines.append(f"{PREFIX}{name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+                    lines.append(f"{PREFIX}{name}_sum{_format_labels(key)} {histogram.sum}")
+                    lines.append(f"{PREFIX}{name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def report(self):
+        """Returns a JSON-friendly summary: per-stage timing statistics and counter totals."""
+        with self._lock:
+            stages = {}
+            for key, histogram in self.histograms.get("stage_seconds", {}).items():
+                stages[dict(key)["stage"]] = {
+                    "count": histogram.count,
+                    "total_seconds": round(histogram.sum, 4),
+                    "mean_seconds": round(histogram.sum / histogram.count, 4) if histogram.count else 0.0,
+                    "p50_seconds": round(histogram.quantile(0.5), 4),
+                    "p95_seconds": round(histogram.quantile(0.95), 4),
+                    "max_seconds": round(histogram.max, 4),
+                }
+            counters = {}
+            for name, series in self.counters.items():
+                for key, value in series.items():
+                    label = ",".join(f"{k}={v}" for k, v in key)
+                    counters[f"{name}{{{label}}}" if label else name] = value
+        return {"stages": dict(sorted(stages.items())), "counters": dict(sorted(counters.items()))}
+
+    def write_report(self, path, **extra):
+        report = dict(extra, **self.report())
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+
+REGISTRY = MetricsRegistry()
+
+# Registry of the session recorded in the current context, if any
+_session = contextvars.ContextVar("metrics_session", default=None)
+
+def inc(name, value=1, **labels):
+    REGISTRY.inc(name, value, **labels)
+    session = _session.get()
+    if session is not None:
+        session.inc(name, value, **labels)
+
+def observe(name, value, **labels):
+    REGISTRY.observe(name, value, **labels)
+    session = _session.get()
+    if session is not None:
+        session.observe(name, value, **labels)
+
+@contextmanager
+def timed(stage):
+    """Records the time spent in the block under stage_seconds{stage=...}."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("stage_seconds", time.perf_counter() - start, stage=stage)
+
+@contextmanager
+def recording(session):
+    """
+    Also records metrics into `session` (a MetricsRegistry) within the block. Context variables
+    don't follow work submitted to thread pools, so worker tasks need their own recording block.
+    """
+    token = _session.set(session)
+    try:
+        yield session
+    finally:
+        _session.reset(token)
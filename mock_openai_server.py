@@ -0,0 +1,213 @@
+"""
+Local stand-in for the OpenAI chat-completions endpoint, for offline load tests and benchmarks.
+
+Point the pipeline at it with OPENAI_BASE_URL=http://127.0.0.1:8765/v1 (any OPENAI_API_KEY), or
+in-process with basketball_analysis.set_backend(OpenAIBackend(api_key="mock", base_url=...)).
+"""
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Approximate gpt-4o prompt tokens for one high-detail image, and the flat cost of a low-detail one
+IMAGE_TOKENS = 765
+LOW_DETAIL_IMAGE_TOKENS = 85
+
+DEFAULT_RESPONSES = [
+    '{"points": {}, "passes": 0, "rebounds": {}}',
+    '{"points": {}, "passes": 1, "rebounds": {}}',
+    '{"points": {"23": 2}, "passes": 1, "rebounds": {}}',
+    '{"points": {}, "passes": 0, "rebounds": {"11": 1}}',
+    '```json\n{"points": {"5": 3}, "passes": 2, "rebounds": {}}\n```',
+]
+
+class MockConfig:
+    """
+    Behaviour of the mock endpoint.
+
+    Args:
+        latency_ms (float): Median response latency for a single-image request.
+        per_image_ms (float): Extra latency for each additional image in a batched request.
+        latency_dist (str): "fixed", "uniform" (latency_ms +/- jitter_ms) or "lognormal"
+            (median latency_ms, shape sigma) for realistic long tails.
+        jitter_ms (float): Half-width of the uniform distribution.
+        sigma (float): Shape of the lognormal distribution.
+        error_rate (float): Fraction of requests answered with HTTP 500.
+        rate_limit_rate (float): Fraction of requests answered with HTTP 429 and Retry-After.
+        responses (list): Canned message contents, picked at random per request.
+        seed (int): Seed for reproducible runs.
+    """
+    def __init__(self, latency_ms=800, latency_dist="lognormal", jitter_ms=200, sigma=0.4,
+                 error_rate=0.0, rate_limit_rate=0.0, responses=None, seed=None, per_image_ms=150):
+        self.latency_ms = latency_ms
+        self.per_image_ms = per_image_ms
+        self.latency_dist = latency_dist
+        self.jitter_ms = jitter_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.responses = responses or DEFAULT_RESPONSES
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample_latency(self, images=1):
+        with self._lock:
+            if self.latency_dist == "fixed":
+                latency = self.latency_ms
+            elif self.latency_dist == "uniform":
+                latency = self._random.uniform(self.latency_ms - self.jitter_ms, self.latency_ms + self.jitter_ms)
+            else:
+                latency = self.latency_ms * self._random.lognormvariate(0, self.sigma)
+        return (max(latency, 0) + self.per_image_ms * max(images - 1, 0)) / 1000
+
+    def sample_outcome(self):
+        """Returns "error", "rate_limited" or "ok" for one request."""
+        with self._lock:
+            roll = self._random.random()
+        if roll < self.error_rate:
+            return "error"
+        if roll < self.error_rate + self.rate_limit_rate:
+            return "rate_limited"
+        return "ok"
+
+    def sample_content(self):
+        with self._lock:
+            return self._random.choice(self.responses)
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        try:
+            request = json.loads(body)
+        except ValueError:
+            self._send_json(400, {"error": {"message": "Invalid JSON"}})
+            return
+
+        images = 0
+        image_tokens = 0
+        text_chars = 0
+        for message in request.get("messages", []):
+            parts = message.get("content")
+            if isinstance(parts, str):
+                text_chars += len(parts)
+                continue
+            for part in parts or []:
+                if part.get("type") == "image_url":
+                    images += 1
+                    low = part.get("image_url", {}).get("detail") == "low"
+                    image_tokens += LOW_DETAIL_IMAGE_TOKENS if low else IMAGE_TOKENS
+                else:
+                    text_chars += len(part.get("text", ""))
+
+        config = self.server.config
+        time.sleep(config.sample_latency(images))
+
+        outcome = config.sample_outcome()
+        if outcome == "error":
+            self._send_json(500, {"error": {"message": "Mock internal error", "type": "server_error"}})
+            return
+        if outcome == "rate_limited":
+            self._send_json(429, {"error": {"message": "Mock rate limit", "type": "rate_limit_error"}},
+                            headers={"Retry-After": "1"})
+            return
+
+        if images > 1:
+            # Batched request: one canned object per image, as a JSON array
+            frames = [json.loads(config.sample_content().strip().strip("`").replace("json", "", 1))
+                      for _ in range(images)]
+            content = json.dumps(frames)
+        else:
+            content = config.sample_content()
+        prompt_tokens = image_tokens + text_chars // 4
+        completion_tokens = max(1, len(content) // 4)
+        self._send_json(200, {
+            "id": f"chatcmpl-mock-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+def start_mock_server(host="127.0.0.1", port=0, config=None):
+    """
+    Starts the mock server on a background thread.
+    Returns (server, base_url); call server.shutdown() to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), MockHandler)
+    server.daemon_threads = True
+    server.config = config or MockConfig()
+    thread = threading.Thread(target=server.serve_forever, name="mock-openai", daemon=True)
+    thread.start()
+    base_url = f"http://{host}:{server.server_address[1]}/v1"
+    logger.info(f"Mock OpenAI server listening on {base_url}")
+    return server, base_url
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local mock of the OpenAI chat-completions API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=800)
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--per-image-ms", type=float, default=150)
+    parser.add_argument("--jitter-ms", type=float, default=200)
+    parser.add_argument("--sigma", type=float, default=0.4)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--responses", help="JSON file with a list of canned message contents")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    responses = None
+    if args.responses:
+        with open(args.responses) as f:
+            responses = json.load(f)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    config = MockConfig(args.latency_ms, args.latency_dist, args.jitter_ms, args.sigma,
+                        args.error_rate, args.rate_limit_rate, responses, args.seed, args.per_image_ms)
+    server = ThreadingHTTPServer((args.host, args.port), MockHandler)
+    server.daemon_threads = True
+    server.config = config
+    logger.info(f"Mock OpenAI server listening on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import base64
+import logging
+import math
+from collections import namedtuple
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+# One image ready to send: base64 JPEG, its pixel size and the detail mode to request
+EncodedImage = namedtuple("EncodedImage", ["data", "width", "height", "detail"])
+
+# Vision token pricing for gpt-4o: a flat cost, plus a cost per 512px tile in high detail
+BASE_IMAGE_TOKENS = 85
+TILE_TOKENS = 170
+
+# The API downscales high-detail images to fit HIGH_DETAIL_MAX_SIDE, then to a shortest side of
+# HIGH_DETAIL_SHORT_SIDE; low-detail images are seen at LOW_DETAIL_SIDE. Pixels beyond that are
+# uploaded and then thrown away.
+HIGH_DETAIL_MAX_SIDE = 2048
+HIGH_DETAIL_SHORT_SIDE = 768
+LOW_DETAIL_SIDE = 512
+
+DETAIL_MODES = ("low", "high", "auto")
+
+def _model_scale(width, height, detail):
+    """Factor the API would scale a width x height image by before looking at it."""
+    if detail == "low":
+        return min(1.0, LOW_DETAIL_SIDE / max(width, height))
+    scale = min(1.0, HIGH_DETAIL_MAX_SIDE / max(width, height))
+    return scale * min(1.0, HIGH_DETAIL_SHORT_SIDE / (min(width, height) * scale))
+
+def image_tokens(width, height, detail=None):
+    """Prompt tokens the model charges for one image of the given size and detail mode."""
+    if detail == "low":
+        return BASE_IMAGE_TOKENS
+    scale = _model_scale(width, height, "high")
+    tiles = math.ceil(width * scale / 512) * math.ceil(height * scale / 512)
+    return BASE_IMAGE_TOKENS + TILE_TOKENS * tiles
+
+class PayloadOptions:
+    """
+    How frames are turned into image payloads for the model.
+
+    Args:
+        max_dimension: Longest side in pixels to downscale to, or "auto" to downscale to the
+            size the API would reduce the image to anyway for the chosen detail mode (no loss
+            in what the model sees). None sends frames at full resolution.
+        jpeg_quality (int): JPEG quality for re-encoded frames. None keeps extracted JPEG files
+            byte-for-byte when they need no resize or crop, and uses 95 otherwise.
+        detail (str): "low", "high" or "auto" detail mode for the API, or None to leave it unset.
+        crop_regions (list): (x, y, w, h) rectangles as fractions of the frame size. Frames are
+            cropped to the box enclosing all of them (e.g. the court or the hoops).
+    """
+    def __init__(self, max_dimension=None, jpeg_quality=None, detail=None, crop_regions=None):
+        if detail is not None and detail not in DETAIL_MODES:
+            raise ValueError(f"detail must be one of {DETAIL_MODES}, got {detail!r}")
+        self.max_dimension = max_dimension
+        self.jpeg_quality = jpeg_quality
+        self.detail = detail
+        self.crop_regions = crop_regions or []
+
+    def __repr__(self):
+        return (f"PayloadOptions(max_dimension={self.max_dimension!r}, jpeg_quality={self.jpeg_quality!r}, "
+                f"detail={self.detail!r}, crop_regions={self.crop_regions!r})")
+
+    def _crop(self, image):
+        if not self.crop_regions:
+            return image
+        height, width = image.shape[:2]
+        x0 = min(x for x, _, _, _ in self.crop_regions)
+        y0 = min(y for _, y, _, _ in self.crop_regions)
+        x1 = max(x + w for x, _, w, _ in self.crop_regions)
+        y1 = max(y + h for _, y, _, h in self.crop_regions)
+        left, top = max(0, int(x0 * width)), max(0, int(y0 * height))
+        right, bottom = min(width, math.ceil(x1 * width)), min(height, math.ceil(y1 * height))
+        if right - left < 2 or bottom - top < 2:
+            logger.warning(f"Crop regions {self.crop_regions} leave no image, sending the full frame")
+            return image
+        return image[top:bottom, left:right]
+
+    def _scale(self, width, height):
+        if self.max_dimension == "auto":
+            return _model_scale(width, height, self.detail)
+        if self.max_dimension:
+            return min(1.0, self.max_dimension / max(width, height))
+        return 1.0
+
+    def encode(self, source):
+        """
+        Builds the payload for a frame.
+
+        Args:
+            source: Path of an extracted JPEG, or an already-decoded frame (numpy array).
+
+        Returns an EncodedImage.
+        """
+        if isinstance(source, str):
+            image = cv2.imread(source)
+            if image is None:
+                raise ValueError(f"Could not read image: {source}")
+        else:
+            image = source
+
+        cropped = self._crop(image)
+        height, width = cropped.shape[:2]
+        scale = self._scale(width, height)
+
+        if isinstance(source, str) and cropped is image and scale == 1.0 and self.jpeg_quality is None:
+            # Nothing to change: send the extracted file as it is
+            with open(source, "rb") as f:
+                return EncodedImage(base64.b64encode(f.read()).decode("utf-8"), width, height, self.detail)
+
+        if scale < 1.0:
+            width, height = max(1, round(width * scale)), max(1, round(height * scale))
+            cropped = cv2.resize(cropped, (width, height), interpolation=cv2.INTER_AREA)
+        quality = self.jpeg_quality if self.jpeg_quality is not None else 95
+        success, buffer = cv2.imencode(".jpg", cropped, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not success:
+            raise ValueError("Failed to JPEG-encode frame")
+        return EncodedImage(base64.b64encode(buffer.tobytes()).decode("utf-8"), width, height, self.detail)
+
+def parse_max_dimension(text):
+    """Parses a --max-dim style value: empty for none, "auto", or a pixel count."""
+    if not text:
+        return None
+    return "auto" if text == "auto" else int(text)
@@ -1,36 +1,23 @@
-import csv
-import json
-from collections import defaultdict
 import logging
+import os
+import sys
+
+from event_store import load_totals
+
+logger = logging.getLogger(__name__)
 
 def print_final_stats(csv_path):
-    logger = logging.getLogger("print_final_gamestats")
-    logger.setLevel(logging.INFO)
-
-    points = defaultdict(int)
-    rebounds = defaultdict(int)
-    total_passes = 0
-
-    with open(csv_path, newline='') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            try:
-                frame_points = json.loads(row["points"] or "{}")
-                if isinstance(frame_points, dict):
-                    for jersey, score in frame_points.items():
-                        points[jersey] += score
-
-                frame_rebounds = json.loads(row["rebounds"] or "{}")
-                if isinstance(frame_rebounds, dict):
-                    for jersey, count in frame_rebounds.items():
-                        rebounds[jersey] += count
-
-                passes_val = row["passes"].strip()
-                if passes_val.isdigit():
-                    total_passes += int(passes_val)
-
-            except (json.JSONDecodeError, ValueError) as e:
-                logger.error(f"Error parsing row {row.get('frame', '?')}: {e}")
+    """
+    Prints the final totals of the analysis whose summary.csv is at csv_path. They are read from
+    the events.npz event store next to it, or summed from the CSV for outputs written before it.
+    """
+    logger.info(f"Reading final stats from: {csv_path}")
+    try:
+        totals = load_totals(os.path.dirname(csv_path) or ".")
+    except Exception as e:
+        logger.error(f"Error reading final stats: {str(e)}")
+        return
+    points, total_passes, rebounds = totals["points"], totals["passes"], totals["rebounds"]
 
     print("\n🏀 Final Game Stats from Video Analysis")
 
@@ -52,5 +39,5 @@ def print_final_stats(csv_path):
         print("   - No rebounds detected.")
 
 if __name__ == "__main__":
-    csv_file_path = "output/summary.csv"
+    csv_file_path = sys.argv[1] if len(sys.argv) > 1 else "output/summary.csv"
     print_final_stats(csv_file_path)
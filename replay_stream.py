@@ -0,0 +1,111 @@
+"""
+Local stand-in for a live game stream: replays a video file at real-time speed as an HTTP
+MJPEG stream (multipart/x-mixed-replace, the format IP cameras serve), for testing live mode.
+
+    python replay_stream.py game.mp4 --port 8554
+    python basketball_analysis.py --live http://127.0.0.1:8554/stream.mjpg
+
+Run it as its own process (start_replay_server does): opening a stream blocks the opening
+thread's interpreter, so a server on a thread of the same process would stall with it.
+"""
+import argparse
+import logging
+import multiprocessing
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+BOUNDARY = "frame"
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def do_GET(self):
+        server = self.server
+        cap = cv2.VideoCapture(server.video_path)
+        if not cap.isOpened():
+            self.send_error(500, f"Failed to open {server.video_path}")
+            return
+        fps = (cap.get(cv2.CAP_PROP_FPS) or 30) * server.speed
+        self.send_response(200)
+        self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        # Every client watches from the start, paced by the video's own frame rate
+        started = time.monotonic()
+        sent = 0
+        try:
+            while True:
+                ok, frame = cap.read()
+                if not ok:
+                    if not server.loop:
+                        break
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    continue
+                ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, server.jpeg_quality])
+                if not ok:
+                    continue
+                data = jpeg.tobytes()
+                self.wfile.write(f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                                 f"Content-Length: {len(data)}\r\n\r\n".encode("ascii") + data + b"\r\n")
+                sent += 1
+                delay = started + sent / fps - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+        except (BrokenPipeError, ConnectionResetError):
+            logger.debug(f"Client disconnected after {sent} frames")
+        finally:
+            cap.release()
+
+def _serve(video_path, host, port, loop, speed, jpeg_quality, ready):
+    server = ThreadingHTTPServer((host, port), ReplayHandler)
+    server.daemon_threads = True
+    server.video_path = video_path
+    server.loop = loop
+    server.speed = speed
+    server.jpeg_quality = jpeg_quality
+    if ready is not None:
+        ready.send(server.server_address[1])
+        ready.close()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+def start_replay_server(video_path, host="127.0.0.1", port=0, loop=False, speed=1.0, jpeg_quality=90):
+    """
+    Starts the replay server in a child process.
+    Returns (process, stream_url); call process.terminate() to stop it.
+    """
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_serve, name="replay-stream", daemon=True,
+                                      args=(video_path, host, port, loop, speed, jpeg_quality, sender))
+    process.start()
+    sender.close()
+    port = receiver.recv()
+    receiver.close()
+    url = f"http://{host}:{port}/stream.mjpg"
+    logger.info(f"Replaying {video_path} at {url}")
+    return process, url
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a video as a real-time HTTP MJPEG stream.")
+    parser.add_argument("video", help="Video file to replay")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8554)
+    parser.add_argument("--loop", action="store_true", help="Start over at the end instead of ending the stream")
+    parser.add_argument("--speed", type=float, default=1.0, help="Playback speed relative to real time")
+    parser.add_argument("--jpeg-quality", type=int, default=90)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    logger.info(f"Replaying {args.video} at http://{args.host}:{args.port}/stream.mjpg")
+    _serve(args.video, args.host, args.port, args.loop, args.speed, args.jpeg_quality, None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import hashlib
+import logging
+import time
+
+from sqlite_cache import SQLiteCache
+
+logger = logging.getLogger(__name__)
+
+class ResponseCache(SQLiteCache):
+    """
+    Persistent, content-addressed cache of model responses backed by SQLite.
+
+    Entries are keyed by a hash of the encoded image, the prompt text and the model name,
+    so unchanged frames re-analyzed with the same prompt/model never hit the API again.
+
+    Args:
+        path (str): SQLite database file.
+        ttl_seconds (int): Entries older than this are treated as misses and evicted (None = never).
+        max_bytes (int): Approximate size budget for stored responses; least recently
+            accessed entries are evicted first once it is exceeded (None = unbounded).
+    """
+    table = "responses"
+    extra_columns = "value TEXT NOT NULL,"
+    entry_name = "responses"
+
+    def __init__(self, path="response_cache.sqlite3", ttl_seconds=30 * 24 * 3600,
+                 max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        super().__init__(path, max_bytes)
+        logger.debug(f"Response cache opened at {path}")
+
+    @staticmethod
+    def make_key(base64_image, prompt, model):
+        h = hashlib.sha256()
+        for part in (model, prompt, base64_image):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._touch(key, now)
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, value):
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._added(size, now)
+            self._conn.commit()
+
+    def _expire(self, now):
+        if self.ttl_seconds is not None:
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
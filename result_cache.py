@@ -0,0 +1,177 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+from sqlite_cache import SQLiteCache
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+RESULT_FILENAME = "result.json"
+# root/<key>.lock is flocked shared while an entry is read, exclusively while it is replaced or evicted
+LOCK_SUFFIX = ".lock"
+
+def save_and_hash(stream, path, chunk_size=HASH_CHUNK_SIZE):
+    """
+    Copies a readable binary stream (e.g. an upload) to path in chunks, hashing it on the way,
+    so the file is read only once. Returns the hex SHA-256 of its content.
+    """
+    h = hashlib.sha256()
+    with open(path, "wb") as f:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            h.update(chunk)
+            f.write(chunk)
+    return h.hexdigest()
+
+def file_hash(path, chunk_size=HASH_CHUNK_SIZE):
+    """Returns the hex SHA-256 of a file's content, as save_and_hash would have."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+def analysis_key(video_hash, params):
+    """
+    Cache key of one analysis: the video's content hash plus every parameter that can change
+    the results (sampling, batching, filtering, payload settings, model and prompts).
+    """
+    h = hashlib.sha256()
+    h.update(video_hash.encode("utf-8"))
+    h.update(b"\0")
+    h.update(json.dumps(params, sort_keys=True, default=repr).encode("utf-8"))
+    return h.hexdigest()
+
+def link_tree(src, dst):
+    """Recreates directory src at dst with hard links, copying files where linking isn't possible."""
+    for dirpath, _, filenames in os.walk(src):
+        target_dir = os.path.join(dst, os.path.relpath(dirpath, src))
+        os.makedirs(target_dir, exist_ok=True)
+        for filename in filenames:
+            source, target = os.path.join(dirpath, filename), os.path.join(target_dir, filename)
+            try:
+                os.link(source, target)
+            except OSError:
+                shutil.copy2(source, target)
+
+def _tree_size(path):
+    return sum(os.path.getsize(os.path.join(dirpath, filename))
+               for dirpath, _, filenames in os.walk(path) for filename in filenames)
+
+class ResultCache(SQLiteCache):
+    """
+    Completed analyses keyed by analysis_key, so re-uploading a game returns its results
+    without running the pipeline again.
+
+    Each entry is a copy of a session's output directory plus its final result, stored under
+    root/<key>/. An SQLite index tracks sizes and access times. A lock file per entry keeps
+    readers linking its outputs (shared) apart from writers replacing or evicting it
+    (exclusive), across processes.
+
+    Args:
+        root (str): Directory holding the entries and the index.
+        max_bytes (int): Disk budget; least recently used entries are deleted once it is
+            exceeded (None = unbounded).
+    """
+    table = "results"
+    entry_name = "analyses"
+
+    def __init__(self, root="result_cache", max_bytes=2 * 1024 * 1024 * 1024):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        super().__init__(os.path.join(root, "index.sqlite3"), max_bytes)
+        logger.debug(f"Result cache opened at {root}")
+
+    def _entry_dir(self, key):
+        return os.path.join(self.root, key)
+
+    def _lock_entry(self, key, operation):
+        """Returns the entry's lock file, flocked with operation; close it to unlock."""
+        path = os.path.join(self.root, key + LOCK_SUFFIX)
+        while True:
+            lock_file = open(path, "a")
+            try:
+                fcntl.flock(lock_file, operation)
+                # Eviction deletes lock files: make sure the locked one is still the entry's
+                if os.fstat(lock_file.fileno()).st_ino == os.stat(path).st_ino:
+                    return lock_file
+            except FileNotFoundError:
+                pass
+            except BaseException:
+                lock_file.close()
+                raise
+            lock_file.close()
+
+    def get(self, key, output_dir=None):
+        """
+        Returns the result dict of a cached analysis, or None. Given output_dir, the cached
+        outputs are first linked into it (see link_tree), with the entry locked so that it
+        isn't replaced or evicted halfway.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT key FROM results WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._touch(key, time.time())
+                self._conn.commit()
+        result = None
+        if row is not None:
+            with self._lock_entry(key, fcntl.LOCK_SH):
+                result_path = os.path.join(self._entry_dir(key), RESULT_FILENAME)
+                if os.path.exists(result_path):
+                    if output_dir is not None:
+                        link_tree(os.path.join(self._entry_dir(key), "output"), output_dir)
+                    with open(result_path) as f:
+                        result = json.load(f)
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return result
+
+    def put(self, key, output_dir, result):
+        """Stores a copy of a completed analysis' output directory and its result."""
+        entry_dir = self._entry_dir(key)
+        tmp_dir = f"{entry_dir}.{os.getpid()}.{threading.get_ident()}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        # A real copy rather than links: the session's files may be deleted or rewritten later
+        shutil.copytree(output_dir, os.path.join(tmp_dir, "output"))
+        with open(os.path.join(tmp_dir, RESULT_FILENAME), "w") as f:
+            json.dump(result, f)
+        size = _tree_size(tmp_dir)
+
+        with self._lock_entry(key, fcntl.LOCK_EX):
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(tmp_dir, entry_dir)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, size, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, size, now, now),
+            )
+            self._added(size, now, keep=key)
+            self._conn.commit()
+
+    def _evict_entries(self, keys):
+        evicted = []
+        for key in keys:
+            try:
+                lock_file = self._lock_entry(key, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue  # Being linked into a session right now; evicted on a later pass
+            with lock_file:
+                shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+                os.remove(lock_file.name)
+            evicted.append(key)
+        return evicted
@@ -0,0 +1,285 @@
+"""
+Analyzes a whole season of game videos in one run.
+
+Several games are in flight at once, so decoding one game overlaps the model requests of the
+others, while every game draws on a single pool of analysis workers and a single API rate
+budget. Each game gets its own output directory (as basketball_analysis.py writes) and the
+season roll-up combines them. Interrupted runs pick up where they stopped:
+
+    python season_batch.py games/ --out season_2024 --workers 16 --rpm 400
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import basketball_analysis
+from frame_prefilter import FramePrefilter, parse_regions
+from event_store import EVENTS_FILENAME, EventStore
+from logging_setup import configure_logging
+from payload_optimizer import PayloadOptions, parse_max_dimension
+from response_cache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTENSIONS = {".mp4", ".mov", ".avi", ".mkv"}
+GAME_FILENAME = "game.json"
+SEASON_SUMMARY_JSON = "season_summary.json"
+SEASON_SUMMARY_CSV = "season_summary.csv"
+SEASON_EVENTS = "season_events.npz"
+
+def load_games(source):
+    """
+    Returns [(game name, video path)] for a directory of videos or a manifest file.
+
+    A manifest is either a text file with one video path per line (blank lines and lines
+    starting with # are ignored) or a JSON list of paths or {"video": ..., "name": ...}
+    objects. Relative paths are resolved against the manifest's directory.
+    """
+    if os.path.isdir(source):
+        entries = [{"video": os.path.join(source, f)} for f in sorted(os.listdir(source))
+                   if os.path.splitext(f)[1].lower() in VIDEO_EXTENSIONS]
+    else:
+        base_dir = os.path.dirname(os.path.abspath(source))
+        with open(source) as f:
+            if source.endswith(".json"):
+                entries = [e if isinstance(e, dict) else {"video": e} for e in json.load(f)]
+            else:
+                entries = [{"video": line.strip()} for line in f
+                           if line.strip() and not line.lstrip().startswith("#")]
+        for entry in entries:
+            entry["video"] = os.path.join(base_dir, entry["video"])
+
+    games = []
+    names = set()
+    for entry in entries:
+        name = entry.get("name") or os.path.splitext(os.path.basename(entry["video"]))[0]
+        unique, n = name, 2
+        while unique in names:
+            unique, n = f"{name}_{n}", n + 1
+        names.add(unique)
+        games.append((unique, entry["video"]))
+    return games
+
+def load_game_state(game_dir):
+    try:
+        with open(os.path.join(game_dir, GAME_FILENAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_game_state(game_dir, state):
+    path = os.path.join(game_dir, GAME_FILENAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+def analyze_game(name, video_path, game_dir, options, stop_event):
+    """Analyzes one game into game_dir, resuming its checkpoint. Returns its state dict."""
+    if stop_event.is_set():
+        return {"name": name, "video": video_path, "status": "pending"}
+    os.makedirs(game_dir, exist_ok=True)
+    state = load_game_state(game_dir) or {}
+    # Anything but a finished game (interrupted, stopped, failed) continues from its checkpoint
+    resume = state.get("video") == video_path and state.get("status") != "complete"
+    state = {"name": name, "video": video_path, "status": "running", "started_at": time.time()}
+    save_game_state(game_dir, state)
+
+    prefilter = None
+    if options["prefilter_threshold"] is not None:
+        # Prefilters keep per-video motion state, so each game gets its own
+        prefilter = FramePrefilter(options["prefilter_threshold"], options["hoop_regions"],
+                                   options["prefilter_model"])
+    logger.info(f"{'Resuming' if resume else 'Starting'} game {name}: {video_path}")
+    try:
+        points, passes, rebounds = basketball_analysis.analyze_video(
+            video_path, output_dir=game_dir, step=options["step"],
+            frames_per_minute=options["frames_per_minute"], max_workers=options["max_workers"],
+            cache=options["cache"], resume=resume, batch_size=options["batch_size"],
+            dedup_threshold=options["dedup_threshold"], prefilter=prefilter, payload=options["payload"],
+            rate_limiter=options["rate_limiter"], executor=options["executor"], stop_event=stop_event)
+    except Exception as e:
+        logger.error(f"Game {name} failed: {str(e)}", exc_info=True)
+        state.update(status="error", error=str(e), finished_at=time.time())
+        save_game_state(game_dir, state)
+        return state
+
+    # A stopped game keeps its checkpoint and is resumed by the next run
+    state.update(status="stopped" if stop_event.is_set() else "complete", finished_at=time.time(),
+                 totals={"points": dict(points), "passes": passes, "rebounds": dict(rebounds)})
+    save_game_state(game_dir, state)
+    logger.info(f"Game {name} {state['status']} in {state['finished_at'] - state['started_at']:.1f}s")
+    return state
+
+def write_season_summary(out_dir, states):
+    """
+    Writes the season roll-up: per-game totals plus season totals as JSON and CSV, and the
+    complete games' event stores combined into one for season-wide queries (see event_store).
+    """
+    season = {"points": defaultdict(int), "passes": 0, "rebounds": defaultdict(int)}
+    games = []
+    for state in states:
+        totals = state.get("totals") or {"points": {}, "passes": 0, "rebounds": {}}
+        games.append({"name": state["name"], "video": state["video"], "status": state["status"],
+                      "totals": totals})
+        if state["status"] != "complete":
+            continue
+        for jersey, score in totals["points"].items():
+            season["points"][jersey] += score
+        season["passes"] += totals["passes"]
+        for jersey, count in totals["rebounds"].items():
+            season["rebounds"][jersey] += count
+
+    summary = {
+        "games_complete": sum(1 for g in games if g["status"] == "complete"),
+        "games_total": len(games),
+        "totals": {"points": dict(season["points"]), "passes": season["passes"],
+                   "rebounds": dict(season["rebounds"])},
+        "games": games,
+    }
+    with open(os.path.join(out_dir, SEASON_SUMMARY_JSON), "w") as f:
+        json.dump(summary, f, indent=2)
+    with open(os.path.join(out_dir, SEASON_SUMMARY_CSV), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["game", "status", "points", "passes", "rebounds"])
+        writer.writeheader()
+        for game in games + [{"name": "SEASON", "status": "", "totals": summary["totals"]}]:
+            totals = game["totals"]
+            writer.writerow({
+                "game": game["name"],
+                "status": game["status"],
+                "points": json.dumps(totals["points"]),
+                "passes": totals["passes"],
+                "rebounds": json.dumps(totals["rebounds"]),
+            })
+
+    stores = []
+    for game in games:
+        events_path = os.path.join(out_dir, game["name"], EVENTS_FILENAME)
+        if game["status"] == "complete" and os.path.exists(events_path):
+            stores.append(EventStore.load(events_path))
+    EventStore.concat(stores).save(os.path.join(out_dir, SEASON_EVENTS))
+    return summary
+
+def run_season(games, out_dir, options, games_in_flight=2, redo=False, stop_event=None):
+    """
+    Analyzes every game not already complete in out_dir, up to games_in_flight at a time,
+    then writes the season roll-up. Returns the summary dict.
+    """
+    stop_event = stop_event or threading.Event()
+    os.makedirs(out_dir, exist_ok=True)
+    states = {}
+    todo = []
+    for name, video_path in games:
+        state = load_game_state(os.path.join(out_dir, name))
+        if not redo and state and state.get("status") == "complete" and state.get("video") == video_path:
+            states[name] = state
+        else:
+            todo.append((name, video_path))
+    logger.info(f"Season: {len(games)} games, {len(games) - len(todo)} already complete, {len(todo)} to analyze")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, games_in_flight), thread_name_prefix="game") as games_pool:
+        futures = {name: games_pool.submit(analyze_game, name, video_path, os.path.join(out_dir, name),
+                                           options, stop_event)
+                   for name, video_path in todo}
+        for name, future in futures.items():
+            states[name] = future.result()
+
+    summary = write_season_summary(out_dir, [states[name] for name, _ in games])
+    logger.info(f"Season: {summary['games_complete']}/{summary['games_total']} games complete "
+                f"after {time.perf_counter() - started:.1f}s")
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze a season of basketball game videos.")
+    parser.add_argument("source", help="Directory of videos, or a manifest (.txt with one path per line, or .json)")
+    parser.add_argument("--out", default="season_output", help="Directory for per-game outputs and the roll-up")
+    parser.add_argument("--games-in-flight", type=int, default=2,
+                        help="Games decoded and analyzed at the same time")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent frame analyses across all games")
+    parser.add_argument("--rpm", type=int, default=None, help="API requests-per-minute budget across all games")
+    parser.add_argument("--tpm", type=int, default=None, help="API tokens-per-minute budget across all games")
+    parser.add_argument("--step", type=int, default=30, help="Frame sampling interval")
+    parser.add_argument("--fpm", type=float, default=None,
+                        help="Use motion-adaptive sampling with this many frames per minute instead of --step")
+    parser.add_argument("--batch-size", type=int, default=1, help="Frames sent per API request")
+    parser.add_argument("--dedup", type=int, default=None, metavar="BITS",
+                        help="Skip frames within this Hamming distance of a recently analyzed frame")
+    parser.add_argument("--prefilter", type=float, default=None, metavar="SCORE",
+                        help="Only analyze frames the local CV prefilter scores at or above this")
+    parser.add_argument("--hoop", default=None, metavar="X,Y,W,H[;...]",
+                        help="Hoop regions for the prefilter, as fractions of the frame size")
+    parser.add_argument("--prefilter-model", default=None, help="Optional ONNX event classifier")
+    parser.add_argument("--max-dim", default=None, metavar="PIXELS|auto",
+                        help="Downscale frames to this longest side before sending")
+    parser.add_argument("--jpeg-quality", type=int, default=None, help="JPEG quality of sent frames")
+    parser.add_argument("--detail", choices=["low", "high", "auto"], default=None,
+                        help="Image detail mode requested from the API")
+    parser.add_argument("--crop", default=None, metavar="X,Y,W,H[;...]",
+                        help="Only send the part of each frame covering these regions")
+    parser.add_argument("--max-retries", type=int, default=4,
+                        help="Retries with jittered backoff for rate-limited, timed-out or failed API calls")
+    parser.add_argument("--hedge", type=float, default=None, metavar="QUANTILE",
+                        help="Send a duplicate request when a call outlasts this latency quantile")
+    parser.add_argument("--cache", default="response_cache.sqlite3",
+                        help="Response cache database ('' to disable)")
+    parser.add_argument("--redo", action="store_true", help="Analyze games again even if already complete")
+    parser.add_argument("--log-level", default="INFO", help="Log level (e.g. DEBUG, INFO, WARNING)")
+    parser.add_argument("--log-file", default="season_batch.log", help="Log file ('' to disable)")
+    args = parser.parse_args()
+
+    configure_logging(args.log_level.upper(), args.log_file or None)
+    games = load_games(args.source)
+    if not games:
+        parser.error(f"No videos found in {args.source}")
+
+    workers = max(1, args.workers)
+    basketball_analysis.configure_backend(max_retries=args.max_retries, hedge_quantile=args.hedge,
+                                          max_connections=max(8, 2 * workers))
+    payload = None
+    if args.max_dim or args.jpeg_quality or args.detail or args.crop:
+        payload = PayloadOptions(parse_max_dimension(args.max_dim), args.jpeg_quality, args.detail,
+                                 parse_regions(args.crop))
+    rate_limiter = None
+    if args.rpm or args.tpm:
+        rate_limiter = basketball_analysis.RateLimiter(args.rpm, args.tpm)
+
+    stop = threading.Event()
+    def request_stop(signum, frame):
+        # Games stop sampling, finish the frames in flight and are resumed by the next run
+        logger.warning("Stopping after the frames in flight; run again to resume")
+        stop.set()
+    signal.signal(signal.SIGINT, request_stop)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="frame") as executor:
+        options = {
+            "step": args.step,
+            "frames_per_minute": args.fpm,
+            "max_workers": workers,
+            "batch_size": args.batch_size,
+            "dedup_threshold": args.dedup,
+            "prefilter_threshold": args.prefilter,
+            "hoop_regions": parse_regions(args.hoop),
+            "prefilter_model": args.prefilter_model,
+            "payload": payload,
+            "cache": ResponseCache(args.cache) if args.cache else None,
+            "rate_limiter": rate_limiter,
+            "executor": executor,
+        }
+        summary = run_season(games, args.out, options, args.games_in_flight, args.redo, stop)
+
+    totals = summary["totals"]
+    print(f"\nSeason: {summary['games_complete']} of {summary['games_total']} games complete")
+    print(f"   Points by jersey: {json.dumps(totals['points'])}")
+    print(f"   Passes: {totals['passes']}")
+    print(f"   Rebounds by jersey: {json.dumps(totals['rebounds'])}")
+    print(f"   Roll-up: {os.path.join(args.out, SEASON_SUMMARY_JSON)}")
+
+if __name__ == "__main__":
+    main()
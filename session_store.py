@@ -0,0 +1,289 @@
+"""
+Lifecycle of the per-session directories under the upload folder.
+
+A SessionReaper thread periodically deletes sessions nobody has touched for longer than their
+TTL, then, while the sessions together exceed a disk quota, the least recently accessed ones.
+A session's last access is the newest modification time among its top-level entries: the
+status file (saved as frames are analyzed), the growing upload, and an access marker that
+touch_session() refreshes whenever a client polls or downloads it. All of it lives on disk, so
+any worker process (or the gunicorn master, with --preload) can reap for all of them; a lock
+file keeps two sweeps from running at once. Work that outlives a job's status, like rendering
+its video, holds a session lock (lock_session()) that keeps every process's reaper away.
+Clients sharing a session (a re-upload joining a running analysis) are counted with
+add_client()/release_client(), so one leaving doesn't delete it from under the others.
+
+stream_zip() bundles a session's outputs as a zip written straight to the response.
+"""
+import fcntl
+import logging
+import os
+import shutil
+import threading
+import time
+import zipfile
+
+import metrics
+from jobs import load_status
+
+logger = logging.getLogger(__name__)
+
+ACCESS_MARKER = ".accessed"
+LOCK_FILENAME = ".reaper.lock"
+SESSION_LOCK_FILENAME = ".in_use.lock"
+CLIENTS_FILENAME = ".clients"
+# Statuses of sessions still being uploaded or analyzed; quota eviction leaves them alone
+ACTIVE_STATUSES = ("queued", "running", "uploading")
+# Already-compressed outputs are stored as they are rather than deflated again
+STORED_EXTENSIONS = (".mp4", ".npz", ".jpg", ".zip")
+ZIP_CHUNK_SIZE = 1024 * 1024
+
+def touch_session(session_dir):
+    """Records an access to a session, postponing its expiry."""
+    marker = os.path.join(session_dir, ACCESS_MARKER)
+    try:
+        os.utime(marker)
+    except FileNotFoundError:
+        try:
+            open(marker, "a").close()
+        except OSError:
+            pass  # Session deleted meanwhile
+    except OSError:
+        pass
+
+def last_access(session_dir):
+    """Seconds since the epoch of the latest activity in a session, or None if it is gone."""
+    try:
+        latest = os.stat(session_dir).st_mtime
+        with os.scandir(session_dir) as entries:
+            for entry in entries:
+                try:
+                    latest = max(latest, entry.stat(follow_symlinks=False).st_mtime)
+                except FileNotFoundError:
+                    continue
+        return latest
+    except FileNotFoundError:
+        return None
+
+def tree_size(path):
+    """
+    Bytes used by the files under path. A file hard-linked elsewhere (outputs linked from the
+    result cache) counts in proportion, since deleting this copy frees little of it.
+    """
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                stat = os.lstat(os.path.join(dirpath, name))
+            except FileNotFoundError:
+                continue
+            total += stat.st_size // max(1, stat.st_nlink)
+    return total
+
+def lock_session(session_dir):
+    """
+    Marks a session as in use until the returned file is closed, or the process holding it dies.
+    Several holders may share a session.
+    """
+    lock_file = open(os.path.join(session_dir, SESSION_LOCK_FILENAME), "a")
+    # flock rather than lockf: its locks belong to the open file, so the reaper of the same
+    # process sees them too, and closing the reaper's own handle doesn't release them
+    fcntl.flock(lock_file, fcntl.LOCK_SH)
+    return lock_file
+
+def session_locked(session_dir):
+    """Whether some process holds lock_session() on a session."""
+    try:
+        lock_file = open(os.path.join(session_dir, SESSION_LOCK_FILENAME), "r")
+    except FileNotFoundError:
+        return False
+    with lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return True
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return False
+
+def _update_clients(session_dir, change):
+    # Read-modify-write under an exclusive lock on the counter itself. No file means the one
+    # client that created the session.
+    with open(os.path.join(session_dir, CLIENTS_FILENAME), "a+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        f.seek(0)
+        count = int(f.read() or 1) + change
+        f.seek(0)
+        f.truncate()
+        f.write(str(count))
+        return count
+
+def add_client(session_dir):
+    """Records another client sharing a session. Returns how many share it now."""
+    return _update_clients(session_dir, 1)
+
+def release_client(session_dir):
+    """Records that a client is done with a session. Returns how many still use it."""
+    return _update_clients(session_dir, -1)
+
+def _session_status(session_dir):
+    status = load_status(session_dir)
+    return status.get("status") if status else None
+
+def session_busy(session_dir):
+    """Whether any process is analyzing or rendering a session."""
+    return _session_status(session_dir) in ("queued", "running") or session_locked(session_dir)
+
+class SessionReaper:
+    """
+    Deletes expired sessions and keeps the upload folder under a disk quota.
+
+    Args:
+        root (str): Folder holding one directory per session.
+        ttl_seconds (float): Sessions idle for longer are deleted (None = no TTL).
+        max_bytes (int): Quota for all sessions together; least recently accessed sessions are
+            deleted until it is met (None = unbounded).
+        interval (float): Seconds between sweeps of the background thread.
+        is_active (callable): Optional is_active(session_id) -> bool for sessions this process
+            is still working on, which are never deleted, like locked sessions.
+    """
+    def __init__(self, root, ttl_seconds=24 * 3600, max_bytes=None, interval=300, is_active=None):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.is_active = is_active
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="session-reaper", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Session reaper sweep failed: {str(e)}", exc_info=True)
+
+    def _delete(self, session_id, reason):
+        shutil.rmtree(os.path.join(self.root, session_id), ignore_errors=True)
+        metrics.inc("sessions_reaped_total", reason=reason)
+
+    def sweep(self, now=None):
+        """
+        Runs one pass: TTL expiry, then quota eviction. Returns the number of sessions deleted,
+        or None if another process is sweeping right now.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, LOCK_FILENAME), "a") as lock_file:
+            try:
+                # A POSIX record lock, which forked children don't inherit
+                fcntl.lockf(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return None
+            try:
+                return self._sweep(time.time() if now is None else now)
+            finally:
+                fcntl.lockf(lock_file, fcntl.LOCK_UN)
+
+    def _sweep(self, now):
+        sessions = []
+        expired = 0
+        with os.scandir(self.root) as entries:
+            session_ids = [entry.name for entry in entries if entry.is_dir(follow_symlinks=False)]
+        for session_id in session_ids:
+            if self.is_active is not None and self.is_active(session_id):
+                continue
+            session_dir = os.path.join(self.root, session_id)
+            if session_locked(session_dir):
+                continue
+            accessed = last_access(session_dir)
+            if accessed is None:
+                continue
+            if self.ttl_seconds is not None and now - accessed > self.ttl_seconds:
+                self._delete(session_id, "ttl")
+                expired += 1
+            else:
+                sessions.append((accessed, session_id))
+
+        evicted = 0
+        if self.max_bytes is not None:
+            sizes = {session_id: tree_size(os.path.join(self.root, session_id)) for _, session_id in sessions}
+            total = sum(sizes.values())
+            for _, session_id in sorted(sessions):
+                if total <= self.max_bytes:
+                    break
+                if _session_status(os.path.join(self.root, session_id)) in ACTIVE_STATUSES:
+                    continue
+                self._delete(session_id, "quota")
+                total -= sizes[session_id]
+                evicted += 1
+            if total > self.max_bytes:
+                logger.warning(f"Sessions use {total} bytes, over the {self.max_bytes} byte quota, "
+                               f"but the rest are still in progress")
+
+        if expired or evicted:
+            logger.info(f"Session reaper deleted {expired} expired and {evicted} least recently used sessions")
+        return expired + evicted
+
+class _ZipSink:
+    """Write-only stream collecting zipfile's output until the generator hands it on."""
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        # No seek(): zipfile then writes sizes after each member instead of seeking back
+        return self._position
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def stream_zip(directory, chunk_size=ZIP_CHUNK_SIZE):
+    """
+    Yields a zip archive of the files under directory piece by piece, so it is never held
+    whole in memory or on disk. Files still being written (*.part.*, *.tmp) are left out.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w") as archive:
+        for dirpath, dirnames, filenames in os.walk(directory):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if ".part." in name or name.endswith(".tmp"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    source = open(path, "rb")
+                except FileNotFoundError:
+                    continue
+                with source:
+                    info = zipfile.ZipInfo.from_file(path, os.path.relpath(path, directory))
+                    info.compress_type = zipfile.ZIP_STORED if name.endswith(STORED_EXTENSIONS) \
+                        else zipfile.ZIP_DEFLATED
+                    with archive.open(info, "w", force_zip64=True) as member:
+                        while True:
+                            data = source.read(chunk_size)
+                            if not data:
+                                break
+                            member.write(data)
+                            piece = sink.take()
+                            if piece:
+                                yield piece
+    # The remaining member trailers and the central directory
+    yield sink.take()
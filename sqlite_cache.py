@@ -0,0 +1,145 @@
+"""
+Shared plumbing of the caches indexed by an SQLite table (response_cache, result_cache): the
+connection and its reconnection in forked children, hit/miss counters, and size-bounded
+eviction of the least recently accessed entries.
+
+The table has one row per entry with its key, size in bytes and creation and access times.
+The total size is kept as a running count, recounted every RECOUNT_INTERVAL puts since other
+processes write to the same file, and entries are only evicted once it is over budget, down
+to EVICT_LOW_WATER of it, in LIMIT'd batches.
+"""
+import logging
+import math
+import os
+import sqlite3
+import threading
+import weakref
+
+logger = logging.getLogger(__name__)
+
+# Eviction frees space down to this fraction of max_bytes, so it doesn't run again on the next put
+EVICT_LOW_WATER = 0.9
+# Most least recently accessed entries evicted per query
+EVICT_BATCH = 256
+# Puts between recounts of the stored size and sweeps for expired entries
+RECOUNT_INTERVAL = 1000
+
+# Open caches, reconnected in forked children (an SQLite connection must not cross a fork)
+_open_caches = weakref.WeakSet()
+# Connections inherited from the parent, kept referenced so the child never closes them
+_inherited_connections = []
+
+class SQLiteCache:
+    """
+    Base of the SQLite-indexed caches.
+
+    Subclasses name their `table`, add any `extra_columns` (SQL column definitions placed after
+    the key) and override _expire() and _evict_entries() for entries that expire or keep data
+    outside the table. Methods starting with an underscore expect self._lock to be held.
+
+    Args:
+        db_path (str): SQLite database file.
+        max_bytes (int): Size budget of all entries; least recently accessed entries are
+            evicted first once it is exceeded (None = unbounded).
+    """
+    table = None
+    extra_columns = ""
+    entry_name = "entries"
+
+    def __init__(self, db_path, max_bytes=None):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                key TEXT PRIMARY KEY,
+                {self.extra_columns}
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_accessed ON {self.table} (accessed_at)")
+        self._conn.commit()
+        self._size = self._count_size()
+        self._puts = 0
+
+    def _connect(self):
+        _open_caches.add(self)
+        return sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+
+    def _reconnect_after_fork(self):
+        _inherited_connections.append(self._conn)
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+
+    def _count_size(self):
+        return self._conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+
+    def _touch(self, key, now):
+        self._conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+
+    def _added(self, size, now, keep=None):
+        """Accounts for an entry just stored, evicting others if that put the cache over budget."""
+        self._size += size
+        self._puts += 1
+        if self._puts % RECOUNT_INTERVAL == 0 or (self.max_bytes is not None and self._size > self.max_bytes):
+            self._evict(now, keep)
+
+    def _expire(self, now):
+        """Deletes expired entries; nothing expires by default."""
+
+    def _evict_entries(self, keys):
+        """
+        Removes what the entries keep outside the table before their rows are deleted. Returns
+        the keys that could be removed; by default all of them.
+        """
+        return keys
+
+    def _evict(self, now, keep=None):
+        self._expire(now)
+        self._size = self._count_size()
+        if self.max_bytes is None or self._size <= self.max_bytes:
+            return
+        target = self.max_bytes * EVICT_LOW_WATER
+        entries = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        average = max(1, self._size / max(1, entries))
+        evicted = 0
+        skipped = 0
+        while self._size > target:
+            # About as many entries as the excess needs, judging by the average entry size
+            limit = min(EVICT_BATCH, max(1, math.ceil((self._size - target) / average)))
+            rows = self._conn.execute(
+                f"SELECT key, size FROM {self.table} WHERE key IS NOT ? ORDER BY accessed_at ASC LIMIT ? OFFSET ?",
+                (keep, limit, skipped),
+            ).fetchall()
+            if not rows:
+                break
+            sizes = dict(rows)
+            removed = self._evict_entries(list(sizes))
+            self._conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", [(key,) for key in removed])
+            self._size -= sum(sizes[key] for key in removed)
+            evicted += len(removed)
+            skipped += len(rows) - len(removed)
+        logger.debug(f"Evicted {evicted} cached {self.entry_name} to stay under {self.max_bytes} bytes")
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}"
+            ).fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def _reconnect_after_fork():
+    for cache in list(_open_caches):
+        cache._reconnect_after_fork()
+
+os.register_at_fork(after_in_child=_reconnect_after_fork)
@@ -0,0 +1,31 @@
+import json
+import os
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analyzer_backends import AnalyzerBackend, Completion
+
+class ScriptedBackend(AnalyzerBackend):
+    """Answers each request with reply(request_index), counting the requests it gets."""
+    name = "scripted"
+
+    def __init__(self, reply=None):
+        self.reply = reply or (lambda index: json.dumps({"points": {"23": 2}, "passes": 1, "rebounds": {}}))
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def complete(self, messages, model, max_tokens=500):
+        with self._lock:
+            index = self.calls
+            self.calls += 1
+        return Completion(self.reply(index), 0, 0)
+
+@pytest.fixture
+def frames():
+    """Ten decoded frames named like extract_frames names them, each a different shade."""
+    return [(f"frame_{i:04d}.jpg", np.full((48, 64, 3), i * 25, dtype=np.uint8)) for i in range(10)]
@@ -0,0 +1,41 @@
+import numpy as np
+
+from frame_dedup import DuplicateFrame, FrameDeduplicator, dedupe_sources, dhash, hamming_distance
+from frame_prefilter import FilteredFrame
+
+def court(shift=0):
+    """A gradient frame with a bright block that moves right by `shift` pixels."""
+    image = np.tile(np.linspace(0, 200, 128, dtype=np.uint8), (96, 1))
+    image[30:60, 20 + shift:50 + shift] = 255
+    return np.dstack([image] * 3)
+
+def test_hash_distance_grows_with_change():
+    base = dhash(court()[:, :, 0], 16)
+    assert hamming_distance(base, dhash(court()[:, :, 0], 16)) == 0
+    assert hamming_distance(base, dhash(court(40)[:, :, 0], 16)) > 3
+
+def test_near_duplicates_point_at_the_analyzed_frame():
+    deduplicator = FrameDeduplicator(threshold=3)
+    sources = [("frame_0000.jpg", court()), ("frame_0001.jpg", court()), ("frame_0002.jpg", court(40)),
+               ("frame_0003.jpg", court())]
+    result = list(dedupe_sources(iter(sources), deduplicator))
+    assert isinstance(result[0][1], np.ndarray)
+    assert result[1][1] == DuplicateFrame("frame_0000.jpg")
+    assert isinstance(result[2][1], np.ndarray)
+    # Still within the window of recent frames
+    assert result[3][1] == DuplicateFrame("frame_0000.jpg")
+    assert (deduplicator.checked, deduplicator.skipped) == (4, 2)
+
+def test_only_the_most_recent_frames_are_compared():
+    deduplicator = FrameDeduplicator(threshold=3, window=1)
+    assert deduplicator.check("frame_0000.jpg", court()) is None
+    assert deduplicator.check("frame_0001.jpg", court(40)) is None
+    assert deduplicator.check("frame_0002.jpg", court()) is None
+
+def test_prefiltered_frames_pass_through_unremembered():
+    deduplicator = FrameDeduplicator(threshold=3)
+    sources = [("frame_0000.jpg", FilteredFrame(0.1)), ("frame_0001.jpg", court())]
+    result = list(dedupe_sources(iter(sources), deduplicator))
+    assert result[0][1] == FilteredFrame(0.1)
+    assert isinstance(result[1][1], np.ndarray)
+    assert deduplicator.checked == 1
@@ -0,0 +1,81 @@
+import json
+
+import cv2
+import numpy as np
+
+from eval_prefilter import score_run
+from frame_prefilter import FilteredFrame, FramePrefilter, parse_regions, prefilter_sources
+
+def gray(value, size=(120, 160)):
+    return np.full(size + (3,), value, dtype=np.uint8)
+
+def test_first_frame_passes_and_static_frames_are_filtered():
+    prefilter = FramePrefilter(threshold=0.2)
+    sources = [("frame_0000.jpg", gray(100)), ("frame_0001.jpg", gray(100)), ("frame_0002.jpg", gray(140))]
+    result = list(prefilter_sources(iter(sources), prefilter))
+    assert result[0][1] is sources[0][1]
+    assert result[1][1] == FilteredFrame(0.0)
+    assert result[2][1] is sources[2][1]
+    assert (prefilter.checked, prefilter.filtered) == (3, 1)
+
+def test_reset_forgets_the_previous_frame():
+    prefilter = FramePrefilter()
+    prefilter.score_components(gray(100))
+    prefilter.reset()
+    assert prefilter.score_components(gray(100))["score"] == 1.0
+    assert prefilter.checked == 0
+
+def test_motion_in_hoop_regions_counts_most():
+    still = gray(100)
+    moving = still.copy()
+    moving[:60, :80] = 200  # Top-left quarter changes
+    scores = {}
+    for name, regions in {"hoop": [(0, 0, 0.5, 0.5)], "elsewhere": [(0.5, 0.5, 0.5, 0.5)]}.items():
+        prefilter = FramePrefilter(hoop_regions=regions)
+        prefilter.score_components(still)
+        scores[name] = prefilter.score_components(moving)
+    assert scores["hoop"]["hoop_motion"] == 1.0
+    assert scores["elsewhere"]["hoop_motion"] == 0.0
+    assert scores["hoop"]["score"] > scores["elsewhere"]["score"]
+
+def test_orange_ball_pixels_raise_the_score():
+    prefilter = FramePrefilter()
+    prefilter.score_components(gray(100))
+    frame = gray(100)
+    frame[50:60, 70:80] = (0, 128, 255)  # Orange, in BGR
+    components = prefilter.score_components(frame)
+    assert components["ball"] == 1.0
+    assert components["score"] >= 0.5
+
+def test_parse_regions():
+    assert parse_regions("0.1,0.2,0.3,0.4; 0.5,0.5,0.2,0.2") == [(0.1, 0.2, 0.3, 0.4), (0.5, 0.5, 0.2, 0.2)]
+    assert parse_regions("") == []
+
+def test_eval_scores_frames_with_the_motion_state_of_the_run(tmp_path):
+    frames_dir = tmp_path / "frames"
+    frames_dir.mkdir()
+    # Little enough motion between frames that skipping one changes the next score
+    frames = [(f"frame_{i:04d}.jpg", np.full((48, 64, 3), 100 + 3 * i, dtype=np.uint8)) for i in range(10)]
+    for name, image in frames:
+        cv2.imwrite(str(frames_dir / name), image)
+    names = [name for name, _ in frames]
+
+    # What the run's prefilter saw: every frame, in capture order
+    runtime = FramePrefilter()
+    scores = {name: runtime.score_components(str(frames_dir / name))["score"] for name in names}
+    summary = []
+    for i, name in enumerate(names):
+        if name == "frame_0003.jpg":
+            continue  # Failed
+        frame_data = {"frame": name, "points": {"23": 2} if i % 2 else {}, "passes": 0, "rebounds": {}}
+        if name == "frame_0005.jpg":
+            frame_data["duplicate_of"] = "frame_0004.jpg"
+        elif name == "frame_0007.jpg":
+            frame_data["prefilter_score"] = round(scores[name], 4)
+        summary.append(frame_data)
+    summary_path = tmp_path / "summary.json"
+    summary_path.write_text(json.dumps(summary))
+
+    analyzed = [name for name in names if name not in ("frame_0003.jpg", "frame_0005.jpg", "frame_0007.jpg")]
+    assert score_run(str(summary_path), str(frames_dir), FramePrefilter()) == \
+        [(scores[name], names.index(name) % 2 == 1) for name in analyzed]
@@ -0,0 +1,142 @@
+import json
+
+import pytest
+
+import basketball_analysis
+from basketball_analysis import CHECKPOINT_FILENAME, _analyze_sources, iter_checkpoint, parse_batch_result
+from conftest import ScriptedBackend
+from frame_prefilter import FramePrefilter
+
+GOOD = {"points": {"23": 2}, "passes": 1, "rebounds": {"11": 1}}
+
+def analyze(frames, output_dir, backend, max_workers=2, **kwargs):
+    return _analyze_sources(iter(frames), str(output_dir), max_workers, requests_per_minute=None,
+                            tokens_per_minute=None, cache=None, backend=backend, **kwargs)
+
+def test_parse_batch_result_accepts_fenced_arrays_and_frames_objects():
+    fenced = "```json\n" + json.dumps([GOOD, {"points": {}, "passes": 0, "rebounds": {}}]) + "\n```"
+    assert parse_batch_result(fenced, 2)[0] == GOOD
+    assert parse_batch_result(json.dumps({"frames": [GOOD]}), 1) == [GOOD]
+    assert parse_batch_result(json.dumps(GOOD), 1) == [GOOD]
+
+@pytest.mark.parametrize("reply", [json.dumps([GOOD]), json.dumps({"frames": [GOOD]}), "not json"])
+def test_parse_batch_result_rejects_wrong_counts(reply):
+    with pytest.raises(ValueError):
+        parse_batch_result(reply, 2)
+
+def test_normalize_fills_in_missing_and_null_fields():
+    assert basketball_analysis.normalize_frame_data({"points": None, "rebounds": {"4": 1}}) == \
+        {"points": {}, "passes": 0, "rebounds": {"4": 1}}
+
+@pytest.mark.parametrize("frame_data", [
+    [GOOD], {"points": [23, 2]}, {"points": {"23": "two"}}, {"passes": "1"}, {"rebounds": {"11": True}},
+])
+def test_normalize_rejects_unusable_results(frame_data):
+    with pytest.raises(ValueError):
+        basketball_analysis.normalize_frame_data(frame_data)
+
+def test_wrongly_shaped_reply_fails_only_its_frame(frames, tmp_path):
+    replies = {3: json.dumps({"points": {"5": 3}, "passes": None, "rebounds": None}),
+               4: json.dumps({"points": "lots", "passes": 1, "rebounds": {}})}
+    backend = ScriptedBackend(lambda index: replies.get(index, json.dumps(GOOD)))
+    reported = []
+    # One worker sends the frames in order, so the request index is the frame index
+    points, passes, rebounds = analyze(frames[:6], tmp_path, backend, max_workers=1,
+                                       on_frame=lambda frame_data, totals: reported.append(frame_data))
+
+    assert reported[4] is None
+    assert dict(points) == {"23": 8, "5": 3}
+    assert passes == 4
+    assert dict(rebounds) == {"11": 4}
+    recorded = [record["frame"] for record in iter_checkpoint(tmp_path / CHECKPOINT_FILENAME)]
+    assert recorded == [name for name, _ in frames[:6] if name != "frame_0004.jpg"]
+
+def test_batch_with_a_wrongly_shaped_frame_falls_back_to_single_frames(frames, tmp_path):
+    def reply(index):
+        if index == 0:
+            return json.dumps([GOOD, {"points": None, "passes": 0, "rebounds": {"1": "x"}}])
+        return json.dumps(GOOD)
+    points, passes, _ = analyze(frames[:2], tmp_path, ScriptedBackend(reply), max_workers=1, batch_size=2)
+    assert dict(points) == {"23": 4}
+    assert passes == 2
+
+def test_resume_skips_bad_checkpoint_records_and_reanalyzes_their_frames(frames, tmp_path):
+    analyze(frames[:4], tmp_path, ScriptedBackend())
+    # A record of an unusable reply, as written before replies were validated
+    with open(tmp_path / CHECKPOINT_FILENAME) as f:
+        records = [json.loads(line) for line in f]
+    records[2]["points"] = None
+    records[3]["rebounds"] = "none"
+    with open(tmp_path / CHECKPOINT_FILENAME, "w") as f:
+        f.writelines(json.dumps(record) + "\n" for record in records)
+
+    backend = ScriptedBackend()
+    points, passes, _ = analyze(frames[:4], tmp_path, backend, resume=True)
+    assert backend.calls == 1  # frame_0003.jpg; frame_0002.jpg's record only had null points
+    assert dict(points) == {"23": 6}
+    assert passes == 4
+    assert len(json.loads((tmp_path / "summary.json").read_text())) == 4
+
+def test_checkpoint_records_come_back_in_frame_number_order(tmp_path):
+    path = tmp_path / CHECKPOINT_FILENAME
+    names = ["frame_9999.jpg", "frame_10000.jpg", "frame_0002.jpg", "frame_10001.jpg"]
+    path.write_text("".join(json.dumps(dict(GOOD, frame=name)) + "\n" for name in names))
+    assert [record["frame"] for record in iter_checkpoint(path)] == \
+        ["frame_0002.jpg", "frame_9999.jpg", "frame_10000.jpg", "frame_10001.jpg"]
+
+def test_failed_frames_release_their_capture_times(frames, tmp_path):
+    backend = ScriptedBackend(lambda index: "not json" if index % 2 else json.dumps(GOOD))
+    frame_times = {name: i / 2 for i, (name, _) in enumerate(frames)}
+    merged = []
+    analyze(frames, tmp_path, backend, max_workers=1, frame_times=frame_times, on_merged=merged.append)
+    assert frame_times == {}
+    assert merged == [name for name, _ in frames]
+    times = [record["time"] for record in iter_checkpoint(tmp_path / CHECKPOINT_FILENAME)]
+    assert times == [0.0, 1.0, 2.0, 3.0, 4.0]
+
+class ScriptedPrefilter(FramePrefilter):
+    def __init__(self, scores):
+        super().__init__(threshold=0.5)
+        self.scores = iter(scores)
+
+    def score_components(self, source):
+        return {"score": next(self.scores)}
+
+def test_frames_the_prefilter_skips_are_not_remembered_for_deduplication(frames, tmp_path):
+    same = [(name, frames[0][1]) for name, _ in frames[:4]]
+    backend = ScriptedBackend()
+    analyze(same, tmp_path, backend, dedup_threshold=3, prefilter=ScriptedPrefilter([0.1, 0.9, 0.9, 0.9]))
+
+    # frame_0001.jpg looks like frame_0000.jpg, but that one was never sent
+    assert backend.calls == 1
+    records = list(iter_checkpoint(tmp_path / CHECKPOINT_FILENAME))
+    assert "prefilter_score" in records[0]
+    assert "duplicate_of" not in records[1] and "prefilter_score" not in records[1]
+    assert [record.get("duplicate_of") for record in records[2:]] == ["frame_0001.jpg"] * 2
+
+def test_checkpoint_records_every_merged_frame(frames, tmp_path):
+    analyze(frames[:3], tmp_path, ScriptedBackend())
+    with open(tmp_path / CHECKPOINT_FILENAME) as f:
+        records = [json.loads(line) for line in f]
+    assert [record["frame"] for record in records] == [name for name, _ in frames[:3]]
+    assert records[0]["points"] == {"23": 2}
+
+def test_resume_after_a_torn_write_analyzes_only_the_missing_frames(frames, tmp_path):
+    analyze(frames[:3], tmp_path, ScriptedBackend())
+    # Crash in the middle of appending the third record
+    data = (tmp_path / CHECKPOINT_FILENAME).read_bytes()
+    (tmp_path / CHECKPOINT_FILENAME).write_bytes(data[:-10])
+
+    backend = ScriptedBackend()
+    points, passes, _ = analyze(frames[:5], tmp_path, backend, resume=True)
+    assert backend.calls == 3
+    assert dict(points) == {"23": 10}
+    assert passes == 5
+    assert [record["frame"] for record in iter_checkpoint(tmp_path / CHECKPOINT_FILENAME)] == \
+        [name for name, _ in frames[:5]]
+
+def test_the_last_record_of_a_frame_wins(tmp_path):
+    path = tmp_path / CHECKPOINT_FILENAME
+    path.write_text(json.dumps(dict(GOOD, frame="frame_0000.jpg")) + "\n"
+                    + json.dumps(dict(GOOD, frame="frame_0000.jpg", passes=7)) + "\n")
+    assert [record["passes"] for record in iter_checkpoint(path)] == [7]
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from payload_optimizer import PayloadOptions, _model_scale, image_tokens
+
+# Examples from OpenAI's vision pricing documentation
+@pytest.mark.parametrize("width,height,detail,tokens", [
+    (1024, 1024, "high", 765),
+    (2048, 4096, "high", 1105),
+    (4096, 8192, "low", 85),
+])
+def test_image_tokens_match_documented_examples(width, height, detail, tokens):
+    assert image_tokens(width, height, detail) == tokens
+
+@pytest.mark.parametrize("width,height,expected", [
+    (3840, 2160, (1365, 768)),
+    (4096, 2160, (1456, 768)),
+    (1920, 1080, (1365, 768)),
+    (2048, 4096, (768, 1536)),
+    (640, 360, (640, 360)),
+])
+def test_high_detail_scale_fits_the_short_side_once(width, height, expected):
+    scale = _model_scale(width, height, "high")
+    assert (round(width * scale), round(height * scale)) == expected
+
+def test_low_detail_scale_fits_the_long_side():
+    assert _model_scale(1920, 1080, "low") == pytest.approx(512 / 1920)
+    assert _model_scale(320, 240, "low") == 1.0
+
+def test_auto_max_dimension_encodes_at_the_size_the_api_sees():
+    frame = np.zeros((2160, 3840, 3), dtype=np.uint8)
+    encoded = PayloadOptions(max_dimension="auto", detail="high").encode(frame)
+    assert (encoded.width, encoded.height) == (1365, 768)
+    assert image_tokens(encoded.width, encoded.height, "high") == image_tokens(3840, 2160, "high")
+
+def test_crop_regions_crop_before_scaling():
+    frame = np.zeros((1000, 2000, 3), dtype=np.uint8)
+    encoded = PayloadOptions(max_dimension=500, crop_regions=[(0.5, 0.0, 0.5, 1.0)]).encode(frame)
+    assert (encoded.width, encoded.height) == (500, 500)
@@ -0,0 +1,57 @@
+import basketball_analysis
+from basketball_analysis import RateLimiter
+
+class FakeClock:
+    """Stands in for the time module: sleeping just moves the clock on."""
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+def fake_clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(basketball_analysis, "time", clock)
+    return clock
+
+def test_requests_wait_for_the_oldest_to_leave_the_window(monkeypatch):
+    clock = fake_clock(monkeypatch)
+    limiter = RateLimiter(requests_per_minute=2)
+    limiter.acquire()
+    clock.now += 10
+    limiter.acquire()
+    assert clock.sleeps == []
+
+    limiter.acquire()
+    assert clock.sleeps == [50.0]
+    limiter.acquire()
+    assert clock.sleeps == [50.0, 10.0]
+
+def test_tokens_are_budgeted_per_window(monkeypatch):
+    clock = fake_clock(monkeypatch)
+    limiter = RateLimiter(tokens_per_minute=1000)
+    limiter.acquire(600)
+    limiter.acquire(400)
+    assert clock.sleeps == []
+    limiter.acquire(1)
+    assert clock.now == 1060.0
+
+def test_a_request_over_the_whole_token_budget_still_goes_through_alone(monkeypatch):
+    clock = fake_clock(monkeypatch)
+    limiter = RateLimiter(tokens_per_minute=100)
+    limiter.acquire(500)
+    assert clock.sleeps == []
+    limiter.acquire(500)
+    assert clock.now == 1060.0
+
+def test_unlimited_never_waits(monkeypatch):
+    clock = fake_clock(monkeypatch)
+    limiter = RateLimiter()
+    for _ in range(1000):
+        limiter.acquire(10 ** 6)
+    assert clock.sleeps == []
@@ -0,0 +1,55 @@
+import json
+import time
+
+import basketball_analysis
+from conftest import ScriptedBackend
+from response_cache import ResponseCache
+
+def test_get_returns_what_was_put(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"))
+    key = cache.make_key("aW1hZ2U=", "prompt", "model")
+    assert cache.get(key) is None
+    cache.put(key, "answer")
+    assert cache.get(key) == "answer"
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1, "bytes": 6}
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), ttl_seconds=60)
+    cache.put("key", "answer")
+    cache._conn.execute("UPDATE responses SET created_at = ?", (time.time() - 120,))
+    assert cache.get("key") is None
+
+def test_least_recently_accessed_entries_are_evicted_first(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), max_bytes=1000)
+    for i in range(10):
+        cache.put(f"key{i}", "x" * 100)
+        time.sleep(0.001)
+    cache.get("key0")
+    cache.put("key10", "x" * 100)
+    stats = cache.stats()
+    assert stats["bytes"] <= 1000
+    assert cache.get("key0") is not None
+    assert cache.get("key1") is None
+    assert cache.get("key10") is not None
+
+def test_eviction_is_amortized(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), max_bytes=10_000)
+    calls = []
+    evict = cache._evict
+    cache._evict = lambda *args: calls.append(args) or evict(*args)
+    for i in range(500):
+        cache.put(f"key{i}", "x" * 100)
+    assert cache.stats()["bytes"] <= 10_000
+    # Each eviction frees 10% of the budget, so about one per 10 puts once full
+    assert len(calls) < 60
+
+def test_unusable_replies_are_not_cached(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"))
+    replies = ["I can't help with that.", json.dumps({"points": None, "passes": "two"}),
+               json.dumps({"points": {"23": 2}, "passes": 1, "rebounds": {}})]
+    backend = ScriptedBackend(lambda index: replies[min(index, 2)])
+    for expected in replies:
+        assert basketball_analysis.analyze_image("aW1hZ2U=", cache=cache, backend=backend) == expected
+    assert backend.calls == 3
+    assert basketball_analysis.analyze_image("aW1hZ2U=", cache=cache, backend=backend) == replies[2]
+    assert backend.calls == 3
@@ -0,0 +1,49 @@
+import fcntl
+import os
+
+from result_cache import ResultCache
+
+def make_output(path, content=b"x" * 1000):
+    os.makedirs(path / "output", exist_ok=True)
+    (path / "output" / "summary.json").write_bytes(content)
+    return str(path / "output")
+
+def test_get_links_the_cached_outputs(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=None)
+    cache.put("a", make_output(tmp_path / "session"), {"total_passes": 3})
+
+    output_dir = tmp_path / "other" / "output"
+    assert cache.get("a", str(output_dir)) == {"total_passes": 3}
+    assert (output_dir / "summary.json").read_bytes() == b"x" * 1000
+    assert cache.get("b", str(tmp_path / "missing")) is None
+    assert not (tmp_path / "missing").exists()
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+def test_put_replaces_an_entry(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=None)
+    cache.put("a", make_output(tmp_path / "first"), {"run": 1})
+    cache.put("a", make_output(tmp_path / "second", b"y"), {"run": 2})
+    output_dir = tmp_path / "linked"
+    assert cache.get("a", str(output_dir)) == {"run": 2}
+    assert (output_dir / "summary.json").read_bytes() == b"y"
+    assert [name for name in os.listdir(tmp_path / "cache") if name.endswith(".tmp")] == []
+
+def test_eviction_skips_entries_being_read(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=2500)
+    output_dir = make_output(tmp_path / "session")
+    cache.put("a", output_dir, {})
+    cache.put("b", output_dir, {})
+
+    # Another process linking entry a right now
+    with cache._lock_entry("a", fcntl.LOCK_SH):
+        cache.put("c", output_dir, {})
+    assert cache.get("a") == {}
+    assert cache.get("b") is None
+    assert cache.get("c") == {}
+    assert not os.path.exists(tmp_path / "cache" / "b")
+    assert not os.path.exists(tmp_path / "cache" / "b.lock")
+
+    cache.put("d", output_dir, {})
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 2
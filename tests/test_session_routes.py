@@ -0,0 +1,25 @@
+import importlib.util
+import json
+import os
+
+import pytest
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for key, value in {"RESULT_CACHE_DIR": "", "RESPONSE_CACHE_PATH": "", "RENDER_MODE": "none",
+                       "SESSION_REAP_INTERVAL": "0", "WARM_IMPORTS": "lazy", "ANALYSIS_LOG_FILE": ""}.items():
+        monkeypatch.setenv(key, value)
+    spec = importlib.util.spec_from_file_location("app_routes", os.path.join(PACKAGE_DIR, "app.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.app.test_client()
+
+@pytest.mark.parametrize("route", ["status", "stream"])
+def test_session_routes_stay_inside_the_upload_folder(client, tmp_path, route):
+    # A status file next to the upload folder, as a session directory would have
+    (tmp_path / "status.json").write_text(json.dumps({"status": "complete", "session_id": ".."}))
+    assert client.get(f"/{route}/..").status_code == 404
+    assert client.get(f"/{route}/unknown").status_code == 404
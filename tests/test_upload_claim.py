@@ -0,0 +1,164 @@
+"""
+Chunked uploads whose PATCHes land on different gunicorn workers must be analyzed once.
+
+Two copies of the app module stand in for two worker processes: each has its own in-memory
+upload and job tables, and they share the upload folder.
+"""
+import importlib.util
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PACKAGE_DIR)
+
+from analyzer_backends import AnalyzerBackend, Completion
+
+class CountingBackend(AnalyzerBackend):
+    name = "counting"
+
+    def __init__(self):
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def complete(self, messages, model, max_tokens=500):
+        with self._lock:
+            self.calls += 1
+        time.sleep(0.01)
+        return Completion(json.dumps({"points": {"23": 2}, "passes": 1, "rebounds": {}}), 0, 0)
+
+def load_app(name):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(PACKAGE_DIR, "app.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+@pytest.fixture
+def workers(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for key, value in {"RESULT_CACHE_DIR": "", "RESPONSE_CACHE_PATH": "", "RENDER_MODE": "none",
+                       "SESSION_REAP_INTERVAL": "0", "WARM_IMPORTS": "lazy", "ANALYSIS_LOG_FILE": "",
+                       "SAMPLE_FRAMES_PER_MINUTE": "120"}.items():
+        monkeypatch.setenv(key, value)
+    apps = [load_app("app_worker_a"), load_app("app_worker_b")]
+    for module in apps:
+        module.pipeline()
+    backend = CountingBackend()
+    apps[0].pipeline().set_backend(backend)
+    return [module.app.test_client() for module in apps], backend
+
+def write_video(path, fourcc, frames=150, fps=30):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*fourcc), fps, (160, 120))
+    for i in range(frames):
+        frame = np.full((120, 160, 3), i % 256, dtype=np.uint8)
+        writer.write(frame)
+    writer.release()
+    return path.read_bytes()
+
+def wait_finished(client, session_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = client.get(f"/status/{session_id}").get_json()
+        if status["status"] in ("complete", "error"):
+            return status
+        time.sleep(0.1)
+    raise AssertionError(f"Session {session_id} did not finish")
+
+# AVI is analyzed while it arrives; this MP4 keeps its index at the end, so only once complete
+@pytest.mark.parametrize("filename,fourcc", [("game.avi", "MJPG"), ("game.mp4", "mp4v")])
+def test_patches_across_workers_start_one_analysis(workers, tmp_path, filename, fourcc):
+    (client_a, client_b), backend = workers
+    data = write_video(tmp_path / filename, fourcc)
+    session_id = client_a.post("/uploads", json={"filename": filename, "size": len(data)}).get_json()["session_id"]
+
+    # The other worker sees the upload first, while too little has arrived to analyze it
+    bounds = [0, 16] + list(range(16 + len(data) // 6, len(data), len(data) // 6)) + [len(data)]
+    for i, (start, end) in enumerate(zip(bounds, bounds[1:])):
+        client = (client_b, client_a)[i % 2]
+        response = client.patch(f"/uploads/{session_id}", data=data[start:end],
+                                headers={"Upload-Offset": str(start)})
+        assert response.status_code == 200
+        assert response.get_json()["offset"] == end
+
+    status = wait_finished(client_b, session_id)
+    assert status["status"] == "complete", status["error"]
+    with open(os.path.join("uploads", session_id, "events.jsonl")) as f:
+        events = [json.loads(line) for line in f]
+    assert [event["frames_done"] for event in events] == list(range(1, len(events) + 1))
+    assert backend.calls == len(events) == status["frames_done"]
+
+class HeldStream(io.BytesIO):
+    """Request body that is only handed over once released is set."""
+    def __init__(self, data):
+        super().__init__(data)
+        self.reading = threading.Event()
+        self.released = threading.Event()
+
+    def _hold(self):
+        self.reading.set()
+        self.released.wait(10)
+
+    def read(self, size=-1):
+        self._hold()
+        return super().read(size)
+
+    def readinto(self, buffer):
+        self._hold()
+        return super().readinto(buffer)
+
+def test_patches_for_the_same_offset_on_two_workers_append_once(workers, tmp_path):
+    (client_a, client_b), _ = workers
+    data = write_video(tmp_path / "game.mp4", "mp4v")
+    session_id = client_a.post("/uploads", json={"filename": "game.mp4", "size": len(data)}).get_json()["session_id"]
+    half = len(data) // 2
+
+    held = HeldStream(data[:half])
+    responses = {}
+    def patch(name, client, **kwargs):
+        responses[name] = client.patch(f"/uploads/{session_id}", headers={"Upload-Offset": "0"}, **kwargs)
+    first = threading.Thread(target=patch, args=("a", client_a),
+                             kwargs={"input_stream": held, "content_length": half})
+    first.start()
+    assert held.reading.wait(10)
+    # A retry of the same chunk on the other worker, while the first is still writing
+    second = threading.Thread(target=patch, args=("b", client_b), kwargs={"data": data[:half]})
+    second.start()
+    time.sleep(0.3)
+    held.released.set()
+    first.join(10)
+    second.join(10)
+
+    assert sorted(response.status_code for response in responses.values()) == [200, 409]
+    assert responses["b"].get_json()["offset"] == half
+    path = os.path.join("uploads", session_id, "game.mp4")
+    assert open(path, "rb").read() == data[:half]
+
+def test_upload_of_a_video_being_analyzed_joins_that_analysis(workers, tmp_path):
+    (client, _), backend = workers
+    data = write_video(tmp_path / "game.mp4", "mp4v")
+    released = threading.Event()
+    complete = backend.complete
+    backend.complete = lambda *args, **kwargs: released.wait(10) and complete(*args, **kwargs)
+
+    session_ids = []
+    for _ in range(2):
+        session_id = client.post("/uploads", json={"filename": "game.mp4", "size": len(data)}).get_json()["session_id"]
+        response = client.patch(f"/uploads/{session_id}", data=data, headers={"Upload-Offset": "0"})
+        session_ids.append(session_id)
+    released.set()
+
+    assert response.status_code == 202
+    body = response.get_json()
+    assert body["session_id"] == session_ids[0]
+    assert (body["offset"], body["complete"]) == (len(data), True)
+    assert not os.path.exists(os.path.join("uploads", session_ids[1]))
+    status = wait_finished(client, session_ids[0])
+    assert status["status"] == "complete", status["error"]
+    assert backend.calls == status["frames_done"]
@@ -0,0 +1,239 @@
+"""
+Chunked, resumable uploads that can be analyzed while they are still arriving.
+
+An upload is a file growing in its session directory plus upload.json describing it; the file
+size is the upload offset and a marker file records completion, so the state survives restarts
+and is visible to every worker process. Chunks may land on any worker, so the one that starts
+the analysis claims it with a file only one of them can create. Containers whose headers come first (AVI, and MP4/MOV
+with the moov box before the media data, including fragmented MP4) can be decoded front to back
+from a FIFO fed by tail_file() as chunks land.
+"""
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_STATE_FILENAME = "upload.json"
+COMPLETE_SUFFIX = ".complete"
+CLAIM_FILENAME = "analysis.claim"
+CHUNK_SIZE = 1024 * 1024
+
+# ISO base media (MP4/MOV) top-level boxes that may precede moov/mdat
+_LEADING_BOXES = {b"ftyp", b"styp", b"free", b"skip", b"wide", b"pdin", b"uuid", b"sidx"}
+
+class UploadError(ValueError):
+    """A chunk that doesn't fit the upload (wrong offset, too large, already complete)."""
+
+class ChunkedUpload:
+    """
+    One resumable upload into session_dir.
+
+    Args:
+        session_dir (str): Directory of the upload's session.
+        filename (str): Name of the video file in session_dir.
+        total_size (int): Expected size in bytes; the upload completes when it is reached.
+            None if unknown, in which case the client marks the last chunk.
+        sha256 (str): Content hash announced by the client, if any.
+    """
+    def __init__(self, session_dir, filename, total_size=None, sha256=None):
+        self.session_dir = session_dir
+        self.filename = filename
+        self.total_size = total_size
+        self.sha256 = sha256
+
+    @classmethod
+    def create(cls, session_dir, filename, total_size=None, sha256=None):
+        upload = cls(session_dir, filename, total_size, sha256)
+        with open(os.path.join(session_dir, UPLOAD_STATE_FILENAME), "w") as f:
+            json.dump({"filename": filename, "total_size": total_size, "sha256": sha256}, f)
+        open(upload.path, "wb").close()
+        return upload
+
+    @classmethod
+    def load(cls, session_dir):
+        """Returns the upload in session_dir, or None if there is none."""
+        try:
+            with open(os.path.join(session_dir, UPLOAD_STATE_FILENAME)) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return cls(session_dir, state["filename"], state.get("total_size"), state.get("sha256"))
+
+    @property
+    def path(self):
+        return os.path.join(self.session_dir, self.filename)
+
+    @property
+    def complete_path(self):
+        return self.path + COMPLETE_SUFFIX
+
+    @property
+    def offset(self):
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    @property
+    def complete(self):
+        return os.path.exists(self.complete_path)
+
+    @property
+    def claim_path(self):
+        return os.path.join(self.session_dir, CLAIM_FILENAME)
+
+    @property
+    def analysis_claimed(self):
+        return os.path.exists(self.claim_path)
+
+    def claim_analysis(self):
+        """
+        Claims the upload's analysis for this process. Returns True to exactly one caller among
+        all workers; the others must leave the analysis to it.
+        """
+        try:
+            fd = os.open(self.claim_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w") as f:
+            f.write(str(os.getpid()))
+        return True
+
+    def append(self, offset, stream, max_size=None, final=False):
+        """
+        Appends the chunk read from stream at offset, which must equal the current size.
+        Completes the upload if final is set or total_size is reached. Returns the new offset.
+        """
+        with open(self.path, "ab") as f:
+            # Held from the offset check to the end of the write, so two requests for the same
+            # offset (a client retry, or PATCHes landing on different workers) can't both append
+            fcntl.flock(f, fcntl.LOCK_EX)
+            if self.complete:
+                raise UploadError("Upload is already complete")
+            current = os.fstat(f.fileno()).st_size
+            if offset != current:
+                raise UploadError(f"Expected offset {current}, got {offset}")
+            limits = [size for size in (self.total_size, max_size) if size is not None]
+            limit = min(limits) if limits else None
+            written = current
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if limit is not None and written > limit:
+                    f.truncate(current)
+                    raise UploadError(f"Upload exceeds {limit} bytes")
+                f.write(chunk)
+            f.flush()
+            if final or (self.total_size is not None and written >= self.total_size):
+                open(self.complete_path, "w").close()
+            return written
+
+def is_streamable(path):
+    """
+    Whether the video at path can be decoded front to back while it is still arriving:
+    True for AVI and for MP4/MOV with moov before mdat (fast-start or fragmented), False when
+    the whole file is needed, and None if too little has arrived to tell.
+    """
+    try:
+        size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            header = f.read(12)
+            if len(header) < 12:
+                return None
+            if header[:4] == b"RIFF":
+                # AVI keeps its headers first; the index at the end is optional for decoding
+                return True
+
+            offset = 0
+            while offset + 8 <= size:
+                f.seek(offset)
+                box = f.read(16)
+                box_size, box_type = int.from_bytes(box[:4], "big"), box[4:8]
+                if box_type == b"moov":
+                    return True
+                if box_type in (b"mdat", b"moof") or box_type not in _LEADING_BOXES:
+                    return False
+                if box_size == 1:
+                    if len(box) < 16:
+                        return None
+                    box_size = int.from_bytes(box[8:16], "big")
+                if box_size < 8:
+                    return False
+                offset += box_size
+    except OSError:
+        return None
+    return None
+
+def tail_file(path, complete_path, poll_interval=0.2, stall_timeout=600, chunk_size=CHUNK_SIZE, stop=None):
+    """
+    Yields the content of a growing file in chunks until complete_path exists and everything
+    has been read, or until the `stop` event is set. Raises IOError if the file stops growing
+    for stall_timeout seconds.
+    """
+    last_growth = time.monotonic()
+    with open(path, "rb") as f:
+        while stop is None or not stop.is_set():
+            # Check completion before reading so no bytes written before it are missed
+            finished = os.path.exists(complete_path)
+            chunk = f.read(chunk_size)
+            if chunk:
+                last_growth = time.monotonic()
+                yield chunk
+                continue
+            if finished:
+                return
+            if not os.path.exists(path):
+                raise IOError(f"Upload {path} was removed")
+            if time.monotonic() - last_growth > stall_timeout:
+                raise IOError(f"Upload {path} stalled for {stall_timeout}s")
+            time.sleep(poll_interval)
+
+@contextmanager
+def growing_video(upload, poll_interval=0.2):
+    """
+    Yields the path of a FIFO that delivers upload's video from the start, blocking for chunks
+    that haven't arrived yet, so cv2.VideoCapture can decode it during the upload.
+    POSIX only; the capture must read sequentially (no seeking).
+    """
+    fifo_path = os.path.join(upload.session_dir, f".{upload.filename}.fifo")
+    if os.path.exists(fifo_path):
+        os.remove(fifo_path)
+    os.mkfifo(fifo_path)
+    stop = threading.Event()
+
+    def feed():
+        try:
+            with open(fifo_path, "wb") as fifo:
+                for chunk in tail_file(upload.path, upload.complete_path, poll_interval, stop=stop):
+                    fifo.write(chunk)
+        except BrokenPipeError:
+            # The decoder stopped reading (finished early or failed)
+            pass
+        except Exception as e:
+            logger.error(f"Failed to feed {upload.path} to the decoder: {str(e)}")
+
+    feeder = threading.Thread(target=feed, name="upload-feeder", daemon=True)
+    feeder.start()
+    try:
+        yield fifo_path
+    finally:
+        stop.set()
+        if feeder.is_alive():
+            # Release a feeder still blocked opening the FIFO because the decoder never did
+            try:
+                os.close(os.open(fifo_path, os.O_RDONLY | os.O_NONBLOCK))
+            except OSError:
+                pass
+        feeder.join(timeout=5)
+        try:
+            os.remove(fifo_path)
+        except FileNotFoundError:
+            # The session was cleaned up while it was analyzed
+            pass
@@ -9,6 +9,8 @@ def extract_frames(video_path, output_dir="frames", step=30):
         video_path (str): Path to the input video.
         output_dir (str): Directory where frames will be saved.
         step (int): Frame interval to extract. (e.g., every 30 frames)
+
+    Skipped frames are only grab()bed; retrieve() (conversion + copy) runs for sampled frames only.
     """
     os.makedirs(output_dir, exist_ok=True)
 
@@ -21,11 +23,13 @@ def extract_frames(video_path, output_dir="frames", step=30):
         return
 
     while True:
-        ret, frame = cap.read()
-        if not ret:
+        if not cap.grab():
             break
 
         if frame_count % step == 0:
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
             frame_filename = os.path.join(output_dir, f"frame_{saved_count:04d}.jpg")
             cv2.imwrite(frame_filename, frame)
             print(f"Saved: {frame_filename}")